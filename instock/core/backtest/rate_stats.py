@@ -4,6 +4,7 @@
 import logging
 import numpy as np
 import pandas as pd
+import instock.core.stock_view as stv
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -20,25 +21,17 @@ def get_rates(code_name, data, stock_column, threshold=101):
         # 设置返回数组。
         stock_data_list = [start_date, code]
 
-        mask = (data['date'] >= start_date)
-        data = data.loc[mask].copy()
-        data = data.head(n=threshold)
+        data = stv.since(data, start_date, head=threshold)
 
         if len(data.index) <= 1:
             return None
 
-        close1 = data.iloc[0]['close']
+        close = data['close'].values
+        close1 = close[0]
         # data.loc[:, 'sum_pct_change'] = data['close'].apply(lambda x: round(100 * (x - close1) / close1, 2))
-        data.loc[:, 'sum_pct_change'] = np.around(100 * (data['close'].values - close1) / close1, decimals=2)
-        # 计算区间最高、最低价格
-
-        first = True
-        col_len = len(data.columns)
-        for row in data.values:
-            if first:
-                first = False
-            else:
-                stock_data_list.append(row[col_len-1])
+        sum_pct_change = np.around(100 * (close - close1) / close1, decimals=2)
+        # 第2天起的累计收益率
+        stock_data_list.extend(sum_pct_change[1:].tolist())
 
         _l = len(stock_column) - len(stock_data_list)
         for i in range(0, _l):
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+Date: 2025/3/15 10:00
+Desc: 异步批量请求，按主机限制并发数，令牌桶限制请求频率，失败重试及熔断与http_client一致，返回结果逐个交给回调处理
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import instock.core.crawling.http_client as hc
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# 每个主机同时进行的请求数，使用环境变量 http_host_limit 设置
+host_limit = 16
+# 每秒请求数及突发请求数，东方财富请求过快会限流，使用环境变量 http_rate、http_burst 设置
+rate = 50.0
+burst = 50
+
+_host_limit = os.environ.get('http_host_limit')
+if _host_limit is not None:
+    host_limit = int(_host_limit)
+_rate = os.environ.get('http_rate')
+if _rate is not None:
+    rate = float(_rate)
+_burst = os.environ.get('http_burst')
+if _burst is not None:
+    burst = int(_burst)
+
+
+class token_bucket:
+    """
+    令牌桶，每秒补充rate个令牌，最多积累burst个
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.last = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def get_many(tasks, callback=None, limit=None, req_rate=None, req_burst=None):
+    """
+    批量GET请求
+    :param tasks: 可迭代的 (key, url, params)
+    :param callback: callback(key, data_json)，在线程中执行，返回值作为结果；为None时结果为data_json
+    :param limit: 每个主机同时进行的请求数
+    :param req_rate: 每秒请求数
+    :param req_burst: 突发请求数
+    :return: {key: 结果}，请求或处理失败的不包含
+    :rtype: dict
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return {}
+    limit = host_limit if limit is None else limit
+    bucket = (rate if req_rate is None else req_rate, burst if req_burst is None else req_burst)
+    coro = _get_many(tasks, callback, limit, bucket)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # 已经在事件循环中(如web服务)，在新线程中运行
+    result = {}
+
+    def _run():
+        result.update(asyncio.run(coro))
+
+    t = threading.Thread(target=_run)
+    t.start()
+    t.join()
+    return result
+
+
+async def _get_many(tasks, callback, limit, bucket):
+    semaphores = {}
+    tb = token_bucket(*bucket)
+    result = {}
+
+    async def _one(get, key, url, params):
+        host = urlsplit(url).netloc
+        sem = semaphores.get(host)
+        if sem is None:
+            sem = semaphores[host] = asyncio.Semaphore(limit)
+        try:
+            async with sem:
+                data_json = await get(url, params)
+            if callback is None:
+                result[key] = data_json
+            else:
+                # 解析及保存不阻塞事件循环
+                _result = await asyncio.to_thread(callback, key, data_json)
+                if _result is not None:
+                    result[key] = _result
+        except Exception as e:
+            logging.error(f"async_client.get_many处理异常：{key}{e}")
+
+    if aiohttp is None or hc.mode:
+        # 没有aiohttp或录制/回放时，通过hc.get请求
+        async def _get(url, params):
+            # hc.get已包含重试及熔断
+            await tb.acquire()
+            return await asyncio.to_thread(lambda: hc.get(url, params=params).json())
+
+        await asyncio.gather(*(_one(_get, *t) for t in tasks))
+    else:
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=limit)
+        timeout = aiohttp.ClientTimeout(sock_connect=hc.timeout[0], sock_read=hc.timeout[1])
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=hc.headers) as session:
+            async def _get(url, params):
+                # 与hc.get相同的重试及熔断策略
+                b = hc.breaker(url)
+                attempt = 0
+                while True:
+                    if not b.allow():
+                        hc.count('shed')
+                        raise hc.CircuitOpenError(f"熔断中：{urlsplit(url).netloc}")
+                    await tb.acquire()
+                    hc.count('requests')
+                    try:
+                        async with session.get(url, params=params) as r:
+                            if not hc.is_retry_status(r.status):
+                                data_json = await r.json(content_type=None)
+                                b.success()
+                                return data_json
+                            error = aiohttp.ClientResponseError(r.request_info, r.history, status=r.status)
+                    except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                        error = e
+                    except BaseException:
+                        # 其它异常(如返回的不是json)不重试，也要记录失败，否则试探请求一直占用熔断器
+                        b.failure()
+                        hc.count('failed')
+                        raise
+                    b.failure()
+                    if attempt >= hc.retries:
+                        hc.count('failed')
+                        raise error
+                    attempt += 1
+                    hc.count('retried')
+                    await asyncio.sleep(hc.retry_delay(attempt))
+
+            await asyncio.gather(*(_one(_get, *t) for t in tasks))
+    return result
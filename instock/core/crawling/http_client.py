@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+Date: 2025/3/14 10:00
+Desc: 共享的HTTP连接池，所有抓取模块通过它访问网络，复用长连接，减少TCP握手及DNS解析
+"""
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个主机的连接数，与抓取线程数一致，使用环境变量 http_pool_size 设置
+pool_size = 40
+# 保持连接池的主机数
+pool_hosts = 20
+# 分页数据同时获取的页数，使用环境变量 http_page_workers 设置
+page_workers = 8
+# 默认超时时间(连接, 读取)秒，使用环境变量 http_timeout 设置读取超时
+timeout = (5, 30)
+
+# 失败重试次数及退避时间(秒)，第n次重试等待 backoff * 2^(n-1)，最长 backoff_max，使用环境变量 http_retries 设置重试次数
+retries = 3
+backoff = 0.5
+backoff_max = 8.0
+# 熔断：同一主机连续失败 breaker_threshold 次后，breaker_cooldown 秒内不再请求，之后放行一个请求试探
+breaker_threshold = 10
+breaker_cooldown = 30.0
+
+# 录制/回放：http_mode 为 record 时保存每个响应，为 replay 时不访问网络，从 http_fixture_path 读取已录制的响应，
+# 可以用 http_replay_latency 模拟延迟(秒)，http_replay_error_rate 按比例模拟连接失败，用于离线运行作业及性能测试
+mode = os.environ.get('http_mode', '')
+fixture_path = os.environ.get('http_fixture_path',
+                              os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'cache',
+                                           'http_fixture'))
+replay_latency = float(os.environ.get('http_replay_latency', 0))
+replay_error_rate = float(os.environ.get('http_replay_error_rate', 0))
+
+_pool_size = os.environ.get('http_pool_size')
+if _pool_size is not None:
+    pool_size = int(_pool_size)
+_page_workers = os.environ.get('http_page_workers')
+if _page_workers is not None:
+    page_workers = int(_page_workers)
+_timeout = os.environ.get('http_timeout')
+if _timeout is not None:
+    timeout = (timeout[0], float(_timeout))
+_retries = os.environ.get('http_retries')
+if _retries is not None:
+    retries = int(_retries)
+_breaker_threshold = os.environ.get('http_breaker_threshold')
+if _breaker_threshold is not None:
+    breaker_threshold = int(_breaker_threshold)
+_breaker_cooldown = os.environ.get('http_breaker_cooldown')
+if _breaker_cooldown is not None:
+    breaker_cooldown = float(_breaker_cooldown)
+
+headers = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """
+    共享的Session，按主机保持长连接池
+    :return: requests.Session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                s.headers.update(headers)
+                _session = s
+    return _session
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    主机处于熔断状态，请求未发出
+    """
+
+
+class circuit_breaker:
+    """
+    按主机熔断，连续失败达到阈值后打开，冷却时间后放行一个请求，成功则关闭
+    """
+
+    def __init__(self, host, threshold, cooldown):
+        self.host = host
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.failures < self.threshold:
+                return True
+            if self.probing or time.monotonic() - self.opened < self.cooldown:
+                return False
+            self.probing = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures == self.threshold:
+                # 达到阈值或试探失败，重新开始冷却
+                self.opened = time.monotonic()
+                opened = True
+            else:
+                opened = False
+            self.probing = False
+        if opened:
+            logging.warning(f"http_client熔断，{self.cooldown}秒内不再请求：{self.host}连续失败{self.failures}次")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# 请求统计：requests 请求数，retried 重试次数，failed 最终失败数，shed 因熔断未发出的请求数
+_stats = {'requests': 0, 'retried': 0, 'failed': 0, 'shed': 0}
+_stats_lock = threading.Lock()
+
+
+def breaker(url: str) -> circuit_breaker:
+    host = urlsplit(url).netloc
+    b = _breakers.get(host)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.get(host)
+            if b is None:
+                b = _breakers[host] = circuit_breaker(host, breaker_threshold, breaker_cooldown)
+    return b
+
+
+def count(name: str, n: int = 1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in _stats:
+            _stats[k] = 0
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    第attempt次重试前的等待时间，指数退避加随机抖动
+    """
+    delay = min(backoff_max, backoff * (2 ** (attempt - 1)))
+    return delay * (0.5 + random.random() / 2)
+
+
+def is_retry_status(status: int) -> bool:
+    # 限流及服务端错误可以重试
+    return status == 429 or status >= 500
+
+
+def get(url: str, params: dict = None, **kwargs) -> requests.Response:
+    """
+    GET请求，使用共享连接池及默认超时时间，失败时指数退避重试，主机熔断时抛出CircuitOpenError
+    :param url: 地址
+    :type url: str
+    :param params: 参数
+    :type params: dict
+    :return: 响应
+    :rtype: requests.Response
+    """
+    kwargs.setdefault("timeout", timeout)
+    b = breaker(url)
+    attempt = 0
+    while True:
+        if not b.allow():
+            count('shed')
+            raise CircuitOpenError(f"熔断中：{urlsplit(url).netloc}")
+        count('requests')
+        try:
+            r = _send(url, params, **kwargs)
+            if not is_retry_status(r.status_code):
+                b.success()
+                return r
+            error = requests.HTTPError(f"{r.status_code}：{url}", response=r)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+        except BaseException:
+            # 其它异常不重试，也要记录失败，否则试探请求一直占用熔断器
+            b.failure()
+            count('failed')
+            raise
+        b.failure()
+        if attempt >= retries:
+            count('failed')
+            raise error
+        attempt += 1
+        count('retried')
+        time.sleep(retry_delay(attempt))
+
+
+def _send(url, params=None, **kwargs):
+    if mode == 'replay':
+        return replay(url, params)
+    r = session().get(url, params=params, **kwargs)
+    if mode == 'record':
+        record(url, params, r)
+    return r
+
+
+def _fixture_file(url, params):
+    # 不包含防缓存的时间戳参数"_"，保证回放时能找到
+    _params = sorted((str(k), str(v)) for k, v in (params or {}).items() if k != "_")
+    key = hashlib.sha1(json.dumps([url, _params], ensure_ascii=False).encode("utf-8")).hexdigest()
+    return os.path.join(fixture_path, key[0:2], f"{key}.pickle.gz")
+
+
+def record(url, params, r):
+    """
+    保存响应，用于回放
+    """
+    fixture_file = _fixture_file(url, params)
+    tmp_file = f"{fixture_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(fixture_file), exist_ok=True)
+        with gzip.open(tmp_file, "wb") as f:
+            pickle.dump({"url": url, "params": params, "status": r.status_code, "encoding": r.encoding,
+                         "headers": {k: v for k, v in r.headers.items() if k.lower() != "content-encoding"},
+                         "content": r.content}, f)
+        os.replace(tmp_file, fixture_file)
+    except Exception as e:
+        logging.error(f"http_client.record处理异常：{url}{e}")
+
+
+def replay(url, params=None):
+    """
+    读取已录制的响应，没有录制的请求返回404
+    """
+    if replay_latency > 0:
+        time.sleep(replay_latency)
+    if replay_error_rate > 0 and random.random() < replay_error_rate:
+        raise requests.ConnectionError(f"回放模拟连接失败：{url}")
+    r = requests.Response()
+    r.url = url
+    fixture_file = _fixture_file(url, params)
+    if not os.path.isfile(fixture_file):
+        r.status_code = 404
+        r._content = b""
+        logging.warning(f"http_client.replay没有录制的响应：{url}{params}")
+        return r
+    with gzip.open(fixture_file, "rb") as f:
+        fixture = pickle.load(f)
+    r.status_code = fixture["status"]
+    r.encoding = fixture["encoding"]
+    r.headers.update(fixture["headers"])
+    r._content = fixture["content"]
+    return r
+
+
+def get_pages(url: str, params: dict, pages: int, page_key: str = "pageNumber", first=None, parse=None,
+              workers: int = None) -> list:
+    """
+    并发获取分页数据，按页码顺序返回每页的解析结果
+    :param url: 地址
+    :type url: str
+    :param params: 参数，每页复制后设置页码
+    :type params: dict
+    :param pages: 总页数
+    :type pages: int
+    :param page_key: 页码参数名
+    :type page_key: str
+    :param first: 已经获取的第一页解析结果，不再重复获取
+    :param parse: 解析响应的函数，默认为 r.json()
+    :param workers: 同时获取的页数
+    :type workers: int
+    :return: 每页的解析结果
+    :rtype: list
+    """
+    if parse is None:
+        parse = _parse_json
+    pages = int(pages)
+
+    def _page(page):
+        _params = dict(params)
+        _params[page_key] = page
+        return parse(get(url, params=_params))
+
+    start = 1 if first is None else 2
+    result = [] if first is None else [first]
+    if pages < start:
+        return result
+    workers = page_workers if workers is None else workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, pages - start + 1))) as executor:
+        # map按提交顺序返回结果，任一页失败时抛出异常
+        result.extend(executor.map(_page, range(start, pages + 1)))
+    return result
+
+
+def _parse_json(r):
+    return r.json()
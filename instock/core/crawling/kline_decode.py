@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+Date: 2025/3/16 10:00
+Desc: 东方财富K线数据解析，klines字符串列表一次转换成日期及数值数组
+"""
+import numpy as np
+import pandas as pd
+
+# K线字段，与 fields2 的 f51-f61 对应
+KLINE_COLUMNS = [
+    "日期",
+    "开盘",
+    "收盘",
+    "最高",
+    "最低",
+    "成交量",
+    "成交额",
+    "振幅",
+    "涨跌幅",
+    "涨跌额",
+    "换手率",
+]
+
+
+def decode_klines(klines: list) -> tuple:
+    """
+    解析klines，每条为 "日期,开盘,收盘,..." 逗号分隔的字符串
+    :param klines: K线字符串列表
+    :type klines: list
+    :return: (日期 datetime64[D] 数组, 数值 float64 二维数组 行数×字段数)
+    :rtype: tuple
+    """
+    n = len(klines)
+    # 拼成一个字符串一次分割，不再逐行split；按步长取出日期后，剩下的都是数值
+    cells = ",".join(klines).split(",")
+    width = len(cells) // n
+    dates = np.array(cells[0::width], dtype="datetime64[D]")
+    del cells[0::width]
+    try:
+        values = np.array(cells, dtype=np.float64).reshape(n, width - 1)
+    except ValueError:
+        # 停牌等情况字段为"-"，无法转换的为NaN
+        values = pd.to_numeric(pd.Series(cells), errors="coerce").values.astype(np.float64).reshape(n, width - 1)
+    return dates, values
+
+
+def klines_frame(klines: list, columns: list = None) -> pd.DataFrame:
+    """
+    K线字符串列表转换成DataFrame，日期列为"%Y-%m-%d"格式的字符串
+    :param klines: K线字符串列表
+    :type klines: list
+    :param columns: 列名，默认为 KLINE_COLUMNS
+    :type columns: list
+    :return: K线数据
+    :rtype: pandas.DataFrame
+    """
+    if columns is None:
+        columns = KLINE_COLUMNS
+    dates, values = decode_klines(klines)
+    data = {columns[0]: np.datetime_as_string(dates)}
+    for i, c in enumerate(columns[1:]):
+        data[c] = values[:, i]
+    return pd.DataFrame(data)
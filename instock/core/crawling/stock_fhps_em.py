@@ -6,8 +6,7 @@ Desc: 东方财富网-数据中心-年报季报-分红送配
 https://data.eastmoney.com/yjfp/
 """
 import pandas as pd
-import requests
-from tqdm import tqdm
+import instock.core.crawling.http_client as hc
 
 __author__ = 'myh '
 __date__ = '2023/6/27 '
@@ -41,14 +40,11 @@ def stock_fhps_em(date: str = "20231231") -> pd.DataFrame:
         "filter": f"""(REPORT_DATE='{"-".join([date[:4], date[4:6], date[6:]])}')""",
     }
 
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params)
     data_json = r.json()
     total_pages = int(data_json["result"]["pages"])
     big_df = pd.DataFrame()
-    for page in tqdm(range(1, total_pages + 1), leave=False):
-        params.update({"pageNumber": page})
-        r = requests.get(url, params=params)
-        data_json = r.json()
+    for data_json in hc.get_pages(url, params, total_pages, first=data_json):
         temp_df = pd.DataFrame(data_json["result"]["data"])
         if not temp_df.empty:
             big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
@@ -9,9 +9,8 @@ https://vip.stock.finance.sina.com.cn/q/go.php/vInvestConsult/kind/lhb/index.pht
 from io import StringIO
 
 import pandas as pd
-import requests
+import instock.core.crawling.http_client as hc
 from bs4 import BeautifulSoup
-from tqdm import tqdm
 
 
 def stock_lhb_detail_daily_sina(date: str = "20240222") -> pd.DataFrame:
@@ -26,7 +25,7 @@ def stock_lhb_detail_daily_sina(date: str = "20240222") -> pd.DataFrame:
     date = "-".join([date[:4], date[4:6], date[6:]])
     url = "https://vip.stock.finance.sina.com.cn/q/go.php/vInvestConsult/kind/lhb/index.phtml"
     params = {"tradedate": date}
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params)
     soup = BeautifulSoup(r.text, features="lxml")
     selected_html = soup.find(name="div", attrs={"class": "list"}).find_all(
         name="table", attrs={"class": "list_table"}
@@ -56,6 +55,10 @@ def stock_lhb_detail_daily_sina(date: str = "20240222") -> pd.DataFrame:
     return big_df
 
 
+def _read_table(r):
+    return pd.read_html(StringIO(r.text))[0].iloc[0:, :]
+
+
 def _find_last_page(
     url: str = "https://vip.stock.finance.sina.com.cn/q/go.php/vLHBData/kind/ggtj/index.phtml",
     recent_day: str = "60",
@@ -64,7 +67,7 @@ def _find_last_page(
         "last": recent_day,
         "p": "1",
     }
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params)
     soup = BeautifulSoup(r.text, "lxml")
     try:
         previous_page = int(soup.find_all(attrs={"class": "page"})[-2].text)
@@ -76,7 +79,7 @@ def _find_last_page(
                 "last": recent_day,
                 "p": previous_page,
             }
-            r = requests.get(url, params=params)
+            r = hc.get(url, params=params)
             soup = BeautifulSoup(r.text, features="lxml")
             last_page = int(soup.find_all(attrs={"class": "page"})[-2].text)
             if last_page != previous_page:
@@ -101,13 +104,7 @@ def stock_lhb_ggtj_sina(symbol: str = "5") -> pd.DataFrame:
     )
     last_page_num = _find_last_page(url, symbol)
     big_df = pd.DataFrame()
-    for page in tqdm(range(1, last_page_num + 1), leave=False):
-        params = {
-            "last": symbol,
-            "p": page,
-        }
-        r = requests.get(url, params=params)
-        temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
+    for temp_df in hc.get_pages(url, {"last": symbol}, last_page_num, page_key="p", parse=_read_table):
         big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
     big_df["股票代码"] = big_df["股票代码"].astype(str).str.zfill(6)
     big_df.columns = [
@@ -137,13 +134,7 @@ def stock_lhb_yytj_sina(symbol: str = "5") -> pd.DataFrame:
     )
     last_page_num = _find_last_page(url, symbol)
     big_df = pd.DataFrame()
-    for page in tqdm(range(1, last_page_num + 1), leave=False):
-        params = {
-            "last": "5",
-            "p": page,
-        }
-        r = requests.get(url, params=params)
-        temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
+    for temp_df in hc.get_pages(url, {"last": "5"}, last_page_num, page_key="p", parse=_read_table):
         big_df = pd.concat([big_df, temp_df], ignore_index=True)
     big_df.columns = [
         "营业部名称",
@@ -174,13 +165,7 @@ def stock_lhb_jgzz_sina(symbol: str = "5") -> pd.DataFrame:
     )
     last_page_num = _find_last_page(url, symbol)
     big_df = pd.DataFrame()
-    for page in tqdm(range(1, last_page_num + 1), leave=False):
-        params = {
-            "last": symbol,
-            "p": page,
-        }
-        r = requests.get(url, params=params)
-        temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
+    for temp_df in hc.get_pages(url, {"last": symbol}, last_page_num, page_key="p", parse=_read_table):
         if temp_df.empty:
             continue
         big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
@@ -214,19 +199,14 @@ def stock_lhb_jgmx_sina() -> pd.DataFrame:
     params = {
         "p": "1",
     }
-    r = requests.get(url, params=params)
+    r = hc.get(url, params=params)
     soup = BeautifulSoup(r.text, features="lxml")
     try:
         last_page_num = int(soup.find_all(attrs={"class": "page"})[-2].text)
     except:  # noqa: E722
         last_page_num = 1
     big_df = pd.DataFrame()
-    for page in tqdm(range(1, last_page_num + 1), leave=False):
-        params = {
-            "p": page,
-        }
-        r = requests.get(url, params=params)
-        temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
+    for temp_df in hc.get_pages(url, {}, last_page_num, page_key="p", parse=_read_table):
         big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
     big_df["股票代码"] = big_df["股票代码"].astype(str).str.zfill(6)
     big_df["交易日期"] = pd.to_datetime(big_df["交易日期"], errors="coerce").dt.date
@@ -8,7 +8,7 @@ https://finance.sina.com.cn/realstock/company/klc_td_sh.txt
 """
 import datetime
 import pandas as pd
-import requests
+import instock.core.crawling.http_client as hc
 from py_mini_racer import MiniRacer
 
 hk_js_decode = """
@@ -310,7 +310,7 @@ def tool_trade_date_hist_sina() -> pd.DataFrame:
     :rtype: pandas.DataFrame
     """
     url = "https://finance.sina.com.cn/realstock/company/klc_td_sh.txt"
-    r = requests.get(url)
+    r = hc.get(url)
     js_code = MiniRacer()
     js_code.eval(hk_js_decode)
     dict_list = js_code.call(
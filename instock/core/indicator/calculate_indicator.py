@@ -2,417 +2,549 @@
 # -*- coding: utf-8 -*-
 
 import logging
+from functools import partial
 import pandas as pd
 import numpy as np
 import talib as tl
+import instock.core.indicator.kernel as krn
+import instock.core.indicator.indicator_cache as icc
+import instock.core.stock_view as stv
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
+# 修改计算方法时加1，使缓存的计算结果失效
+VERSION = 1
 
-def get_indicators(data, end_date=None, threshold=120, calc_threshold=None):
+# 计算使用的行情数据列
+INPUT_COLUMNS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')
+
+
+class indicator_array:
     """
-    计算指标
-    data: 数据
-    end_date: 结束日期
-    threshold: 阈值,返回的数据量
-    calc_threshold: 计算阈值, 用于计算之前截取数据
+    指标计算结果，所有列在一个二维数组中
+    columns: 列名，行情数据列在前，之后为指标列
+    values: 二维数组[日期, 列]，按列连续存放(Fortran顺序)
     """
-    try:
-        isCopy = False
-        if end_date is not None:
-            mask = (data['date'] <= end_date)
-            data = data.loc[mask]
-            isCopy = True
-        if calc_threshold is not None:
-            data = data.tail(n=calc_threshold)
-            isCopy = True
-
-        if isCopy:
-            data = data.copy()
+
+    def __init__(self, columns, values, index=None):
+        self.columns = columns
+        self.values = values
+        self.index = {c: i for i, c in enumerate(columns)} if index is None else index
+
+    def __getitem__(self, name):
+        return self.values[:, self.index[name]]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def tail(self, n):
+        # 最后n条数据的视图
+        return indicator_array(self.columns, self.values[max(len(self) - n, 0):], self.index)
+
+
+def _put(d, name, x, nan=False, inf=False):
+    """
+    写入一列
+    nan: NaN置为0
+    inf: NaN及inf置为0
+    """
+    out = d[name]
+    out[:] = x
+    if inf:
+        out[~np.isfinite(out)] = 0.0
+    elif nan:
+        out[np.isnan(out)] = 0.0
+    return out
+
+
+def _shift(x, n):
+    # 同Series.shift(n, fill_value=0.0)
+    out = np.zeros(len(x))
+    out[n:] = x[:max(len(x) - n, 0)]
+    return out
+
+
+# 每个计算步骤写入的列见INDICATORS，步骤只读取行情数据及依赖步骤计算的列
+
+
+def _macd(d):
+    macd, macds, macdh = tl.MACD(d['close'], fastperiod=12, slowperiod=26, signalperiod=9)
+    _put(d, 'macd', macd, nan=True)
+    _put(d, 'macds', macds, nan=True)
+    _put(d, 'macdh', macdh, nan=True)
+
+
+def _kdj(d):
+    kdjk, kdjd = tl.STOCH(d['high'], d['low'], d['close'], fastk_period=9,
+                          slowk_period=5, slowk_matype=1, slowd_period=5, slowd_matype=1)
+    kdjk = _put(d, 'kdjk', kdjk, nan=True)
+    kdjd = _put(d, 'kdjd', kdjd, nan=True)
+    _put(d, 'kdjj', 3 * kdjk - 2 * kdjd)
+
+
+def _boll(d):
+    # boll 计算结果和stockstats不同boll_ub,boll_lb
+    boll_ub, boll, boll_lb = tl.BBANDS(d['close'], timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
+    _put(d, 'boll_ub', boll_ub, nan=True)
+    _put(d, 'boll', boll, nan=True)
+    _put(d, 'boll_lb', boll_lb, nan=True)
+
+
+def _trix(d):
+    trix = _put(d, 'trix', tl.TRIX(d['close'], timeperiod=12), nan=True)
+    _put(d, 'trix_20_sma', tl.MA(trix, timeperiod=20), nan=True)
+
+
+def _m_price(d):
+    _put(d, 'm_price', d['amount'] / d['volume'])
+
+
+def _cr(d):
+    m_price_sf1 = _put(d, 'm_price_sf1', _shift(d['m_price'], 1))
+    h_m = _put(d, 'h_m', d['high'] - np.minimum(m_price_sf1, d['high']))
+    m_l = _put(d, 'm_l', m_price_sf1 - np.minimum(m_price_sf1, d['low']))
+    h_m_sum = _put(d, 'h_m_sum', tl.SUM(h_m, timeperiod=26))
+    m_l_sum = _put(d, 'm_l_sum', tl.SUM(m_l, timeperiod=26))
+    cr = _put(d, 'cr', h_m_sum / m_l_sum, inf=True)
+    cr *= 100
+    _put(d, 'cr-ma1', tl.MA(cr, timeperiod=5), nan=True)
+    _put(d, 'cr-ma2', tl.MA(cr, timeperiod=10), nan=True)
+    _put(d, 'cr-ma3', tl.MA(cr, timeperiod=20), nan=True)
+
+
+def _rsi(name, timeperiod, d):
+    _put(d, name, tl.RSI(d['close'], timeperiod=timeperiod), nan=True)
+
+
+def _vr(d):
+    av = _put(d, 'av', np.where(d['p_change'] > 0, d['volume'], 0))
+    avs = _put(d, 'avs', tl.SUM(av, timeperiod=26))
+    bv = _put(d, 'bv', np.where(d['p_change'] < 0, d['volume'], 0))
+    bvs = _put(d, 'bvs', tl.SUM(bv, timeperiod=26))
+    cv = _put(d, 'cv', np.where(d['p_change'] == 0, d['volume'], 0))
+    cvs = _put(d, 'cvs', tl.SUM(cv, timeperiod=26))
+    vr = _put(d, 'vr', (avs + cvs / 2) / (bvs + cvs / 2), inf=True)
+    vr *= 100
+    _put(d, 'vr_6_sma', tl.MA(vr, timeperiod=6), nan=True)
+
+
+def _prev_close(d):
+    _put(d, 'prev_close', _shift(d['close'], 1))
+
+
+def _tr(d):
+    h_l = _put(d, 'h_l', d['high'] - d['low'])
+    h_cy = _put(d, 'h_cy', d['high'] - d['prev_close'])
+    cy_l = _put(d, 'cy_l', d['prev_close'] - d['low'])
+    h_cy_a = _put(d, 'h_cy_a', abs(h_cy))
+    cy_l_a = _put(d, 'cy_l_a', abs(cy_l))
+    # 忽略NaN取最大值
+    _put(d, 'tr', np.fmax(np.fmax(h_l, h_cy_a), cy_l_a), nan=True)
+
+
+def _atr(d):
+    _put(d, 'atr', tl.ATR(d['high'], d['low'], d['close'], timeperiod=14), nan=True)
+
+
+# DMI
+# talib计算公式和stockstats不同
+# talib计算公式
+# data.loc[:, 'pdi'] = tl.PLUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
+# data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
+# data.loc[:, 'mdi'] = tl.MINUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
+# data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
+# data.loc[:, 'dx'] = tl.DX(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
+# data['dx'].values[np.isnan(data['dx'].values)] = 0.0
+# data.loc[:, 'adx'] = tl.ADX(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
+# data['adx'].values[np.isnan(data['adx'].values)] = 0.0
+# data.loc[:, 'adxr'] = tl.ADXR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
+# data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
+# stockstats计算公式
+def _dm(d):
+    high_delta = _put(d, 'high_delta', np.insert(np.diff(d['high']), 0, 0.0))
+    _put(d, 'high_m', (high_delta + abs(high_delta)) / 2)
+    low_delta = _put(d, 'low_delta', np.insert(-np.diff(d['low']), 0, 0.0))
+    _put(d, 'low_m', (low_delta + abs(low_delta)) / 2)
+
+
+def _pdm(d):
+    _put(d, 'pdm', tl.EMA(np.where(d['high_m'] > d['low_m'], d['high_m'], 0), timeperiod=14), nan=True)
+
+
+def _pdi(d):
+    pdi = _put(d, 'pdi', d['pdm'] / d['atr'], inf=True)
+    pdi *= 100
+
+
+def _mdm(d):
+    _put(d, 'mdm', tl.EMA(np.where(d['low_m'] > d['high_m'], d['low_m'], 0), timeperiod=14), nan=True)
+
+
+def _mdi(d):
+    mdi = _put(d, 'mdi', d['mdm'] / d['atr'], inf=True)
+    mdi *= 100
+
+
+def _dx(d):
+    dx = _put(d, 'dx', abs(d['pdi'] - d['mdi']) / (d['pdi'] + d['mdi']), inf=True)
+    dx *= 100
+
+
+def _adx(d):
+    _put(d, 'adx', tl.EMA(d['dx'], timeperiod=6), nan=True)
+
+
+def _adxr(d):
+    _put(d, 'adxr', tl.EMA(d['adx'], timeperiod=6), nan=True)
+
+
+def _wr(name, timeperiod, d):
+    _put(d, name, tl.WILLR(d['high'], d['low'], d['close'], timeperiod=timeperiod), nan=True)
+
+
+def _cci(name, timeperiod, d):
+    # cci 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
+    _put(d, name, tl.CCI(d['high'], d['low'], d['close'], timeperiod=timeperiod), nan=True)
+
+
+def _ma(name, timeperiod, d, column='close'):
+    _put(d, name, tl.MA(d[column], timeperiod=timeperiod), nan=True)
+
+
+def _dma(d):
+    dma = _put(d, 'dma', d['ma10'] - d['ma50'])
+    _put(d, 'dma_10_sma', tl.MA(dma, timeperiod=10), nan=True)
+
+
+def _tema(d):
+    _put(d, 'tema', tl.TEMA(d['close'], timeperiod=14), nan=True)
+
+
+def _mfi(d):
+    # mfi 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
+    mfi = _put(d, 'mfi', tl.MFI(d['high'], d['low'], d['close'], d['volume'], timeperiod=14), nan=True)
+    _put(d, 'mfisma', tl.MA(mfi, timeperiod=6))
+
+
+def _vwma(d):
+    tpv_14 = _put(d, 'tpv_14', tl.SUM(d['amount'], timeperiod=14))
+    vol_14 = _put(d, 'vol_14', tl.SUM(d['volume'], timeperiod=14))
+    vwma = _put(d, 'vwma', tpv_14 / vol_14, inf=True)
+    _put(d, 'mvwma', tl.MA(vwma, timeperiod=6))
+
+
+def _ppo(d):
+    ppo = _put(d, 'ppo', tl.PPO(d['close'], fastperiod=12, slowperiod=26, matype=1), nan=True)
+    ppos = _put(d, 'ppos', tl.EMA(ppo, timeperiod=9), nan=True)
+    _put(d, 'ppoh', ppo - ppos)
+
+
+def _stochrsi(d):
+    # talib计算公式和stockstats不同
+    # talib计算公式
+    # data.loc[:, 'stochrsi_k'], data.loc[:, 'stochrsi_d'] = tl.STOCHRSI(data['close'].values, timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0)
+    rsi = d['rsi']
+    rsi_min = _put(d, 'rsi_min', tl.MIN(rsi, timeperiod=14))
+    rsi_max = _put(d, 'rsi_max', tl.MAX(rsi, timeperiod=14))
+    stochrsi_k = _put(d, 'stochrsi_k', (rsi - rsi_min) / (rsi_max - rsi_min), inf=True)
+    stochrsi_k *= 100
+    _put(d, 'stochrsi_d', tl.MA(stochrsi_k, timeperiod=3))
+
+
+def _wt(d):
+    m_price = d['m_price']
+    esa = _put(d, 'esa', tl.EMA(m_price, timeperiod=10), nan=True)
+    esa_d = _put(d, 'esa_d', tl.EMA(abs(m_price - esa), timeperiod=10))
+    esa_ci = _put(d, 'esa_ci', (m_price - esa) / (0.015 * esa_d), inf=True)
+    wt1 = _put(d, 'wt1', tl.EMA(esa_ci, timeperiod=21), nan=True)
+    _put(d, 'wt2', tl.MA(wt1, timeperiod=4), nan=True)
+
+
+def _m_atr(d):
+    _put(d, 'm_atr', d['atr'] * 3)
+
+
+def _hl_avg(d):
+    _put(d, 'hl_avg', (d['high'] + d['low']) / 2.0)
+
+
+def _supertrend(d):
+    b_ub = _put(d, 'b_ub', d['hl_avg'] + d['m_atr'])
+    b_lb = _put(d, 'b_lb', d['hl_avg'] - d['m_atr'])
+    ub, lb, st = krn.supertrend(d['close'], b_ub, b_lb)
+    _put(d, 'supertrend_ub', ub)
+    _put(d, 'supertrend_lb', lb)
+    _put(d, 'supertrend', st)
+
+
+# ----------stockstats没有以下指标-----------------
+def _roc(d):
+    roc = _put(d, 'roc', tl.ROC(d['close'], timeperiod=12), nan=True)
+    _put(d, 'rocma', tl.MA(roc, timeperiod=6), nan=True)
+    _put(d, 'rocema', tl.EMA(roc, timeperiod=9), nan=True)
+
+
+def _obv(d):
+    _put(d, 'obv', tl.OBV(d['close'], d['volume']), nan=True)
+
+
+def _sar(d):
+    _put(d, 'sar', tl.SAR(d['high'], d['low']), nan=True)
+
+
+def _psy(d):
+    price_up = _put(d, 'price_up', np.where(d['close'] > d['prev_close'], 1.0, 0.0))
+    price_up_sum = _put(d, 'price_up_sum', tl.SUM(price_up, timeperiod=12))
+    psy = _put(d, 'psy', price_up_sum / 12.0, nan=True)
+    psy *= 100
+    _put(d, 'psyma', tl.MA(psy, timeperiod=6))
+
+
+def _ar(d):
+    h_o = _put(d, 'h_o', d['high'] - d['open'])
+    o_l = _put(d, 'o_l', d['open'] - d['low'])
+    h_o_sum = _put(d, 'h_o_sum', tl.SUM(h_o, timeperiod=26))
+    o_l_sum = _put(d, 'o_l_sum', tl.SUM(o_l, timeperiod=26))
+    ar = _put(d, 'ar', h_o_sum / o_l_sum, inf=True)
+    ar *= 100
+
+
+def _br(d):
+    h_cy_sum = _put(d, 'h_cy_sum', tl.SUM(d['h_cy'], timeperiod=26))
+    cy_l_sum = _put(d, 'cy_l_sum', tl.SUM(d['cy_l'], timeperiod=26))
+    br = _put(d, 'br', h_cy_sum / cy_l_sum, inf=True)
+    br *= 100
+
+
+def _prev_hl(d):
+    _put(d, 'prev_high', _shift(d['high'], 1))
+    _put(d, 'prev_low', _shift(d['low'], 1))
+
+
+def _emv(d):
+    phl_avg = _put(d, 'phl_avg', (d['prev_high'] + d['prev_low']) / 2.0)
+    emva_em = _put(d, 'emva_em', (d['hl_avg'] - phl_avg) * d['h_l'] / d['amount'])
+    emv = _put(d, 'emv', tl.SUM(emva_em, timeperiod=14), nan=True)
+    _put(d, 'emva', tl.MA(emv, timeperiod=9), nan=True)
+
+
+def _bias(name, ma, d):
+    bias = _put(d, name, (d['close'] - d[ma]) / d[ma], inf=True)
+    bias *= 100
+
+
+def _dpo(d):
+    c_m_11 = _put(d, 'c_m_11', tl.MA(d['close'], timeperiod=11))
+    dpo = _put(d, 'dpo', d['close'] - _shift(c_m_11, 1), nan=True)
+    _put(d, 'madpo', tl.MA(dpo, timeperiod=6), nan=True)
+
+
+def _vhf(d):
+    close = d['close']
+    hcp_lcp = _put(d, 'hcp_lcp', tl.MAX(close, timeperiod=28) - tl.MIN(close, timeperiod=28), nan=True)
+    _put(d, 'vhf', np.divide(hcp_lcp, tl.SUM(abs(close - d['prev_close']), timeperiod=28)), nan=True)
+
+
+def _rvi(d):
+    _open, close, high, low = d['open'], d['close'], d['high'], d['low']
+    rvi_x = _put(d, 'rvi_x', ((close - _open) +
+                              2 * (d['prev_close'] - _shift(_open, 1)) +
+                              2 * (_shift(close, 2) - _shift(_open, 2)) +
+                              (_shift(close, 3) - _shift(_open, 3))) / 6)
+    rvi_y = _put(d, 'rvi_y', ((high - low) +
+                              2 * (d['prev_high'] - d['prev_low']) +
+                              2 * (_shift(high, 2) - _shift(low, 2)) +
+                              (_shift(high, 3) - _shift(low, 3))) / 6)
+    rvi = _put(d, 'rvi', tl.MA(rvi_x, timeperiod=10) / tl.MA(rvi_y, timeperiod=10), inf=True)
+    _put(d, 'rvis', (rvi +
+                     2 * _shift(rvi, 1) +
+                     2 * _shift(rvi, 2) +
+                     _shift(rvi, 3)) / 6)
+
+
+def _fi(d):
+    _put(d, 'fi', np.insert(np.diff(d['close']), 0, 0.0) * d['volume'])
+
+
+def _force(name, timeperiod, d):
+    _put(d, name, tl.EMA(d['fi'], timeperiod=timeperiod), nan=True)
+
+
+def _ene(d):
+    ene_ue = _put(d, 'ene_ue', (1 + 11 / 100) * d['ma10'])
+    ene_le = _put(d, 'ene_le', (1 - 9 / 100) * d['ma10'])
+    _put(d, 'ene', (ene_ue + ene_le) / 2)
+
+
+# 指标计算步骤，按计算顺序排列
+# columns: 写入的列(对外的指标及中间结果)，deps: 读取的其它步骤的列及行情数据列，func: func(indicator_array)
+INDICATORS = {
+    'macd': {'columns': ('macd', 'macds', 'macdh'), 'deps': ('close',), 'func': _macd},
+    'kdj': {'columns': ('kdjk', 'kdjd', 'kdjj'), 'deps': ('high', 'low', 'close'), 'func': _kdj},
+    'boll': {'columns': ('boll_ub', 'boll', 'boll_lb'), 'deps': ('close',), 'func': _boll},
+    'trix': {'columns': ('trix', 'trix_20_sma'), 'deps': ('close',), 'func': _trix},
+    'm_price': {'columns': ('m_price',), 'deps': ('amount', 'volume'), 'func': _m_price},
+    'cr': {'columns': ('m_price_sf1', 'h_m', 'm_l', 'h_m_sum', 'm_l_sum', 'cr', 'cr-ma1', 'cr-ma2', 'cr-ma3'),
+           'deps': ('m_price', 'high', 'low'), 'func': _cr},
+    'rsi': {'columns': ('rsi',), 'deps': ('close',), 'func': partial(_rsi, 'rsi', 14)},
+    'rsi_6': {'columns': ('rsi_6',), 'deps': ('close',), 'func': partial(_rsi, 'rsi_6', 6)},
+    'rsi_12': {'columns': ('rsi_12',), 'deps': ('close',), 'func': partial(_rsi, 'rsi_12', 12)},
+    'rsi_24': {'columns': ('rsi_24',), 'deps': ('close',), 'func': partial(_rsi, 'rsi_24', 24)},
+    'vr': {'columns': ('av', 'avs', 'bv', 'bvs', 'cv', 'cvs', 'vr', 'vr_6_sma'), 'deps': ('p_change', 'volume'),
+           'func': _vr},
+    'prev_close': {'columns': ('prev_close',), 'deps': ('close',), 'func': _prev_close},
+    'tr': {'columns': ('h_l', 'h_cy', 'cy_l', 'h_cy_a', 'cy_l_a', 'tr'), 'deps': ('high', 'low', 'prev_close'),
+           'func': _tr},
+    'atr': {'columns': ('atr',), 'deps': ('high', 'low', 'close'), 'func': _atr},
+    'dm': {'columns': ('high_delta', 'high_m', 'low_delta', 'low_m'), 'deps': ('high', 'low'), 'func': _dm},
+    'pdm': {'columns': ('pdm',), 'deps': ('high_m', 'low_m'), 'func': _pdm},
+    'pdi': {'columns': ('pdi',), 'deps': ('pdm', 'atr'), 'func': _pdi},
+    'mdm': {'columns': ('mdm',), 'deps': ('high_m', 'low_m'), 'func': _mdm},
+    'mdi': {'columns': ('mdi',), 'deps': ('mdm', 'atr'), 'func': _mdi},
+    'dx': {'columns': ('dx',), 'deps': ('pdi', 'mdi'), 'func': _dx},
+    'adx': {'columns': ('adx',), 'deps': ('dx',), 'func': _adx},
+    'adxr': {'columns': ('adxr',), 'deps': ('adx',), 'func': _adxr},
+    'wr_6': {'columns': ('wr_6',), 'deps': ('high', 'low', 'close'), 'func': partial(_wr, 'wr_6', 6)},
+    'wr_10': {'columns': ('wr_10',), 'deps': ('high', 'low', 'close'), 'func': partial(_wr, 'wr_10', 10)},
+    'wr_14': {'columns': ('wr_14',), 'deps': ('high', 'low', 'close'), 'func': partial(_wr, 'wr_14', 14)},
+    'cci': {'columns': ('cci',), 'deps': ('high', 'low', 'close'), 'func': partial(_cci, 'cci', 14)},
+    'cci_84': {'columns': ('cci_84',), 'deps': ('high', 'low', 'close'), 'func': partial(_cci, 'cci_84', 84)},
+    'ma10': {'columns': ('ma10',), 'deps': ('close',), 'func': partial(_ma, 'ma10', 10)},
+    'ma50': {'columns': ('ma50',), 'deps': ('close',), 'func': partial(_ma, 'ma50', 50)},
+    'dma': {'columns': ('dma', 'dma_10_sma'), 'deps': ('ma10', 'ma50'), 'func': _dma},
+    'tema': {'columns': ('tema',), 'deps': ('close',), 'func': _tema},
+    'mfi': {'columns': ('mfi', 'mfisma'), 'deps': ('high', 'low', 'close', 'volume'), 'func': _mfi},
+    'vwma': {'columns': ('tpv_14', 'vol_14', 'vwma', 'mvwma'), 'deps': ('amount', 'volume'), 'func': _vwma},
+    'ppo': {'columns': ('ppo', 'ppos', 'ppoh'), 'deps': ('close',), 'func': _ppo},
+    'stochrsi': {'columns': ('rsi_min', 'rsi_max', 'stochrsi_k', 'stochrsi_d'), 'deps': ('rsi',), 'func': _stochrsi},
+    'wt': {'columns': ('esa', 'esa_d', 'esa_ci', 'wt1', 'wt2'), 'deps': ('m_price',), 'func': _wt},
+    'm_atr': {'columns': ('m_atr',), 'deps': ('atr',), 'func': _m_atr},
+    'hl_avg': {'columns': ('hl_avg',), 'deps': ('high', 'low'), 'func': _hl_avg},
+    'supertrend': {'columns': ('b_ub', 'b_lb', 'supertrend_ub', 'supertrend_lb', 'supertrend'),
+                   'deps': ('hl_avg', 'm_atr', 'close'), 'func': _supertrend},
+    'roc': {'columns': ('roc', 'rocma', 'rocema'), 'deps': ('close',), 'func': _roc},
+    'obv': {'columns': ('obv',), 'deps': ('close', 'volume'), 'func': _obv},
+    'sar': {'columns': ('sar',), 'deps': ('high', 'low'), 'func': _sar},
+    'psy': {'columns': ('price_up', 'price_up_sum', 'psy', 'psyma'), 'deps': ('close', 'prev_close'), 'func': _psy},
+    'ar': {'columns': ('h_o', 'o_l', 'h_o_sum', 'o_l_sum', 'ar'), 'deps': ('open', 'high', 'low'), 'func': _ar},
+    'br': {'columns': ('h_cy_sum', 'cy_l_sum', 'br'), 'deps': ('h_cy', 'cy_l'), 'func': _br},
+    'prev_hl': {'columns': ('prev_high', 'prev_low'), 'deps': ('high', 'low'), 'func': _prev_hl},
+    'emv': {'columns': ('phl_avg', 'emva_em', 'emv', 'emva'), 'deps': ('prev_high', 'prev_low', 'hl_avg', 'h_l', 'amount'),
+            'func': _emv},
+    'ma6': {'columns': ('ma6',), 'deps': ('close',), 'func': partial(_ma, 'ma6', 6)},
+    'ma12': {'columns': ('ma12',), 'deps': ('close',), 'func': partial(_ma, 'ma12', 12)},
+    'ma24': {'columns': ('ma24',), 'deps': ('close',), 'func': partial(_ma, 'ma24', 24)},
+    'bias': {'columns': ('bias',), 'deps': ('close', 'ma6'), 'func': partial(_bias, 'bias', 'ma6')},
+    'bias_12': {'columns': ('bias_12',), 'deps': ('close', 'ma12'), 'func': partial(_bias, 'bias_12', 'ma12')},
+    'bias_24': {'columns': ('bias_24',), 'deps': ('close', 'ma24'), 'func': partial(_bias, 'bias_24', 'ma24')},
+    'dpo': {'columns': ('c_m_11', 'dpo', 'madpo'), 'deps': ('close',), 'func': _dpo},
+    'vhf': {'columns': ('hcp_lcp', 'vhf'), 'deps': ('close', 'prev_close'), 'func': _vhf},
+    'rvi': {'columns': ('rvi_x', 'rvi_y', 'rvi', 'rvis'),
+            'deps': ('open', 'close', 'high', 'low', 'prev_close', 'prev_high', 'prev_low'), 'func': _rvi},
+    'fi': {'columns': ('fi',), 'deps': ('close', 'volume'), 'func': _fi},
+    'force_2': {'columns': ('force_2',), 'deps': ('fi',), 'func': partial(_force, 'force_2', 2)},
+    'force_13': {'columns': ('force_13',), 'deps': ('fi',), 'func': partial(_force, 'force_13', 13)},
+    'ene': {'columns': ('ene_ue', 'ene_le', 'ene'), 'deps': ('ma10',), 'func': _ene},
+    'vol_5': {'columns': ('vol_5',), 'deps': ('volume',), 'func': partial(_ma, 'vol_5', 5, column='volume')},
+    'vol_10': {'columns': ('vol_10',), 'deps': ('volume',), 'func': partial(_ma, 'vol_10', 10, column='volume')},
+    'ma20': {'columns': ('ma20',), 'deps': ('close',), 'func': partial(_ma, 'ma20', 20)},
+    'ma200': {'columns': ('ma200',), 'deps': ('close',), 'func': partial(_ma, 'ma200', 200)},
+}
+
+# 列 -> 计算该列的步骤
+_COLUMN_STEP = {column: step for step, conf in INDICATORS.items() for column in conf['columns']}
+
+
+def get_steps(columns=None):
+    """
+    计算指定列需要执行的步骤(包含依赖的步骤)，按计算顺序返回
+    columns: 指标列，为None时返回全部步骤
+    """
+    if columns is None:
+        return list(INDICATORS)
+    if isinstance(columns, str):
+        columns = (columns,)
+    need = set()
+    stack = list(columns)
+    while stack:
+        column = stack.pop()
+        step = _COLUMN_STEP.get(column)
+        if step is None:
+            # 行情数据的列
+            continue
+        if step in need:
+            continue
+        need.add(step)
+        stack.extend(INDICATORS[step]['deps'])
+    return [step for step in INDICATORS if step in need]
+
+
+def _calc(data, end_date, calc_threshold, columns, threshold):
+    data = stv.as_of(data, end_date, tail=calc_threshold)
+
+    steps = get_steps(columns)
+    inputs = [c for c in INPUT_COLUMNS if c in data.columns]
+    outputs = [c for step in steps for c in INDICATORS[step]['columns']]
+    n = len(data.index)
+    rows = n if threshold is None else max(min(threshold, n), 0)
+
+    # 相同的输入数据及计算参数直接使用缓存的结果
+    cache_key = icc.key(('calculate_indicator', VERSION, tuple(inputs), tuple(steps), rows),
+                        *(data[c].values for c in inputs))
+    values = icc.get(cache_key)
+    if values is not None:
+        d = indicator_array(inputs + outputs, values.copy(order='F'))
+    else:
+        # 行情数据及全部指标写入同一个二维数组，每列连续存放供talib直接使用
+        values = np.empty((n, len(inputs) + len(outputs)), order='F')
+        for i, c in enumerate(inputs):
+            values[:, i] = data[c].values
+        d = indicator_array(inputs + outputs, values)
 
         # import stockstats
         # test = data.copy()
         # test = stockstats.StockDataFrame.retype(test)  # 验证计算结果
 
         with np.errstate(divide='ignore', invalid='ignore'):
+            for step in steps:
+                INDICATORS[step]['func'](d)
+        d = d.tail(rows)
+        icc.put(cache_key, d.values.copy(order='F'))
+    return data.tail(n=rows), d, len(inputs)
+
+
+def get_indicators_array(data, end_date=None, threshold=120, calc_threshold=None, columns=None):
+    """
+    计算指标，不生成DataFrame
+    参数同get_indicators
+    返回 indicator_array，为最后threshold条数据
+    """
+    try:
+        data, d, k = _calc(data, end_date, calc_threshold, columns, threshold)
+        return d
+    except Exception as e:
+        logging.error(f"calculate_indicator.get_indicators_array处理异常：{data['code']}代码{e}")
+    return None
+
 
-            # macd
-            data.loc[:, 'macd'], data.loc[:, 'macds'], data.loc[:, 'macdh'] = tl.MACD(
-                data['close'].values, fastperiod=12, slowperiod=26, signalperiod=9)
-            data['macd'].values[np.isnan(data['macd'].values)] = 0.0
-            data['macds'].values[np.isnan(data['macds'].values)] = 0.0
-            data['macdh'].values[np.isnan(data['macdh'].values)] = 0.0
-
-            # kdjk
-            data.loc[:, 'kdjk'], data.loc[:, 'kdjd'] = tl.STOCH(
-                data['high'].values, data['low'].values, data['close'].values, fastk_period=9,
-                slowk_period=5, slowk_matype=1, slowd_period=5, slowd_matype=1)
-            data['kdjk'].values[np.isnan(data['kdjk'].values)] = 0.0
-            data['kdjd'].values[np.isnan(data['kdjd'].values)] = 0.0
-            data.loc[:, 'kdjj'] = 3 * data['kdjk'].values - 2 * data['kdjd'].values
-
-            # boll 计算结果和stockstats不同boll_ub,boll_lb
-            data.loc[:, 'boll_ub'], data.loc[:, 'boll'], data.loc[:, 'boll_lb'] = tl.BBANDS \
-                (data['close'].values, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0)
-            data['boll_ub'].values[np.isnan(data['boll_ub'].values)] = 0.0
-            data['boll'].values[np.isnan(data['boll'].values)] = 0.0
-            data['boll_lb'].values[np.isnan(data['boll_lb'].values)] = 0.0
-
-            # trix
-            data.loc[:, 'trix'] = tl.TRIX(data['close'].values, timeperiod=12)
-            data['trix'].values[np.isnan(data['trix'].values)] = 0.0
-            data.loc[:, 'trix_20_sma'] = tl.MA(data['trix'].values, timeperiod=20)
-            data['trix_20_sma'].values[np.isnan(data['trix_20_sma'].values)] = 0.0
-
-            # cr
-            data.loc[:, 'm_price'] = data['amount'].values / data['volume'].values
-            data.loc[:, 'm_price_sf1'] = data['m_price'].shift(1, fill_value=0.0).values
-            data.loc[:, 'h_m'] = data['high'].values - data[['m_price_sf1', 'high']].values.min(axis=1)
-            data.loc[:, 'm_l'] = data['m_price_sf1'].values - data[['m_price_sf1', 'low']].values.min(axis=1)
-            data.loc[:, 'h_m_sum'] = tl.SUM(data['h_m'].values, timeperiod=26)
-            data.loc[:, 'm_l_sum'] = tl.SUM(data['m_l'].values, timeperiod=26)
-            data.loc[:, 'cr'] = data['h_m_sum'].values / data['m_l_sum'].values
-            data['cr'].values[np.isnan(data['cr'].values)] = 0.0
-            data['cr'].values[np.isinf(data['cr'].values)] = 0.0
-            data['cr'] = data['cr'].values * 100
-            data.loc[:, 'cr-ma1'] = tl.MA(data['cr'].values, timeperiod=5)
-            data['cr-ma1'].values[np.isnan(data['cr-ma1'].values)] = 0.0
-            data.loc[:, 'cr-ma2'] = tl.MA(data['cr'].values, timeperiod=10)
-            data['cr-ma2'].values[np.isnan(data['cr-ma2'].values)] = 0.0
-            data.loc[:, 'cr-ma3'] = tl.MA(data['cr'].values, timeperiod=20)
-            data['cr-ma3'].values[np.isnan(data['cr-ma3'].values)] = 0.0
-
-            # rsi
-            data.loc[:, 'rsi'] = tl.RSI(data['close'].values, timeperiod=14)
-            data['rsi'].values[np.isnan(data['rsi'].values)] = 0.0
-            data.loc[:, 'rsi_6'] = tl.RSI(data['close'].values, timeperiod=6)
-            data['rsi_6'].values[np.isnan(data['rsi_6'].values)] = 0.0
-            data.loc[:, 'rsi_12'] = tl.RSI(data['close'].values, timeperiod=12)
-            data['rsi_12'].values[np.isnan(data['rsi_12'].values)] = 0.0
-            data.loc[:, 'rsi_24'] = tl.RSI(data['close'].values, timeperiod=24)
-            data['rsi_24'].values[np.isnan(data['rsi_24'].values)] = 0.0
-
-            # vr
-            data.loc[:, 'av'] = np.where(data['p_change'].values > 0, data['volume'].values, 0)
-            data.loc[:, 'avs'] = tl.SUM(data['av'].values, timeperiod=26)
-            data.loc[:, 'bv'] = np.where(data['p_change'].values < 0, data['volume'].values, 0)
-            data.loc[:, 'bvs'] = tl.SUM(data['bv'].values, timeperiod=26)
-            data.loc[:, 'cv'] = np.where(data['p_change'].values == 0, data['volume'].values, 0)
-            data.loc[:, 'cvs'] = tl.SUM(data['cv'].values, timeperiod=26)
-            data.loc[:, 'vr'] = (data['avs'].values + data['cvs'].values / 2) / (data['bvs'].values + data['cvs'].values / 2)
-            data['vr'].values[np.isnan(data['vr'].values)] = 0.0
-            data['vr'].values[np.isinf(data['vr'].values)] = 0.0
-            data['vr'] = data['vr'].values * 100
-            data.loc[:, 'vr_6_sma'] = tl.MA(data['vr'].values, timeperiod=6)
-            data['vr_6_sma'].values[np.isnan(data['vr_6_sma'].values)] = 0.0
-
-            # atr
-            data.loc[:, 'prev_close'] = data['close'].shift(1, fill_value=0.0).values
-            data.loc[:, 'h_l'] = data['high'].values - data['low'].values
-            data.loc[:, 'h_cy'] = data['high'].values - data['prev_close'].values
-            data.loc[:, 'cy_l'] = data['prev_close'].values - data['low'].values
-            data.loc[:, 'h_cy_a'] = abs(data['h_cy'].values)
-            data.loc[:, 'cy_l_a'] = abs(data['cy_l'].values)
-            data.loc[:, 'tr'] = data.loc[:, ['h_l', 'h_cy_a', 'cy_l_a']].T.max().values
-            data['tr'].values[np.isnan(data['tr'].values)] = 0.0
-            data.loc[:, 'atr'] = tl.ATR(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['atr'].values[np.isnan(data['atr'].values)] = 0.0
-
-            # DMI
-            # talib计算公式和stockstats不同
-            # talib计算公式
-            # data.loc[:, 'pdi'] = tl.PLUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
-            # data.loc[:, 'mdi'] = tl.MINUS_DI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
-            # data.loc[:, 'dx'] = tl.DX(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            # data['dx'].values[np.isnan(data['dx'].values)] = 0.0
-            # data.loc[:, 'adx'] = tl.ADX(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            # data['adx'].values[np.isnan(data['adx'].values)] = 0.0
-            # data.loc[:, 'adxr'] = tl.ADXR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            # data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
-            # stockstats计算公式
-            data.loc[:, 'high_delta'] = np.insert(np.diff(data['high'].values), 0, 0.0)
-            data.loc[:, 'high_m'] = (data['high_delta'].values + abs(data['high_delta'].values)) / 2
-            data.loc[:, 'low_delta'] = np.insert(-np.diff(data['low'].values), 0, 0.0)
-            data.loc[:, 'low_m'] = (data['low_delta'].values + abs(data['low_delta'].values)) / 2
-            data.loc[:, 'pdm'] = tl.EMA(np.where(data['high_m'].values > data['low_m'].values, data['high_m'].values, 0), timeperiod=14)
-            data['pdm'].values[np.isnan(data['pdm'].values)] = 0.0
-            data.loc[:, 'pdi'] = data['pdm'].values / data['atr'].values
-            data['pdi'].values[np.isnan(data['pdi'].values)] = 0.0
-            data['pdi'].values[np.isinf(data['pdi'].values)] = 0.0
-            data['pdi'] = data['pdi'].values * 100
-            data.loc[:, 'mdm'] = tl.EMA(np.where(data['low_m'].values > data['high_m'].values, data['low_m'].values, 0), timeperiod=14)
-            data['mdm'].values[np.isnan(data['mdm'].values)] = 0.0
-            data.loc[:, 'mdi'] = data['mdm'].values / data['atr'].values
-            data['mdi'].values[np.isnan(data['mdi'].values)] = 0.0
-            data['mdi'].values[np.isinf(data['mdi'].values)] = 0.0
-            data['mdi'] = data['mdi'].values * 100
-            data.loc[:, 'dx'] = abs(data['pdi'].values - data['mdi'].values) / (data['pdi'].values + data['mdi'].values)
-            data['dx'].values[np.isnan(data['dx'].values)] = 0.0
-            data['dx'].values[np.isinf(data['dx'].values)] = 0.0
-            data['dx'] = data['dx'].values * 100
-            data.loc[:, 'adx'] = tl.EMA(data['dx'].values, timeperiod=6)
-            data['adx'].values[np.isnan(data['adx'].values)] = 0.0
-            data.loc[:, 'adxr'] = tl.EMA(data['adx'].values, timeperiod=6)
-            data['adxr'].values[np.isnan(data['adxr'].values)] = 0.0
-
-            # wr
-            data.loc[:, 'wr_6'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=6)
-            data['wr_6'].values[np.isnan(data['wr_6'].values)] = 0.0
-            data.loc[:, 'wr_10'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=10)
-            data['wr_10'].values[np.isnan(data['wr_10'].values)] = 0.0
-            data.loc[:, 'wr_14'] = tl.WILLR(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['wr_14'].values[np.isnan(data['wr_14'].values)] = 0.0
-
-            # cci 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
-            data.loc[:, 'cci'] = tl.CCI(data['high'].values, data['low'].values, data['close'].values, timeperiod=14)
-            data['cci'].values[np.isnan(data['cci'].values)] = 0.0
-            data.loc[:, 'cci_84'] = tl.CCI(data['high'].values, data['low'].values, data['close'].values, timeperiod=84)
-            data['cci_84'].values[np.isnan(data['cci_84'].values)] = 0.0
-
-            # dma
-            data.loc[:, 'ma10'] = tl.MA(data['close'].values, timeperiod=10)
-            data['ma10'].values[np.isnan(data['ma10'].values)] = 0.0
-            data.loc[:, 'ma50'] = tl.MA(data['close'].values, timeperiod=50)
-            data['ma50'].values[np.isnan(data['ma50'].values)] = 0.0
-            data.loc[:, 'dma'] = data['ma10'].values - data['ma50'].values
-            data.loc[:, 'dma_10_sma'] = tl.MA(data['dma'].values, timeperiod=10)
-            data['dma_10_sma'].values[np.isnan(data['dma_10_sma'].values)] = 0.0
-
-            # tema
-            data.loc[:, 'tema'] = tl.TEMA(data['close'].values, timeperiod=14)
-            data['tema'].values[np.isnan(data['tema'].values)] = 0.0
-
-            # mfi 计算方法和结果和stockstats不同，stockstats典型价采用均价(总额/成交量)计算
-            data.loc[:, 'mfi'] = tl.MFI(data['high'].values, data['low'].values, data['close'].values, data['volume'].values, timeperiod=14)
-            data['mfi'].values[np.isnan(data['mfi'].values)] = 0.0
-            data.loc[:, 'mfisma'] = tl.MA(data['mfi'].values, timeperiod=6)
-
-            # vwma
-            data.loc[:, 'tpv_14'] = tl.SUM(data['amount'].values, timeperiod=14)
-            data.loc[:, 'vol_14'] = tl.SUM(data['volume'].values, timeperiod=14)
-            data.loc[:, 'vwma'] = data['tpv_14'].values / data['vol_14'].values
-            data['vwma'].values[np.isnan(data['vwma'].values)] = 0.0
-            data['vwma'].values[np.isinf(data['vwma'].values)] = 0.0
-            data.loc[:, 'mvwma'] = tl.MA(data['vwma'].values, timeperiod=6)
-
-            # ppo
-            data.loc[:, 'ppo'] = tl.PPO(data['close'].values, fastperiod=12, slowperiod=26, matype=1)
-            data['ppo'].values[np.isnan(data['ppo'].values)] = 0.0
-            data.loc[:, 'ppos'] = tl.EMA(data['ppo'].values, timeperiod=9)
-            data['ppos'].values[np.isnan(data['ppos'].values)] = 0.0
-            data.loc[:, 'ppoh'] = data['ppo'].values - data['ppos'].values
-
-            # stochrsi
-            # talib计算公式和stockstats不同
-            # talib计算公式
-            # data.loc[:, 'stochrsi_k'], data.loc[:, 'stochrsi_d'] = tl.STOCHRSI(data['close'].values, timeperiod=14, fastk_period=5, fastd_period=3, fastd_matype=0)
-            data.loc[:, 'rsi_min'] = tl.MIN(data['rsi'].values, timeperiod=14)
-            data.loc[:, 'rsi_max'] = tl.MAX(data['rsi'].values, timeperiod=14)
-            data.loc[:, 'stochrsi_k'] = (data['rsi'].values - data['rsi_min'].values) / (data['rsi_max'].values - data['rsi_min'].values)
-            data['stochrsi_k'].values[np.isnan(data['stochrsi_k'].values)] = 0.0
-            data['stochrsi_k'].values[np.isinf(data['stochrsi_k'].values)] = 0.0
-            data['stochrsi_k'] = data['stochrsi_k'].values * 100
-            data.loc[:, 'stochrsi_d'] = tl.MA(data['stochrsi_k'].values, timeperiod=3)
-
-            # wt
-            data.loc[:, 'esa'] = tl.EMA(data['m_price'].values, timeperiod=10)
-            data['esa'].values[np.isnan(data['esa'].values)] = 0.0
-            data.loc[:, 'esa_d'] = tl.EMA(abs(data['m_price'].values - data['esa'].values), timeperiod=10)
-            data.loc[:, 'esa_ci'] = (data['m_price'].values - data['esa'].values) / (0.015 * data['esa_d'].values)
-            data['esa_ci'].values[np.isnan(data['esa_ci'].values)] = 0.0
-            data['esa_ci'].values[np.isinf(data['esa_ci'].values)] = 0.0
-            data.loc[:, 'wt1'] = tl.EMA(data['esa_ci'].values, timeperiod=21)
-            data['wt1'].values[np.isnan(data['wt1'].values)] = 0.0
-            data.loc[:, 'wt2'] = tl.MA(data['wt1'].values, timeperiod=4)
-            data['wt2'].values[np.isnan(data['wt2'].values)] = 0.0
-
-            # Supertrend
-            data.loc[:, 'm_atr'] = data['atr'].values * 3
-            data.loc[:, 'hl_avg'] = (data['high'].values + data['low'].values) / 2.0
-            data.loc[:, 'b_ub'] = data['hl_avg'].values + data['m_atr'].values
-            data.loc[:, 'b_lb'] = data['hl_avg'].values - data['m_atr'].values
-            size = len(data.index)
-            ub = np.empty(size, dtype=np.float64)
-            lb = np.empty(size, dtype=np.float64)
-            st = np.empty(size, dtype=np.float64)
-            for i in range(size):
-                if i == 0:
-                    ub[i] = data['b_ub'].iloc[i]
-                    lb[i] = data['b_lb'].iloc[i]
-                    if data['close'].iloc[i] <= ub[i]:
-                        st[i] = ub[i]
-                    else:
-                        st[i] = lb[i]
-                    continue
-
-                last_close = data['close'].iloc[i - 1]
-                curr_close = data['close'].iloc[i]
-                last_ub = ub[i - 1]
-                last_lb = lb[i - 1]
-                last_st = st[i - 1]
-                curr_b_ub = data['b_ub'].iloc[i]
-                curr_b_lb = data['b_lb'].iloc[i]
-
-                # calculate current upper band
-                if curr_b_ub < last_ub or last_close > last_ub:
-                    ub[i] = curr_b_ub
-                else:
-                    ub[i] = last_ub
-
-                # calculate current lower band
-                if curr_b_lb > last_lb or last_close < last_lb:
-                    lb[i] = curr_b_lb
-                else:
-                    lb[i] = last_lb
-
-                # calculate supertrend
-                if last_st == last_ub:
-                    if curr_close <= ub[i]:
-                        st[i] = ub[i]
-                    else:
-                        st[i] = lb[i]
-                elif last_st == last_lb:
-                    if curr_close > lb[i]:
-                        st[i] = lb[i]
-                    else:
-                        st[i] = ub[i]
-
-            data.loc[:, 'supertrend_ub'] = ub
-            data.loc[:, 'supertrend_lb'] = lb
-            data.loc[:, 'supertrend'] = st
-            data = data.copy()
-            # ----------stockstats没有以下指标-----------------
-            # roc
-            data.loc[:, 'roc'] = tl.ROC(data['close'].values, timeperiod=12)
-            data['roc'].values[np.isnan(data['roc'].values)] = 0.0
-            data.loc[:, 'rocma'] = tl.MA(data['roc'].values, timeperiod=6)
-            data['rocma'].values[np.isnan(data['rocma'].values)] = 0.0
-            data.loc[:, 'rocema'] = tl.EMA(data['roc'].values, timeperiod=9)
-            data['rocema'].values[np.isnan(data['rocema'].values)] = 0.0
-
-            # obv
-            data.loc[:, 'obv'] = tl.OBV(data['close'].values, data['volume'].values)
-            data['obv'].values[np.isnan(data['obv'].values)] = 0.0
-
-            # sar
-            data.loc[:, 'sar'] = tl.SAR(data['high'].values, data['low'].values)
-            data['sar'].values[np.isnan(data['sar'].values)] = 0.0
-
-            # psy
-            data.loc[:, 'price_up'] = 0.0
-            data.loc[data['close'].values > data['prev_close'].values, 'price_up'] = 1.0
-            data.loc[:, 'price_up_sum'] = tl.SUM(data['price_up'].values, timeperiod=12)
-            data.loc[:, 'psy'] = data['price_up_sum'].values / 12.0
-            data['psy'].values[np.isnan(data['psy'].values)] = 0.0
-            data['psy'] = data['psy'].values * 100
-            data.loc[:, 'psyma'] = tl.MA(data['psy'].values, timeperiod=6)
-
-            # BRAR
-            data.loc[:, 'h_o'] = data['high'].values - data['open'].values
-            data.loc[:, 'o_l'] = data['open'].values - data['low'].values
-            data.loc[:, 'h_o_sum'] = tl.SUM(data['h_o'].values, timeperiod=26)
-            data.loc[:, 'o_l_sum'] = tl.SUM(data['o_l'].values, timeperiod=26)
-            data.loc[:, 'ar'] = data['h_o_sum'] .values / data['o_l_sum'].values
-            data['ar'].values[np.isnan(data['ar'].values)] = 0.0
-            data['ar'].values[np.isinf(data['ar'].values)] = 0.0
-            data['ar'] = data['ar'].values * 100
-            data.loc[:, 'h_cy_sum'] = tl.SUM(data['h_cy'].values, timeperiod=26)
-            data.loc[:, 'cy_l_sum'] = tl.SUM(data['cy_l'].values, timeperiod=26)
-            data.loc[:, 'br'] = data['h_cy_sum'].values / data['cy_l_sum'].values
-            data['br'].values[np.isnan(data['br'].values)] = 0.0
-            data['br'].values[np.isinf(data['br'].values)] = 0.0
-            data['br'] = data['br'].values * 100
-
-            # EMV
-            data.loc[:, 'prev_high'] = data['high'].shift(1, fill_value=0.0).values
-            data.loc[:, 'prev_low'] = data['low'].shift(1, fill_value=0.0).values
-            data.loc[:, 'phl_avg'] = (data['prev_high'].values + data['prev_low'].values) / 2.0
-            data.loc[:, 'emva_em'] = (data['hl_avg'].values - data['phl_avg'].values) * data['h_l'].values / data['amount'].values
-            data.loc[:, 'emv'] = tl.SUM(data['emva_em'].values, timeperiod=14)
-            data['emv'].values[np.isnan(data['emv'].values)] = 0.0
-            data.loc[:, 'emva'] = tl.MA(data['emv'].values, timeperiod=9)
-            data['emva'].values[np.isnan(data['emva'].values)] = 0.0
-
-            # BIAS
-            data.loc[:, 'ma6'] = tl.MA(data['close'].values, timeperiod=6)
-            data['ma6'].values[np.isnan(data['ma6'].values)] = 0.0
-            data.loc[:, 'ma12'] = tl.MA(data['close'].values, timeperiod=12)
-            data['ma12'].values[np.isnan(data['ma12'].values)] = 0.0
-            data.loc[:, 'ma24'] = tl.MA(data['close'].values, timeperiod=24)
-            data['ma24'].values[np.isnan(data['ma24'].values)] = 0.0
-            data.loc[:, 'bias'] = ((data['close'].values - data['ma6'].values) / data['ma6'].values)
-            data['bias'].values[np.isnan(data['bias'].values)] = 0.0
-            data['bias'].values[np.isinf(data['bias'].values)] = 0.0
-            data['bias'] = data['bias'].values * 100
-            data.loc[:, 'bias_12'] = (data['close'].values - data['ma12'].values) / data['ma12'].values
-            data['bias_12'].values[np.isnan(data['bias_12'].values)] = 0.0
-            data['bias_12'].values[np.isinf(data['bias_12'].values)] = 0.0
-            data['bias_12'] = data['bias_12'].values * 100
-            data.loc[:, 'bias_24'] = (data['close'].values - data['ma24'].values) / data['ma24'].values
-            data['bias_24'].values[np.isnan(data['bias_24'].values)] = 0.0
-            data['bias_24'].values[np.isinf(data['bias_24'].values)] = 0.0
-            data['bias_24'] = data['bias_24'].values * 100
-
-            # DPO
-            data.loc[:, 'c_m_11'] = tl.MA(data['close'].values, timeperiod=11)
-            data.loc[:, 'dpo'] = data['close'].values - data['c_m_11'].shift(1, fill_value=0.0).values
-            data['dpo'].values[np.isnan(data['dpo'].values)] = 0.0
-            data.loc[:, 'madpo'] = tl.MA(data['dpo'].values, timeperiod=6)
-            data['madpo'].values[np.isnan(data['madpo'].values)] = 0.0
-
-            # VHF
-            data.loc[:, 'hcp_lcp'] = tl.MAX(data['close'].values, timeperiod=28) - tl.MIN(data['close'].values, timeperiod=28)
-            data['hcp_lcp'].values[np.isnan(data['hcp_lcp'].values)] = 0.0
-            data.loc[:, 'vhf'] = np.divide(data['hcp_lcp'].values, tl.SUM(abs(data['close'].values - data['prev_close'].values), timeperiod=28))
-            data['vhf'].values[np.isnan(data['vhf'].values)] = 0.0
-
-            # RVI
-            data.loc[:, 'rvi_x'] = ((data['close'].values - data['open'].values) +
-                                    2 * (data['prev_close'].values - data['open'].shift(1, fill_value=0.0).values) +
-                                    2 * (data['close'].shift(2, fill_value=0.0).values - data['open'].shift(2, fill_value=0.0).values) +
-                                    (data['close'].shift(3, fill_value=0.0).values - data['open'].shift(3, fill_value=0.0).values)) / 6
-            data.loc[:, 'rvi_y'] = ((data['high'].values - data['low'].values) +
-                                    2 * (data['prev_high'].values - data['prev_low'].values) +
-                                    2 * (data['high'].shift(2, fill_value=0.0).values - data['low'].shift(2, fill_value=0.0).values) +
-                                    (data['high'].shift(3, fill_value=0.0).values - data['low'].shift(3, fill_value=0.0).values)) / 6
-            data.loc[:, 'rvi'] = tl.MA(data['rvi_x'].values, timeperiod=10) / tl.MA(data['rvi_y'].values, timeperiod=10)
-            data['rvi'].values[np.isnan(data['rvi'].values)] = 0.0
-            data['rvi'].values[np.isinf(data['rvi'].values)] = 0.0
-            data.loc[:, 'rvis'] = (data['rvi'].values +
-                                   2 * data['rvi'].shift(1, fill_value=0.0).values +
-                                   2 * data['rvi'].shift(2, fill_value=0.0).values +
-                                   data['rvi'].shift(3, fill_value=0.0).values) / 6
-
-            # FI
-            data.loc[:, 'fi'] = np.insert(np.diff(data['close'].values), 0, 0.0) * data['volume'].values
-            data.loc[:, 'force_2'] = tl.EMA(data['fi'].values, timeperiod=2)
-            data['force_2'].values[np.isnan(data['force_2'].values)] = 0.0
-            data.loc[:, 'force_13'] = tl.EMA(data['fi'].values, timeperiod=13)
-            data['force_13'].values[np.isnan(data['force_13'].values)] = 0.0
-
-            # ENE
-            data.loc[:, 'ene_ue'] = (1 + 11 / 100) * data['ma10'].values
-            data.loc[:, 'ene_le'] = (1 - 9 / 100) * data['ma10'].values
-            data.loc[:, 'ene'] = (data['ene_ue'].values + data['ene_le'].values) / 2
-
-            # VOL
-            data.loc[:, 'vol_5'] = tl.MA(data['volume'].values, timeperiod=5)
-            data['vol_5'].values[np.isnan(data['vol_5'].values)] = 0.0
-            data.loc[:, 'vol_10'] = tl.MA(data['volume'].values, timeperiod=10)
-            data['vol_10'].values[np.isnan(data['vol_10'].values)] = 0.0
-
-            # MA
-            data.loc[:, 'ma20'] = tl.MA(data['close'].values, timeperiod=20)
-            data['ma20'].values[np.isnan(data['ma20'].values)] = 0.0
-            data.loc[:, 'ma200'] = tl.MA(data['close'].values, timeperiod=200)
-            data['ma200'].values[np.isnan(data['ma200'].values)] = 0.0
-
-        if threshold is not None:
-            data = data.tail(n=threshold).copy()
-        return data
+def get_indicators(data, end_date=None, threshold=120, calc_threshold=None, columns=None):
+    """
+    计算指标
+    data: 数据
+    end_date: 结束日期
+    threshold: 阈值,返回的数据量
+    calc_threshold: 计算阈值, 用于计算之前截取数据
+    columns: 需要的指标列，只计算这些列及其依赖，为None时计算全部指标
+    """
+    try:
+        data, d, k = _calc(data, end_date, calc_threshold, columns, threshold)
+        # 原数据的列之后是指标列
+        indicators = pd.DataFrame(d.values[:, k:], index=data.index, columns=d.columns[k:])
+        return pd.concat([data, indicators], axis=1)
     except Exception as e:
         logging.error(f"calculate_indicator.get_indicators处理异常：{data['code']}代码{e}")
     return None
@@ -439,7 +571,7 @@ def get_indicator(code_name, data, stock_column, date=None, calc_threshold=90):
             return pd.Series(stock_data_list, index=stock_column)
 
         # 使用90天数据计算指标，只返回最后一个数据
-        idr_data = get_indicators(data, end_date=end_date, threshold=1, calc_threshold=calc_threshold)
+        idr_data = get_indicators_array(data, end_date=end_date, threshold=1, calc_threshold=calc_threshold)
 
         # 增加空判断，如果是空返回 0 数据。
         if idr_data is None:
@@ -447,10 +579,10 @@ def get_indicator(code_name, data, stock_column, date=None, calc_threshold=90):
                 stock_data_list.append(0)
             return pd.Series(stock_data_list, index=stock_column)
 
-        # 初始化统计类
+        # 直接读取最后一行
+        last = idr_data.values[-1]
         for i in range(columns_num):
-            # 将数据的最后一个返回。
-            tmp_val = idr_data[stock_column[i + 2]].tail(1).values[0]
+            tmp_val = last[idr_data.index[stock_column[i + 2]]]
             # 解决值中存在INF NaN问题。
             if np.isinf(tmp_val) or np.isnan(tmp_val):
                 stock_data_list.append(0)
@@ -0,0 +1,767 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+import instock.core.indicator.indicator_cache as icc
+import instock.core.stock_view as stv
+
+__author__ = 'myh '
+__date__ = '2025/3/18 '
+
+# 全市场截面指标计算，与calculate_indicator.get_indicator的结果一致。
+# 所有股票最近calc_threshold个交易日的数据右对齐排成 交易日 × 股票 的二维数组，左边不足的为NaN，
+# 按交易日循环、每一步对所有股票一起计算，不再逐个股票建DataFrame、逐列调用talib。
+# 各函数按talib的计算步骤实现(包括求和顺序)，每个股票从第一个不为NaN的位置开始计算，与talib一致。
+
+INPUT_FIELDS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')
+
+# 修改计算方法时加1，使缓存的计算结果失效
+VERSION = 1
+
+
+def _begin(*args):
+    # 每个股票第一个所有输入都不为NaN的位置，同talib的check_begidx
+    valid = ~np.isnan(args[0])
+    for x in args[1:]:
+        valid &= ~np.isnan(x)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), valid.shape[0])
+
+
+def _first(b, n):
+    # 循环开始的交易日
+    return int(b.min()) + n if len(b) > 0 else 0
+
+
+def _ma(x, p, div=True):
+    # tl.MA(matype=0)/tl.SUM
+    T, S = x.shape
+    b = _begin(x)
+    out = np.full((T, S), np.nan)
+    total = np.zeros(S)
+    for t in range(_first(b, 0), T):
+        k = t - b
+        total = np.where(k >= 0, total + x[t], total)
+        m = k >= p - 1
+        out[t] = np.where(m, total / p if div else total, np.nan)
+        if t >= p - 1:
+            total = np.where(m, total - x[t - p + 1], total)
+    return out
+
+
+def _sum(x, p):
+    return _ma(x, p, div=False)
+
+
+def _ema(x, p, lookback=None):
+    # tl.EMA，第lookback个数据输出第一个值，初值为截止到此的p个数据的均值
+    T, S = x.shape
+    b = _begin(x)
+    if lookback is None:
+        lookback = p - 1
+    seed = b + lookback
+    out = np.full((T, S), np.nan)
+    if not (seed < T).any():
+        return out
+    cols = np.arange(S)
+    total = np.zeros(S)
+    for j in range(p):
+        total += x[np.minimum(seed - p + 1 + j, T - 1), cols]
+    prev = total / p
+    k = 2.0 / (p + 1)
+    for t in range(int(seed.min()), T):
+        prev = np.where(t > seed, (x[t] - prev) * k + prev, prev)
+        out[t] = np.where(t >= seed, prev, np.nan)
+    return out
+
+
+def _rolling(x, p, func):
+    # 滚动最大/最小值，不足p个数据的为NaN
+    T = x.shape[0]
+    b = _begin(x)
+    out = x.copy()
+    for w in range(1, p):
+        out[w:] = func(out[w:], x[:T - w])
+    out[np.arange(T)[:, None] - b < p - 1] = np.nan
+    return out
+
+
+def _max(x, p):
+    return _rolling(x, p, np.maximum)
+
+
+def _min(x, p):
+    return _rolling(x, p, np.minimum)
+
+
+def _macd(x, fast=12, slow=26, signal=9):
+    # 快慢线都从第slow-1个数据开始，快线初值为截止到此的fast个数据的均值
+    lookback = slow - 1
+    macd = _ema(x, fast, lookback) - _ema(x, slow, lookback)
+    macds = _ema(macd, signal)
+    macd[np.isnan(macds)] = np.nan
+    return macd, macds, macd - macds
+
+
+def _ppo(x, fast=12, slow=26):
+    # matype=1，与macd不同，快线从第fast-1个数据开始
+    fast_ma = _ema(x, fast)
+    slow_ma = _ema(x, slow)
+    out = np.where((-0.00000001 < slow_ma) & (slow_ma < 0.00000001), 0.0, ((fast_ma - slow_ma) / slow_ma) * 100.0)
+    out[np.isnan(slow_ma)] = np.nan
+    return out
+
+
+def _trix(x, p):
+    e3 = _ema(_ema(_ema(x, p), p), p)
+    return _roc(e3, 1)
+
+
+def _tema(x, p):
+    e1 = _ema(x, p)
+    e2 = _ema(e1, p)
+    e3 = _ema(e2, p)
+    return e3 + ((3.0 * e1) - (3.0 * e2))
+
+
+def _roc(x, p):
+    T, S = x.shape
+    b = _begin(x)
+    out = np.full((T, S), np.nan)
+    prev = x[:T - p]
+    out[p:] = np.where(prev != 0.0, ((x[p:] / prev) - 1.0) * 100.0, 0.0)
+    out[np.arange(T)[:, None] - b < p] = np.nan
+    return out
+
+
+def _rsi(x, p):
+    T, S = x.shape
+    b = _begin(x)
+    out = np.full((T, S), np.nan)
+    prev_value = np.zeros(S)
+    gain = np.zeros(S)
+    loss = np.zeros(S)
+    for t in range(_first(b, 0), T):
+        k = t - b
+        diff = x[t] - prev_value
+        m = k > p
+        loss = np.where(m, loss * (p - 1), loss)
+        gain = np.where(m, gain * (p - 1), gain)
+        neg = diff < 0
+        loss = np.where((k >= 1) & neg, loss - diff, loss)
+        gain = np.where((k >= 1) & ~neg, gain + diff, gain)
+        m = k >= p
+        loss = np.where(m, loss / p, loss)
+        gain = np.where(m, gain / p, gain)
+        prev_value = np.where(k >= 0, x[t], prev_value)
+        total = gain + loss
+        out[t] = np.where(m, np.where((-0.00000001 < total) & (total < 0.00000001), 0.0, 100.0 * (gain / total)), np.nan)
+    return out
+
+
+def _atr(high, low, close, p):
+    T, S = high.shape
+    b = _begin(high, low, close)
+    # 真实波幅，从第二个数据开始
+    prev_close = np.full((T, S), np.nan)
+    prev_close[1:] = close[:-1]
+    tr = high - low
+    val = np.abs(prev_close - high)
+    tr = np.where(val > tr, val, tr)
+    val = np.abs(prev_close - low)
+    tr = np.where(val > tr, val, tr)
+    out = np.full((T, S), np.nan)
+    total = np.zeros(S)
+    prev = np.zeros(S)
+    for t in range(_first(b, 1), T):
+        k = t - b
+        total = np.where((k >= 1) & (k <= p), total + tr[t], total)
+        prev = np.where(k == p, total / p, np.where(k > p, ((prev * (p - 1)) + tr[t]) / p, prev))
+        out[t] = np.where(k >= p, prev, np.nan)
+    return out
+
+
+def _stoch(high, low, close, fastk_period=9, slowk_period=5, slowd_period=5):
+    # slowk_matype=1, slowd_matype=1
+    T = high.shape[0]
+    b = _begin(high, low, close)
+    highest = _max(high, fastk_period)
+    lowest = _min(low, fastk_period)
+    diff = (highest - lowest) / 100.0
+    fastk = np.where(diff != 0.0, (close - lowest) / diff, 0.0)
+    k = np.arange(T)[:, None] - b
+    fastk[k < fastk_period - 1] = np.nan
+    slowk = _ema(fastk, slowk_period)
+    slowd = _ema(slowk, slowd_period)
+    slowk[k < fastk_period + slowk_period + slowd_period - 3] = np.nan
+    return slowk, slowd
+
+
+def _bbands(x, p, nbdev):
+    # matype=0
+    T, S = x.shape
+    b = _begin(x)
+    middle = _ma(x, p)
+    sd = np.full((T, S), np.nan)
+    square = x * x
+    total = np.zeros(S)
+    for t in range(_first(b, 0), T):
+        k = t - b
+        total = np.where(k >= 0, total + square[t], total)
+        m = k >= p - 1
+        if not m.any():
+            continue
+        mean = total / p
+        total = np.where(m, total - square[t - p + 1], total)
+        mean -= middle[t] * middle[t]
+        sd[t] = np.where(m, np.where(mean < 0.00000001, 0.0, np.sqrt(np.abs(mean))), np.nan)
+    dev = sd * nbdev
+    return middle + dev, middle, middle - dev
+
+
+def _willr(high, low, close, p):
+    highest = _max(high, p)
+    lowest = _min(low, p)
+    diff = (highest - lowest) / (-100.0)
+    out = np.where(diff != 0.0, (highest - close) / diff, 0.0)
+    # 收盘价超出最高、最低价区间的，限定在-100到0之间，同talib
+    out = np.where(out < -100.0, -100.0, np.where(out > 0.0, 0.0, out))
+    out[np.isnan(highest) | np.isnan(lowest)] = np.nan
+    return out
+
+
+def _cci(high, low, close, p):
+    T, S = high.shape
+    b = _begin(high, low, close)
+    tp = (high + low + close) / 3
+    k = np.maximum(np.arange(T)[:, None] - b, 0)
+    idx = np.empty((T, S), dtype=np.intp)
+
+    # talib按环形缓冲区的位置顺序求和，第s个位置是窗口内序号除以p余s的数据
+    def _slot(s):
+        np.clip(b + k - ((k - s) % p), 0, T - 1, out=idx)
+        return np.take_along_axis(tp, idx, axis=0)
+
+    average = np.zeros((T, S))
+    for s in range(p):
+        average += _slot(s)
+    average /= p
+    dev = np.zeros((T, S))
+    for s in range(p):
+        dev += np.abs(_slot(s) - average)
+    val = tp - average
+    out = np.where((val != 0.0) & (dev != 0.0), val / (0.015 * (dev / p)), 0.0)
+    out[np.arange(T)[:, None] - b < p - 1] = np.nan
+    return out
+
+
+def _mfi(high, low, close, volume, p):
+    T, S = high.shape
+    b = _begin(high, low, close, volume)
+    tp = (high + low + close) / 3.0
+    diff = np.full((T, S), np.nan)
+    diff[1:] = tp[1:] - tp[:-1]
+    # 典型价相差在计算误差以内的按相等处理，同talib
+    diff[1:][np.abs(diff[1:]) <= 100 * np.finfo(np.float64).eps * np.maximum(np.abs(tp[1:]), np.abs(tp[:-1]))] = 0.0
+    flow = tp * volume
+    pos_flow = np.where(diff > 0, flow, 0.0)
+    neg_flow = np.where(diff < 0, flow, 0.0)
+    out = np.full((T, S), np.nan)
+    pos = np.zeros(S)
+    neg = np.zeros(S)
+    for t in range(_first(b, 1), T):
+        k = t - b
+        if t > p:
+            m = k > p
+            pos = np.where(m, pos - pos_flow[t - p], pos)
+            neg = np.where(m, neg - neg_flow[t - p], neg)
+        m = k >= 1
+        neg = np.where(m & (diff[t] < 0), neg + flow[t], neg)
+        pos = np.where(m & (diff[t] > 0), pos + flow[t], pos)
+        total = pos + neg
+        out[t] = np.where(k >= p, np.where(total < 1.0, 0.0, 100.0 * (pos / total)), np.nan)
+    return out
+
+
+def _obv(close, volume):
+    T, S = close.shape
+    b = _begin(close, volume)
+    out = np.full((T, S), np.nan)
+    cols = np.arange(S)
+    prev = volume[np.minimum(b, T - 1), cols]
+    for t in range(_first(b, 0), T):
+        k = t - b
+        prev = np.where((k >= 1) & (close[t] > close[t - 1]), prev + volume[t], prev)
+        prev = np.where((k >= 1) & (close[t] < close[t - 1]), prev - volume[t], prev)
+        out[t] = np.where(k >= 0, prev, np.nan)
+    return out
+
+
+def _sar(high, low, acceleration=0.02, maximum=0.2):
+    T, S = high.shape
+    b = _begin(high, low)
+    out = np.full((T, S), np.nan)
+    cols = np.arange(S)
+    i0 = np.minimum(b, T - 1)
+    i1 = np.minimum(b + 1, T - 1)
+    diff_p = high[i1, cols] - high[i0, cols]
+    diff_m = low[i0, cols] - low[i1, cols]
+    is_long = ~((diff_m > 0) & (diff_p < diff_m))
+    ep = np.where(is_long, high[i1, cols], low[i1, cols])
+    sar = np.where(is_long, low[i0, cols], high[i0, cols])
+    af = np.full(S, acceleration)
+    new_low = low[i1, cols]
+    new_high = high[i1, cols]
+    for t in range(_first(b, 1), T):
+        act = t - b >= 1
+        prev_low = new_low
+        prev_high = new_high
+        new_low = np.where(act, low[t], new_low)
+        new_high = np.where(act, high[t], new_high)
+
+        # 多头
+        long_rev = is_long & (new_low <= sar)
+        s1 = np.where(ep < prev_high, prev_high, ep)
+        s1 = np.where(s1 < new_high, new_high, s1)
+        s2 = s1 + acceleration * (new_low - s1)
+        s2 = np.where(s2 < prev_high, prev_high, s2)
+        s2 = np.where(s2 < new_high, new_high, s2)
+        l_ep = np.where(new_high > ep, new_high, ep)
+        l_af = np.where(new_high > ep, np.minimum(af + acceleration, maximum), af)
+        l_sar = sar + l_af * (l_ep - sar)
+        l_sar = np.where(l_sar > prev_low, prev_low, l_sar)
+        l_sar = np.where(l_sar > new_low, new_low, l_sar)
+
+        # 空头
+        short_rev = ~is_long & (new_high >= sar)
+        r1 = np.where(ep > prev_low, prev_low, ep)
+        r1 = np.where(r1 > new_low, new_low, r1)
+        r2 = r1 + acceleration * (new_high - r1)
+        r2 = np.where(r2 > prev_low, prev_low, r2)
+        r2 = np.where(r2 > new_low, new_low, r2)
+        s_ep = np.where(new_low < ep, new_low, ep)
+        s_af = np.where(new_low < ep, np.minimum(af + acceleration, maximum), af)
+        s_sar = sar + s_af * (s_ep - sar)
+        s_sar = np.where(s_sar < prev_high, prev_high, s_sar)
+        s_sar = np.where(s_sar < new_high, new_high, s_sar)
+
+        out[t] = np.where(act, np.where(long_rev, s1, np.where(short_rev, r1, sar)), np.nan)
+        _sar = np.where(is_long, np.where(long_rev, s2, l_sar), np.where(short_rev, r2, s_sar))
+        _ep = np.where(is_long, np.where(long_rev, new_low, l_ep), np.where(short_rev, new_high, s_ep))
+        _af = np.where(long_rev | short_rev, acceleration, np.where(is_long, l_af, s_af))
+        sar = np.where(act, _sar, sar)
+        ep = np.where(act, _ep, ep)
+        af = np.where(act, _af, af)
+        is_long = np.where(act, is_long ^ (long_rev | short_rev), is_long)
+    return out
+
+
+def _supertrend(close, b_ub, b_lb, start):
+    T, S = close.shape
+    ub = np.full((T, S), np.nan)
+    lb = np.full((T, S), np.nan)
+    st = np.full((T, S), np.nan)
+    for t in range(_first(start, 0), T):
+        k = t - start
+        if t == 0:
+            _ub = b_ub[t]
+            _lb = b_lb[t]
+            _st = np.where(close[t] <= _ub, _ub, _lb)
+        else:
+            last_ub = ub[t - 1]
+            last_lb = lb[t - 1]
+            last_st = st[t - 1]
+            _ub = np.where((b_ub[t] < last_ub) | (close[t - 1] > last_ub), b_ub[t], last_ub)
+            _lb = np.where((b_lb[t] > last_lb) | (close[t - 1] < last_lb), b_lb[t], last_lb)
+            _st = np.where(last_st == last_ub, np.where(close[t] <= _ub, _ub, _lb),
+                           np.where(last_st == last_lb, np.where(close[t] > _lb, _lb, _ub), np.nan))
+            _ub = np.where(k == 0, b_ub[t], _ub)
+            _lb = np.where(k == 0, b_lb[t], _lb)
+            _st = np.where(k == 0, np.where(close[t] <= b_ub[t], b_ub[t], b_lb[t]), _st)
+        ub[t] = np.where(k >= 0, _ub, np.nan)
+        lb[t] = np.where(k >= 0, _lb, np.nan)
+        st[t] = np.where(k >= 0, _st, np.nan)
+    return ub, lb, st
+
+
+def get_indicators(data, start):
+    """
+    计算指标
+    data: {字段: 交易日 × 股票 的二维数组}，字段为INPUT_FIELDS
+    start: 每个股票第一个数据的位置，之前的为NaN
+    返回 {指标: 交易日 × 股票 的二维数组}
+    """
+    T = data['close'].shape[0]
+    pad = np.arange(T)[:, None] < start
+
+    # 同data[...].values[np.isnan(...)] = 0.0，只处理每个股票的数据区间
+    def _nan0(x):
+        x[np.isnan(x) & ~pad] = 0.0
+        return x
+
+    def _inf0(x):
+        x[np.isinf(x)] = 0.0
+        return _nan0(x)
+
+    # 同np.where及比较，不处理数据区间之前的位置
+    def _mask(x):
+        x[pad] = np.nan
+        return x
+
+    # 同shift(n, fill_value=0.0)
+    def _shift(x, n=1):
+        y = np.full(x.shape, np.nan)
+        y[n:] = x[:T - n]
+        y[(np.arange(T)[:, None] - start < n) & ~pad] = 0.0
+        return y
+
+    # 同np.insert(np.diff(x), 0, 0.0)
+    def _diff(x):
+        y = np.full(x.shape, np.nan)
+        y[1:] = x[1:] - x[:-1]
+        y[np.arange(T)[:, None] == start] = 0.0
+        return y
+
+    _open = data['open']
+    close = data['close']
+    high = data['high']
+    low = data['low']
+    volume = data['volume']
+    amount = data['amount']
+    p_change = data['p_change']
+    r = {'close': close}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # macd
+        macd, macds, macdh = _macd(close, 12, 26, 9)
+        r['macd'] = _nan0(macd)
+        r['macds'] = _nan0(macds)
+        r['macdh'] = _nan0(macdh)
+
+        # kdj
+        kdjk, kdjd = _stoch(high, low, close, 9, 5, 5)
+        r['kdjk'] = _nan0(kdjk)
+        r['kdjd'] = _nan0(kdjd)
+        r['kdjj'] = 3 * kdjk - 2 * kdjd
+
+        # boll
+        boll_ub, boll, boll_lb = _bbands(close, 20, 2)
+        r['boll_ub'] = _nan0(boll_ub)
+        r['boll'] = _nan0(boll)
+        r['boll_lb'] = _nan0(boll_lb)
+
+        # trix
+        r['trix'] = trix = _nan0(_trix(close, 12))
+        r['trix_20_sma'] = _nan0(_ma(trix, 20))
+
+        # cr
+        m_price = amount / volume
+        m_price_sf1 = _shift(m_price)
+        h_m = high - np.minimum(m_price_sf1, high)
+        m_l = m_price_sf1 - np.minimum(m_price_sf1, low)
+        r['cr'] = cr = _inf0(_sum(h_m, 26) / _sum(m_l, 26)) * 100
+        r['cr-ma1'] = _nan0(_ma(cr, 5))
+        r['cr-ma2'] = _nan0(_ma(cr, 10))
+        r['cr-ma3'] = _nan0(_ma(cr, 20))
+
+        # rsi
+        r['rsi'] = rsi = _nan0(_rsi(close, 14))
+        r['rsi_6'] = _nan0(_rsi(close, 6))
+        r['rsi_12'] = _nan0(_rsi(close, 12))
+        r['rsi_24'] = _nan0(_rsi(close, 24))
+
+        # vr
+        avs = _sum(_mask(np.where(p_change > 0, volume, 0.0)), 26)
+        bvs = _sum(_mask(np.where(p_change < 0, volume, 0.0)), 26)
+        cvs = _sum(_mask(np.where(p_change == 0, volume, 0.0)), 26)
+        r['vr'] = vr = _inf0((avs + cvs / 2) / (bvs + cvs / 2)) * 100
+        r['vr_6_sma'] = _nan0(_ma(vr, 6))
+
+        # atr
+        prev_close = _shift(close)
+        h_l = high - low
+        h_cy = high - prev_close
+        cy_l = prev_close - low
+        r['tr'] = _nan0(np.fmax(np.fmax(h_l, np.abs(h_cy)), np.abs(cy_l)))
+        r['atr'] = atr = _nan0(_atr(high, low, close, 14))
+
+        # dmi，stockstats计算公式
+        high_delta = _diff(high)
+        high_m = (high_delta + np.abs(high_delta)) / 2
+        low_delta = -_diff(low)
+        low_m = (low_delta + np.abs(low_delta)) / 2
+        pdm = _nan0(_ema(_mask(np.where(high_m > low_m, high_m, 0.0)), 14))
+        r['pdi'] = pdi = _inf0(pdm / atr) * 100
+        mdm = _nan0(_ema(_mask(np.where(low_m > high_m, low_m, 0.0)), 14))
+        r['mdi'] = mdi = _inf0(mdm / atr) * 100
+        r['dx'] = dx = _inf0(np.abs(pdi - mdi) / (pdi + mdi)) * 100
+        r['adx'] = adx = _nan0(_ema(dx, 6))
+        r['adxr'] = _nan0(_ema(adx, 6))
+
+        # wr
+        r['wr_6'] = _nan0(_willr(high, low, close, 6))
+        r['wr_10'] = _nan0(_willr(high, low, close, 10))
+        r['wr_14'] = _nan0(_willr(high, low, close, 14))
+
+        # cci
+        r['cci'] = _nan0(_cci(high, low, close, 14))
+        r['cci_84'] = _nan0(_cci(high, low, close, 84))
+
+        # dma
+        ma10 = _nan0(_ma(close, 10))
+        ma50 = _nan0(_ma(close, 50))
+        r['dma'] = dma = ma10 - ma50
+        r['dma_10_sma'] = _nan0(_ma(dma, 10))
+
+        # tema
+        r['tema'] = _nan0(_tema(close, 14))
+
+        # mfi
+        r['mfi'] = mfi = _nan0(_mfi(high, low, close, volume, 14))
+        r['mfisma'] = _ma(mfi, 6)
+
+        # vwma
+        r['vwma'] = vwma = _inf0(_sum(amount, 14) / _sum(volume, 14))
+        r['mvwma'] = _ma(vwma, 6)
+
+        # ppo
+        r['ppo'] = ppo = _nan0(_ppo(close, 12, 26))
+        r['ppos'] = ppos = _nan0(_ema(ppo, 9))
+        r['ppoh'] = ppo - ppos
+
+        # stochrsi，stockstats计算公式
+        rsi_min = _min(rsi, 14)
+        rsi_max = _max(rsi, 14)
+        r['stochrsi_k'] = stochrsi_k = _inf0((rsi - rsi_min) / (rsi_max - rsi_min)) * 100
+        r['stochrsi_d'] = _ma(stochrsi_k, 3)
+
+        # wt
+        esa = _nan0(_ema(m_price, 10))
+        esa_d = _ema(np.abs(m_price - esa), 10)
+        esa_ci = _inf0((m_price - esa) / (0.015 * esa_d))
+        r['wt1'] = wt1 = _nan0(_ema(esa_ci, 21))
+        r['wt2'] = _nan0(_ma(wt1, 4))
+
+        # supertrend
+        hl_avg = (high + low) / 2.0
+        m_atr = atr * 3
+        ub, lb, st = _supertrend(close, hl_avg + m_atr, hl_avg - m_atr, start)
+        r['supertrend_ub'] = ub
+        r['supertrend_lb'] = lb
+        r['supertrend'] = st
+
+        # roc
+        r['roc'] = roc = _nan0(_roc(close, 12))
+        r['rocma'] = _nan0(_ma(roc, 6))
+        r['rocema'] = _nan0(_ema(roc, 9))
+
+        # obv
+        r['obv'] = _nan0(_obv(close, volume))
+
+        # sar
+        r['sar'] = _nan0(_sar(high, low))
+
+        # psy
+        price_up = _mask(np.where(close > prev_close, 1.0, 0.0))
+        r['psy'] = psy = _nan0(_sum(price_up, 12) / 12.0) * 100
+        r['psyma'] = _ma(psy, 6)
+
+        # brar
+        r['ar'] = _inf0(_sum(high - _open, 26) / _sum(_open - low, 26)) * 100
+        r['br'] = _inf0(_sum(h_cy, 26) / _sum(cy_l, 26)) * 100
+
+        # emv
+        phl_avg = (_shift(high) + _shift(low)) / 2.0
+        r['emv'] = emv = _nan0(_sum((hl_avg - phl_avg) * h_l / amount, 14))
+        r['emva'] = _nan0(_ma(emv, 9))
+
+        # bias
+        ma6 = _nan0(_ma(close, 6))
+        r['bias'] = _inf0((close - ma6) / ma6) * 100
+
+        # dpo
+        r['dpo'] = dpo = _nan0(close - _shift(_ma(close, 11)))
+        r['madpo'] = _nan0(_ma(dpo, 6))
+
+        # vhf
+        hcp_lcp = _nan0(_max(close, 28) - _min(close, 28))
+        r['vhf'] = _nan0(np.divide(hcp_lcp, _sum(np.abs(close - prev_close), 28)))
+
+        # rvi
+        rvi_x = ((close - _open) + 2 * (prev_close - _shift(_open)) + 2 * (_shift(close, 2) - _shift(_open, 2)) +
+                 (_shift(close, 3) - _shift(_open, 3))) / 6
+        rvi_y = ((high - low) + 2 * (_shift(high) - _shift(low)) + 2 * (_shift(high, 2) - _shift(low, 2)) +
+                 (_shift(high, 3) - _shift(low, 3))) / 6
+        r['rvi'] = rvi = _inf0(_ma(rvi_x, 10) / _ma(rvi_y, 10))
+        r['rvis'] = (rvi + 2 * _shift(rvi) + 2 * _shift(rvi, 2) + _shift(rvi, 3)) / 6
+
+        # fi
+        fi = _diff(close) * volume
+        r['fi'] = fi
+        r['force_2'] = _nan0(_ema(fi, 2))
+        r['force_13'] = _nan0(_ema(fi, 13))
+
+        # ene
+        r['ene_ue'] = ene_ue = (1 + 11 / 100) * ma10
+        r['ene_le'] = ene_le = (1 - 9 / 100) * ma10
+        r['ene'] = (ene_ue + ene_le) / 2
+    return r
+
+
+def stack(stocks, date=None, calc_threshold=90, with_date=False):
+    """
+    取每个股票截止到date的最近calc_threshold个交易日的数据，右对齐排成二维数组
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    with_date: 是否同时返回每条数据的日期data['date']，datetime64[D]，左边不足的为NaT
+    返回 (keys, {字段: 交易日 × 股票 的二维数组}, 每个股票第一个数据的位置, 每个股票的数据个数)
+    """
+    panel = getattr(stocks, 'panel', None)
+    if panel is not None:
+        return _stack_panel(panel, date, calc_threshold, with_date)
+    keys = list(stocks.keys())
+    S = len(keys)
+    data = {f: np.full((calc_threshold, S), np.nan) for f in INPUT_FIELDS}
+    if with_date:
+        data['date'] = np.full((calc_threshold, S), np.datetime64('NaT'), dtype='datetime64[D]')
+    start = np.full(S, calc_threshold)
+    size = np.zeros(S, dtype=np.int64)
+    for i, k in enumerate(keys):
+        _data = stocks[k]
+        size[i] = len(_data.index)
+        end_date = k[0] if date is None else date.strftime("%Y-%m-%d")
+        _data = stv.as_of(_data, end_date, tail=calc_threshold)
+        n = len(_data.index)
+        start[i] = calc_threshold - n
+        if n == 0:
+            continue
+        for f in INPUT_FIELDS:
+            data[f][calc_threshold - n:, i] = _data[f].values
+        if with_date:
+            data['date'][calc_threshold - n:, i] = _data['date'].values.astype('datetime64[D]')
+    return keys, data, start, size
+
+
+def _stack_panel(panel, date, calc_threshold, with_date=False):
+    keys = panel.keys
+    close = panel.field('close')
+    valid = ~np.isnan(close)
+    size = valid.sum(axis=1)
+    end_date = np.datetime64(keys[0][0] if date is None else date.strftime("%Y-%m-%d"), 'D')
+    valid[:, panel.dates > end_date] = False
+    # 每个数据从右往左数的序号，取最近calc_threshold个
+    rank = np.cumsum(valid[:, ::-1], axis=1)[:, ::-1]
+    rows, cols = np.nonzero(valid & (rank <= calc_threshold))
+    pos = calc_threshold - rank[rows, cols]
+    S = len(keys)
+    data = {}
+    for f in INPUT_FIELDS:
+        data[f] = np.full((calc_threshold, S), np.nan)
+        data[f][pos, rows] = panel.field(f)[rows, cols]
+    if with_date:
+        data['date'] = np.full((calc_threshold, S), np.datetime64('NaT'), dtype='datetime64[D]')
+        data['date'][pos, rows] = panel.dates[cols]
+    start = calc_threshold - np.minimum(rank[:, 0] if rank.shape[1] > 0 else np.zeros(S, dtype=np.int64),
+                                        calc_threshold)
+    return keys, data, start, size
+
+
+def get_indicator(stocks, date=None, calc_threshold=90):
+    """
+    计算所有股票的所有指标，每个股票只返回最新的一条数据
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    返回与cn_stock_indicators结构一致的DataFrame：date, code, name, 指标...
+    """
+    columns = list(tbs.STOCK_STATS_DATA['columns'])
+    try:
+        keys, data, start, size = stack(stocks, date=date, calc_threshold=calc_threshold)
+        if not keys:
+            return None
+        # 相同的行情数据(如重新运行作业)直接使用缓存的结果
+        cache_key = icc.key(('calculate_indicator_panel', VERSION, None if date is None else date.strftime("%Y-%m-%d"),
+                             calc_threshold, tuple(keys)), *(data[f] for f in INPUT_FIELDS), start, size)
+        result = icc.get(cache_key)
+        if result is not None:
+            return result.copy()
+        idr_data = get_indicators(data, start)
+        values = np.empty((len(keys), len(columns)))
+        for j, c in enumerate(columns):
+            values[:, j] = idr_data[c][-1]
+        # 解决值中存在INF NaN问题。
+        values[~np.isfinite(values)] = 0.0
+        # 数据不超过一条的全为0，区间内没有数据的不返回
+        values[size <= 1] = 0.0
+        valid = (size <= 1) | (start < calc_threshold)
+
+        result = pd.DataFrame(values[valid], columns=columns)
+        _keys = [k for k, v in zip(keys, valid) if v]
+        if date is None:
+            result.insert(0, 'date', [k[0] for k in _keys])
+        else:
+            result.insert(0, 'date', date.strftime("%Y-%m-%d"))
+        result.insert(1, 'code', [k[1] for k in _keys])
+        result.insert(2, 'name', [k[2] for k in _keys])
+        icc.put(cache_key, result.copy())
+        return result
+    except Exception as e:
+        logging.error(f"calculate_indicator_panel.get_indicator处理异常：{e}")
+    return None
+
+
+def get_indicator_range(stocks, dates, calc_threshold=90, chunk=1000):
+    """
+    计算所有股票多个交易日的指标，用于补算历史数据
+    stocks: 截止到最后一个交易日的数据，同get_indicator
+    dates: 按顺序排列的交易日
+    chunk: 每次一起计算的 交易日 × 股票 数
+    所有股票的数据只排列一次，每个交易日每个股票取截止到当天的最近calc_threshold个数据，
+    作为一列一起计算，与get_indicator逐日计算的结果相同(EMA类、OBV、SAR等与计算起点有关的指标也一致)
+    返回与cn_stock_indicators结构一致的DataFrame：date, code, name, 指标...
+    """
+    columns = list(tbs.STOCK_STATS_DATA['columns'])
+    try:
+        if not dates:
+            return None
+        # 区间内的交易日数据都在最近calc_threshold - 1 + len(dates)个数据中
+        window = calc_threshold - 1 + len(dates)
+        keys, data, start, size = stack(stocks, date=dates[-1], calc_threshold=window, with_date=True)
+        if not keys:
+            return None
+        _dates = np.array([d.strftime("%Y-%m-%d") for d in dates], dtype='datetime64[D]')
+        # 每个股票截止到各交易日的数据个数
+        count = np.array([(data['date'] <= d).sum(axis=0) for d in _dates])
+        # 数据不超过一条的全为0，当天之前没有数据的不返回，同get_indicator
+        di, si = np.nonzero((size[None, :] <= 1) | (count > 0))
+        rows = np.arange(calc_threshold)[:, None]
+        frames = []
+        for b in range(0, len(di), chunk):
+            _di = di[b:b + chunk]
+            _si = si[b:b + chunk]
+            _count = count[_di, _si]
+            # 截止到当天的最后calc_threshold个数据，同stack右对齐
+            idx = (start[_si] + _count)[None, :] - calc_threshold + rows
+            pad = idx < start[_si][None, :]
+            idx = np.maximum(idx, 0)
+            _data = {}
+            for f in INPUT_FIELDS:
+                x = data[f][idx, _si[None, :]]
+                x[pad] = np.nan
+                _data[f] = x
+            idr_data = get_indicators(_data, np.maximum(calc_threshold - _count, 0))
+            values = np.empty((len(_di), len(columns)))
+            for j, c in enumerate(columns):
+                values[:, j] = idr_data[c][-1]
+            # 解决值中存在INF NaN问题。
+            values[~np.isfinite(values)] = 0.0
+            values[size[_si] <= 1] = 0.0
+            frame = pd.DataFrame(values, columns=columns)
+            frame.insert(0, 'date', [dates[i].strftime("%Y-%m-%d") for i in _di])
+            frame.insert(1, 'code', [keys[i][1] for i in _si])
+            frame.insert(2, 'name', [keys[i][2] for i in _si])
+            frames.append(frame)
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+    except Exception as e:
+        logging.error(f"calculate_indicator_panel.get_indicator_range处理异常：{e}")
+    return None
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os.path
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+
+__author__ = 'myh '
+__date__ = '2025/3/22 '
+
+# 指标计算结果缓存，以输入数据的指纹及计算参数为键，相同的数据不再重复计算。
+# 内存及磁盘各保留最近使用的一部分，超出后删除最久没有使用的。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+indicator_cache_path = os.path.join(cpath_current, 'cache', 'indicator_cache')
+if not os.path.exists(indicator_cache_path):
+    os.makedirs(indicator_cache_path)  # 创建多个文件夹结构。
+
+# 内存中保留的结果个数，使用环境变量 indicator_cache_memory 设置，为0时不使用
+memory_size = 256
+# 磁盘缓存大小(MB)，使用环境变量 indicator_cache_disk 设置，为0时不使用
+disk_size = 1024
+
+_memory_size = os.environ.get('indicator_cache_memory')
+if _memory_size is not None:
+    memory_size = int(_memory_size)
+_disk_size = os.environ.get('indicator_cache_disk')
+if _disk_size is not None:
+    disk_size = int(_disk_size)
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+# 磁盘缓存已用大小，第一次写入时统计
+_disk_used = None
+
+
+def key(params, *arrays):
+    """
+    计算缓存的键
+    params: 计算参数，按repr计算
+    arrays: 输入数据，按float64的内容计算
+    """
+    h = hashlib.blake2b(repr(params).encode('utf-8'), digest_size=20)
+    for x in arrays:
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        h.update(repr(x.shape).encode('utf-8'))
+        h.update(x.data)
+    return h.hexdigest()
+
+
+def _cache_file(_key):
+    return os.path.join(indicator_cache_path, f"{_key}.pickle")
+
+
+def get(_key):
+    """
+    读取缓存，没有时返回None
+    """
+    if memory_size > 0:
+        with _lock:
+            value = _memory.get(_key)
+            if value is not None:
+                _memory.move_to_end(_key)
+                return value
+    if disk_size <= 0:
+        return None
+    cache_file = _cache_file(_key)
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            value = pickle.load(f)
+        # 修改时间作为最近使用时间
+        os.utime(cache_file)
+    except Exception as e:
+        logging.error(f"indicator_cache.get处理异常：{e}")
+        return None
+    _remember(_key, value)
+    return value
+
+
+def put(_key, value):
+    """
+    保存缓存，value不应再被修改
+    """
+    _remember(_key, value)
+    if disk_size <= 0:
+        return
+    cache_file = _cache_file(_key)
+    tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_file)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logging.error(f"indicator_cache.put处理异常：{e}")
+        try:
+            os.remove(tmp_file)
+        except Exception:
+            pass
+        return
+    _trim(size)
+
+
+def _remember(_key, value):
+    if memory_size <= 0:
+        return
+    with _lock:
+        _memory[_key] = value
+        _memory.move_to_end(_key)
+        while len(_memory) > memory_size:
+            _memory.popitem(last=False)
+
+
+def _trim(size):
+    global _disk_used
+    limit = disk_size * 1024 * 1024
+    with _lock:
+        if _disk_used is not None:
+            _disk_used += size
+            if _disk_used <= limit:
+                return
+        files = []
+        for name in os.listdir(indicator_cache_path):
+            if not name.endswith('.pickle'):
+                continue
+            try:
+                stat = os.stat(os.path.join(indicator_cache_path, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+        used = sum(f[1] for f in files)
+        if used > limit:
+            # 删除最久没有使用的，留出十分之一的空间
+            files.sort()
+            for mtime, _size, name in files:
+                if used <= limit * 0.9:
+                    break
+                try:
+                    os.remove(os.path.join(indicator_cache_path, name))
+                    used -= _size
+                except OSError:
+                    pass
+        _disk_used = used
+
+
+def clear():
+    """
+    清空内存及磁盘缓存
+    """
+    global _disk_used
+    with _lock:
+        _memory.clear()
+        for name in os.listdir(indicator_cache_path):
+            if name.endswith('.pickle'):
+                try:
+                    os.remove(os.path.join(indicator_cache_path, name))
+                except OSError:
+                    pass
+        _disk_used = 0
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os.path
+import threading
+import numpy as np
+import pandas as pd
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.indicator_state as ist
+import instock.core.stock_view as stv
+
+__author__ = 'myh '
+__date__ = '2025/3/23 '
+
+# 指标历史：每个股票一个文件，按交易日顺序保存全部历史数据的指标(cn_stock_indicators的各列)。
+# 每天用增量计算状态推进新的数据，计算结果追加到文件末尾，与历史数据对齐；除权除息后复权价格变化的重新计算。
+# 每行为 日期序号 + 各指标，float32(同数据库的FLOAT)，读取时映射文件，按日期切片不需要重新计算。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+indicator_history_path = os.path.join(cpath_current, 'cache', 'indicator_history')
+if not os.path.exists(indicator_history_path):
+    os.makedirs(indicator_history_path)  # 创建多个文件夹结构。
+# 指标历史自己的计算状态，与indicator_mode=incremental使用的状态分开保存
+indicator_history_state_file = os.path.join(indicator_history_path, 'state.pickle')
+columns_file = os.path.join(indicator_history_path, 'columns.json')
+_lock = threading.Lock()
+
+COLUMNS = ist.COLUMNS
+_COLUMN_INDEX = {c: j + 1 for j, c in enumerate(COLUMNS)}
+# 每行的数值个数
+WIDTH = len(COLUMNS) + 1
+# 每次写入文件的交易日数
+CHUNK = 32
+
+
+def _history_file(code):
+    return os.path.join(indicator_history_path, f"{code}.bin")
+
+
+def _rows(code):
+    # 文件中的数据条数，不是整行的(写入中断)返回-1
+    try:
+        size = os.path.getsize(_history_file(code))
+    except OSError:
+        return 0
+    row_size = WIDTH * 4
+    return size // row_size if size % row_size == 0 else -1
+
+
+def _check_columns():
+    # 指标列变化后，已保存的数据全部删除重新计算
+    try:
+        if os.path.isfile(columns_file):
+            with open(columns_file, 'r') as f:
+                if json.load(f) == list(COLUMNS):
+                    return
+        for name in os.listdir(indicator_history_path):
+            if name.endswith('.bin') or name == os.path.basename(indicator_history_state_file):
+                os.remove(os.path.join(indicator_history_path, name))
+        with open(columns_file, 'w') as f:
+            json.dump(list(COLUMNS), f)
+    except Exception as e:
+        logging.error(f"indicator_history._check_columns处理异常：{e}")
+
+
+class _writer:
+    """
+    收集每天推进的指标值，每CHUNK个交易日按股票追加写入文件
+    """
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.buf = np.empty((CHUNK, len(codes), WIDTH), dtype=np.float32)
+        self.act = np.zeros((CHUNK, len(codes)), dtype=bool)
+        self.n = 0
+
+    def record(self, date, act, values):
+        self.buf[self.n, :, 0] = date.astype('datetime64[D]').astype(np.int64)
+        self.buf[self.n, :, 1:] = values.T
+        self.act[self.n] = act
+        self.n += 1
+        if self.n == CHUNK:
+            self.flush()
+
+    def flush(self):
+        if self.n == 0:
+            return
+        buf = self.buf[:self.n]
+        act = self.act[:self.n]
+        for i in np.flatnonzero(act.any(axis=0)):
+            with open(_history_file(self.codes[i]), 'ab') as f:
+                f.write(buf[act[:, i], i].tobytes())
+        self.n = 0
+
+
+def update(stocks, date=None):
+    """
+    用新的数据延长各股票的指标历史
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    date: 计算截止日期，已计算到之后日期的股票不回退
+    """
+    # 多个日期同时执行时，读取、追加、保存依次进行，避免重复追加
+    with _lock:
+        _check_columns()
+        state = ist.read(indicator_history_state_file)
+        if state is None:
+            state = ist.indicator_state()
+        try:
+            state.add_codes([k[1] for k in stocks])
+            _stocks = {}
+            reset = np.zeros(len(state.codes), dtype=bool)
+            for key in stocks:
+                i = state.index[key[1]]
+                if state.size[i] > 0 and state.last_date[i] > np.datetime64(ist._end_date(key, date), 'D'):
+                    continue
+                # 文件与计算状态不一致(写入中断等)，从头重新计算
+                if _rows(key[1]) != state.size[i]:
+                    reset[i] = True
+                _stocks[key] = stocks[key]
+            if reset.any():
+                state.reset(reset)
+            pending = ist._pending(state, _stocks, date)
+            # 从头计算的股票先删除原来的文件
+            for key in _stocks:
+                i = state.index[key[1]]
+                if state.size[i] == 0 and os.path.isfile(_history_file(key[1])):
+                    os.remove(_history_file(key[1]))
+            writer = _writer(state.codes)
+            ist._apply(state, pending, writer.record)
+            writer.flush()
+            # 先写指标再保存状态，中断时下次按不一致重新计算
+            ist.write(state, indicator_history_state_file)
+        except Exception as e:
+            logging.error(f"indicator_history.update处理异常：{e}")
+
+
+def _read(code):
+    # 映射整个文件，返回 行 × WIDTH 的只读数组
+    rows = _rows(code)
+    if rows <= 0:
+        return None
+    return np.memmap(_history_file(code), dtype=np.float32, mode='r', shape=(rows, WIDTH))
+
+
+def _slice(code, date_start=None, date_end=None):
+    values = _read(code)
+    if values is None:
+        return None
+    days = values[:, 0]
+    b = 0 if date_start is None else np.searchsorted(days, np.datetime64(date_start, 'D').astype(np.int64))
+    e = len(days) if date_end is None else \
+        np.searchsorted(days, np.datetime64(date_end, 'D').astype(np.int64), side='right')
+    return values[b:e]
+
+
+def get(code, date_start=None, date_end=None, columns=None):
+    """
+    读取某个股票的指标历史，不重新计算
+    code: 股票代码
+    date_start: 开始日期，格式为"%Y-%m-%d"，包含该日
+    date_end: 结束日期，格式为"%Y-%m-%d"，包含该日
+    columns: 指标列，默认为全部
+    返回DataFrame：date, 指标...，没有数据时返回None
+    """
+    try:
+        values = _slice(code, date_start, date_end)
+        if values is None or len(values) == 0:
+            return None
+        columns = COLUMNS if columns is None else columns
+        data = {'date': np.datetime_as_string(values[:, 0].astype(np.int64).astype('datetime64[D]'))}
+        for c in columns:
+            data[c] = values[:, _COLUMN_INDEX[c]].astype(np.float64)
+        return pd.DataFrame(data)
+    except Exception as e:
+        logging.error(f"indicator_history.get处理异常：{code}代码{e}")
+    return None
+
+
+def get_indicators(data, code, end_date=None, threshold=120, columns=None):
+    """
+    同calculate_indicator.get_indicators，指标历史中有的指标直接读取，只计算没有保存的指标
+    数据与指标历史的日期或收盘价不一致(当天交易中、除权除息后还没有更新等)时全部重新计算
+    code: 股票代码
+    columns: 需要的指标列，默认为全部
+    """
+    try:
+        data = stv.as_of(data, end_date)
+        tail = stv.as_of(data, tail=threshold)
+        if len(tail.index) > 0:
+            values = _slice(code, tail['date'].values[0], tail['date'].values[-1])
+            dates = tail['date'].values.astype('datetime64[D]').astype(np.int64)
+            if values is not None and len(values) == len(dates) and np.array_equal(values[:, 0], dates) and \
+                    np.array_equal(values[:, _COLUMN_INDEX['close']], tail['close'].values.astype(np.float32)):
+                if columns is None:
+                    columns = [c for step in idr.get_steps() for c in idr.INDICATORS[step]['columns']]
+                stored = [c for c in columns if c in _COLUMN_INDEX and c != 'close']
+                missing = [c for c in columns if c not in _COLUMN_INDEX]
+                if missing:
+                    tail = idr.get_indicators(data, threshold=threshold, columns=missing)
+                    if tail is None:
+                        return None
+                indicators = pd.DataFrame({c: values[:, _COLUMN_INDEX[c]].astype(np.float64) for c in stored},
+                                          index=tail.index)
+                return pd.concat([tail, indicators], axis=1)
+    except Exception as e:
+        logging.error(f"indicator_history.get_indicators处理异常：{code}代码{e}")
+    return idr.get_indicators(data, threshold=threshold, columns=columns)
@@ -0,0 +1,1029 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os.path
+import pickle
+import threading
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.stock_view as stv
+
+__author__ = 'myh '
+__date__ = '2025/3/19 '
+
+# 增量指标计算：保存每个股票的指标计算状态(EMA累计值、RSI平均涨跌、ATR、滚动求和窗口、SAR及Supertrend等)，
+# 每天只用新的一条数据推进一步，不再每天重新计算90天的数据。
+# 状态按股票向量保存，所有股票一起推进；结果与calculate_indicator.get_indicators计算全部历史数据一致。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+indicator_state_path = os.path.join(cpath_current, 'cache', 'indicator_state')
+if not os.path.exists(indicator_state_path):
+    os.makedirs(indicator_state_path)  # 创建多个文件夹结构。
+indicator_state_file = os.path.join(indicator_state_path, 'state.pickle')
+_lock = threading.Lock()
+
+INPUT_FIELDS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')
+COLUMNS = tuple(tbs.STOCK_STATS_DATA['columns'])
+
+
+class _stream:
+    """
+    按股票向量保存的计算状态，各状态数组最后一维为股票
+    """
+
+    def __init__(self):
+        self._fields = {}
+        self._children = []
+
+    def _add(self, name, fill, size=None, dtype=np.float64):
+        self._fields[name] = (fill, size, dtype)
+        setattr(self, name, np.full((0,) if size is None else (size, 0), fill, dtype=dtype))
+
+    def _child(self, child):
+        self._children.append(child)
+        return child
+
+    def resize(self, count):
+        # 增加股票
+        for name, (fill, size, dtype) in self._fields.items():
+            a = getattr(self, name)
+            if a.shape[-1] < count:
+                pad = np.full(a.shape[:-1] + (count - a.shape[-1],), fill, dtype=dtype)
+                setattr(self, name, np.concatenate([a, pad], axis=-1))
+        for c in self._children:
+            c.resize(count)
+
+    def reset(self, mask):
+        # 重新开始计算
+        for name, (fill, size, dtype) in self._fields.items():
+            getattr(self, name)[..., mask] = fill
+        for c in self._children:
+            c.reset(mask)
+
+    def _use(self, act, *args):
+        # 同talib，跳过开头为NaN的数据，之后的数据都参与计算
+        valid = ~np.isnan(args[0])
+        for x in args[1:]:
+            valid &= ~np.isnan(x)
+        return act & ((self.n > 0) | valid)
+
+
+class _lag(_stream):
+    # 同shift(p, fill_value=0.0)，从股票第一个数据开始计数
+    def __init__(self, p):
+        super().__init__()
+        self.p = p
+        self._add('n', 0, dtype=np.int64)
+        self._add('buf', np.nan, p)
+
+    def update(self, x, act):
+        k = self.n
+        cols = np.arange(len(x))
+        slot = k % self.p
+        out = np.where(k >= self.p, self.buf[slot, cols], 0.0)
+        self.buf[slot, cols] = np.where(act, x, self.buf[slot, cols])
+        self.n = np.where(act, k + 1, k)
+        return out
+
+
+class _diff(_lag):
+    # 同np.insert(np.diff(x), 0, 0.0)
+    def __init__(self):
+        super().__init__(1)
+
+    def update(self, x, act):
+        k = self.n
+        prev = super().update(x, act)
+        return np.where(k >= 1, x - prev, 0.0)
+
+
+class _ma(_stream):
+    # tl.MA(matype=0)/tl.SUM
+    def __init__(self, p, div=True):
+        super().__init__()
+        self.p = p
+        self.div = div
+        self._add('n', 0, dtype=np.int64)
+        self._add('total', 0.0)
+        self._add('buf', np.nan, p)
+
+    def update(self, x, act):
+        p = self.p
+        use = self._use(act, x)
+        k = self.n
+        cols = np.arange(len(x))
+        self.buf[k % p, cols] = np.where(use, x, self.buf[k % p, cols])
+        total = np.where(use, self.total + x, self.total)
+        m = use & (k >= p - 1)
+        out = np.where(m, total / p if self.div else total, np.nan)
+        self.total = np.where(m, total - self.buf[(k + 1) % p, cols], total)
+        self.n = np.where(use, k + 1, k)
+        return out
+
+
+class _sum(_ma):
+    def __init__(self, p):
+        super().__init__(p, div=False)
+
+
+class _ema(_stream):
+    # tl.EMA，第lookback个数据输出第一个值，初值为截止到此的p个数据的均值
+    def __init__(self, p, lookback=None):
+        super().__init__()
+        self.p = p
+        self.lookback = p - 1 if lookback is None else lookback
+        self._add('n', 0, dtype=np.int64)
+        self._add('prev', 0.0)
+        self._add('buf', np.nan, p)
+
+    def update(self, x, act):
+        p = self.p
+        use = self._use(act, x)
+        k = self.n
+        cols = np.arange(len(x))
+        self.buf[k % p, cols] = np.where(use, x, self.buf[k % p, cols])
+        prev = self.prev
+        seed = use & (k == self.lookback)
+        if seed.any():
+            total = np.zeros(len(x))
+            for j in range(p):
+                total += self.buf[(k - p + 1 + j) % p, cols]
+            prev = np.where(seed, total / p, prev)
+        prev = np.where(use & (k > self.lookback), (x - prev) * (2.0 / (p + 1)) + prev, prev)
+        self.prev = prev
+        self.n = np.where(use, k + 1, k)
+        return np.where(use & (k >= self.lookback), prev, np.nan)
+
+
+class _window(_stream):
+    # 滚动窗口，不足p个数据的为NaN
+    def __init__(self, p, func):
+        super().__init__()
+        self.p = p
+        self.func = func
+        self._add('n', 0, dtype=np.int64)
+        self._add('buf', np.nan, p)
+
+    def update(self, x, act):
+        use = self._use(act, x)
+        k = self.n
+        cols = np.arange(len(x))
+        self.buf[k % self.p, cols] = np.where(use, x, self.buf[k % self.p, cols])
+        self.n = np.where(use, k + 1, k)
+        return np.where(use & (k >= self.p - 1), self.func(self.buf, axis=0), np.nan)
+
+
+class _rsi(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.p = p
+        self._add('n', 0, dtype=np.int64)
+        self._add('prev_value', 0.0)
+        self._add('gain', 0.0)
+        self._add('loss', 0.0)
+
+    def update(self, x, act):
+        p = self.p
+        use = self._use(act, x)
+        k = self.n
+        diff = x - self.prev_value
+        m = use & (k > p)
+        loss = np.where(m, self.loss * (p - 1), self.loss)
+        gain = np.where(m, self.gain * (p - 1), self.gain)
+        neg = diff < 0
+        loss = np.where(use & (k >= 1) & neg, loss - diff, loss)
+        gain = np.where(use & (k >= 1) & ~neg, gain + diff, gain)
+        m = use & (k >= p)
+        self.loss = np.where(m, loss / p, loss)
+        self.gain = np.where(m, gain / p, gain)
+        self.prev_value = np.where(use, x, self.prev_value)
+        self.n = np.where(use, k + 1, k)
+        total = self.gain + self.loss
+        return np.where(m, np.where((-0.00000001 < total) & (total < 0.00000001), 0.0,
+                                    100.0 * (self.gain / total)), np.nan)
+
+
+class _atr(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.p = p
+        self._add('n', 0, dtype=np.int64)
+        self._add('prev_close', np.nan)
+        self._add('total', 0.0)
+        self._add('prev', 0.0)
+
+    def update(self, high, low, close, act):
+        p = self.p
+        use = self._use(act, high, low, close)
+        k = self.n
+        tr = high - low
+        val = np.abs(self.prev_close - high)
+        tr = np.where(val > tr, val, tr)
+        val = np.abs(self.prev_close - low)
+        tr = np.where(val > tr, val, tr)
+        self.total = np.where(use & (k >= 1) & (k <= p), self.total + tr, self.total)
+        self.prev = np.where(use & (k == p), self.total / p,
+                             np.where(use & (k > p), ((self.prev * (p - 1)) + tr) / p, self.prev))
+        self.prev_close = np.where(use, close, self.prev_close)
+        self.n = np.where(use, k + 1, k)
+        return np.where(use & (k >= p), self.prev, np.nan)
+
+
+class _stoch(_stream):
+    # slowk_matype=1, slowd_matype=1
+    def __init__(self, fastk_period=9, slowk_period=5, slowd_period=5):
+        super().__init__()
+        self.lookback = fastk_period + slowk_period + slowd_period - 3
+        self.fastk_period = fastk_period
+        self._add('n', 0, dtype=np.int64)
+        self.highest = self._child(_window(fastk_period, np.max))
+        self.lowest = self._child(_window(fastk_period, np.min))
+        self.slowk = self._child(_ema(slowk_period))
+        self.slowd = self._child(_ema(slowd_period))
+
+    def update(self, high, low, close, act):
+        use = self._use(act, high, low, close)
+        k = self.n
+        self.n = np.where(use, k + 1, k)
+        highest = self.highest.update(np.where(use, high, np.nan), use)
+        lowest = self.lowest.update(np.where(use, low, np.nan), use)
+        diff = (highest - lowest) / 100.0
+        fastk = np.where(diff != 0.0, (close - lowest) / diff, 0.0)
+        fastk = np.where(use & (k >= self.fastk_period - 1), fastk, np.nan)
+        slowk = self.slowk.update(fastk, act)
+        slowd = self.slowd.update(slowk, act)
+        return np.where(use & (k >= self.lookback), slowk, np.nan), slowd
+
+
+class _bbands(_stream):
+    # matype=0
+    def __init__(self, p, nbdev):
+        super().__init__()
+        self.p = p
+        self.nbdev = nbdev
+        self._add('n', 0, dtype=np.int64)
+        self._add('total', 0.0)
+        self._add('buf', np.nan, p)
+        self.middle = self._child(_ma(p))
+
+    def update(self, x, act):
+        p = self.p
+        middle = self.middle.update(x, act)
+        use = self._use(act, x)
+        k = self.n
+        cols = np.arange(len(x))
+        square = x * x
+        self.buf[k % p, cols] = np.where(use, square, self.buf[k % p, cols])
+        total = np.where(use, self.total + square, self.total)
+        m = use & (k >= p - 1)
+        mean = total / p
+        self.total = np.where(m, total - self.buf[(k + 1) % p, cols], total)
+        self.n = np.where(use, k + 1, k)
+        mean -= middle * middle
+        sd = np.where(m, np.where(mean < 0.00000001, 0.0, np.sqrt(np.abs(mean))), np.nan)
+        dev = sd * self.nbdev
+        return middle + dev, middle, middle - dev
+
+
+class _willr(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self._add('n', 0, dtype=np.int64)
+        self.highest = self._child(_window(p, np.max))
+        self.lowest = self._child(_window(p, np.min))
+
+    def update(self, high, low, close, act):
+        use = self._use(act, high, low, close)
+        self.n = np.where(use, self.n + 1, self.n)
+        highest = self.highest.update(np.where(use, high, np.nan), use)
+        lowest = self.lowest.update(np.where(use, low, np.nan), use)
+        diff = (highest - lowest) / (-100.0)
+        out = np.where(diff != 0.0, (highest - close) / diff, 0.0)
+        # 收盘价超出最高、最低价区间的，限定在-100到0之间，同talib
+        out = np.where(out < -100.0, -100.0, np.where(out > 0.0, 0.0, out))
+        return np.where(np.isnan(highest) | np.isnan(lowest), np.nan, out)
+
+
+class _cci(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.p = p
+        self._add('n', 0, dtype=np.int64)
+        self._add('buf', np.nan, p)
+
+    def update(self, high, low, close, act):
+        p = self.p
+        use = self._use(act, high, low, close)
+        k = self.n
+        cols = np.arange(len(high))
+        tp = (high + low + close) / 3
+        self.buf[k % p, cols] = np.where(use, tp, self.buf[k % p, cols])
+        self.n = np.where(use, k + 1, k)
+        m = use & (k >= p - 1)
+        if not m.any():
+            return np.full(len(high), np.nan)
+        # talib按环形缓冲区的位置顺序求和
+        average = np.zeros(len(high))
+        for s in range(p):
+            average += self.buf[s]
+        average /= p
+        dev = np.zeros(len(high))
+        for s in range(p):
+            dev += np.abs(self.buf[s] - average)
+        val = tp - average
+        out = np.where((val != 0.0) & (dev != 0.0), val / (0.015 * (dev / p)), 0.0)
+        return np.where(m, out, np.nan)
+
+
+class _mfi(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.p = p
+        self._add('n', 0, dtype=np.int64)
+        self._add('prev_tp', np.nan)
+        self._add('pos', 0.0)
+        self._add('neg', 0.0)
+        self._add('pos_buf', 0.0, p)
+        self._add('neg_buf', 0.0, p)
+
+    def update(self, high, low, close, volume, act):
+        p = self.p
+        use = self._use(act, high, low, close, volume)
+        k = self.n
+        cols = np.arange(len(high))
+        tp = (high + low + close) / 3.0
+        diff = tp - self.prev_tp
+        # 典型价相差在计算误差以内的按相等处理，同talib
+        diff = np.where(np.abs(diff) <= 100 * np.finfo(np.float64).eps * np.maximum(np.abs(tp), np.abs(self.prev_tp)),
+                        0.0, diff)
+        flow = tp * volume
+        slot = k % p
+        m = use & (k > p)
+        pos = np.where(m, self.pos - self.pos_buf[slot, cols], self.pos)
+        neg = np.where(m, self.neg - self.neg_buf[slot, cols], self.neg)
+        m = use & (k >= 1)
+        self.neg = np.where(m & (diff < 0), neg + flow, neg)
+        self.pos = np.where(m & (diff > 0), pos + flow, pos)
+        self.pos_buf[slot, cols] = np.where(use, np.where(diff > 0, flow, 0.0), self.pos_buf[slot, cols])
+        self.neg_buf[slot, cols] = np.where(use, np.where(diff < 0, flow, 0.0), self.neg_buf[slot, cols])
+        self.prev_tp = np.where(use, tp, self.prev_tp)
+        self.n = np.where(use, k + 1, k)
+        total = self.pos + self.neg
+        return np.where(use & (k >= p), np.where(total < 1.0, 0.0, 100.0 * (self.pos / total)), np.nan)
+
+
+class _obv(_stream):
+    def __init__(self):
+        super().__init__()
+        self._add('n', 0, dtype=np.int64)
+        self._add('prev', 0.0)
+        self._add('prev_close', np.nan)
+
+    def update(self, close, volume, act):
+        use = self._use(act, close, volume)
+        k = self.n
+        prev = np.where(use & (k == 0), volume, self.prev)
+        prev = np.where(use & (k >= 1) & (close > self.prev_close), prev + volume, prev)
+        self.prev = np.where(use & (k >= 1) & (close < self.prev_close), prev - volume, prev)
+        self.prev_close = np.where(use, close, self.prev_close)
+        self.n = np.where(use, k + 1, k)
+        return np.where(use, self.prev, np.nan)
+
+
+class _roc(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.p = p
+        self._add('n', 0, dtype=np.int64)
+        self._add('buf', np.nan, p)
+
+    def update(self, x, act):
+        use = self._use(act, x)
+        k = self.n
+        cols = np.arange(len(x))
+        slot = k % self.p
+        prev = self.buf[slot, cols]
+        out = np.where(use & (k >= self.p), np.where(prev != 0.0, ((x / prev) - 1.0) * 100.0, 0.0), np.nan)
+        self.buf[slot, cols] = np.where(use, x, prev)
+        self.n = np.where(use, k + 1, k)
+        return out
+
+
+class _macd(_stream):
+    def __init__(self, fast=12, slow=26, signal=9):
+        super().__init__()
+        # 快慢线都从第slow-1个数据开始，快线初值为截止到此的fast个数据的均值
+        self.fast = self._child(_ema(fast, slow - 1))
+        self.slow = self._child(_ema(slow, slow - 1))
+        self.signal = self._child(_ema(signal))
+
+    def update(self, x, act):
+        macd = self.fast.update(x, act) - self.slow.update(x, act)
+        macds = self.signal.update(macd, act)
+        macd = np.where(np.isnan(macds), np.nan, macd)
+        return macd, macds, macd - macds
+
+
+class _ppo(_stream):
+    # matype=1
+    def __init__(self, fast=12, slow=26):
+        super().__init__()
+        self.fast = self._child(_ema(fast))
+        self.slow = self._child(_ema(slow))
+
+    def update(self, x, act):
+        fast_ma = self.fast.update(x, act)
+        slow_ma = self.slow.update(x, act)
+        out = np.where((-0.00000001 < slow_ma) & (slow_ma < 0.00000001), 0.0, ((fast_ma - slow_ma) / slow_ma) * 100.0)
+        return np.where(np.isnan(slow_ma), np.nan, out)
+
+
+class _trix(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.e1 = self._child(_ema(p))
+        self.e2 = self._child(_ema(p))
+        self.e3 = self._child(_ema(p))
+        self.roc = self._child(_roc(1))
+
+    def update(self, x, act):
+        return self.roc.update(self.e3.update(self.e2.update(self.e1.update(x, act), act), act), act)
+
+
+class _tema(_stream):
+    def __init__(self, p):
+        super().__init__()
+        self.e1 = self._child(_ema(p))
+        self.e2 = self._child(_ema(p))
+        self.e3 = self._child(_ema(p))
+
+    def update(self, x, act):
+        e1 = self.e1.update(x, act)
+        e2 = self.e2.update(e1, act)
+        e3 = self.e3.update(e2, act)
+        return e3 + ((3.0 * e1) - (3.0 * e2))
+
+
+class _sar(_stream):
+    def __init__(self, acceleration=0.02, maximum=0.2):
+        super().__init__()
+        self.acceleration = acceleration
+        self.maximum = maximum
+        self._add('n', 0, dtype=np.int64)
+        self._add('first_high', np.nan)
+        self._add('first_low', np.nan)
+        self._add('is_long', True, dtype=bool)
+        self._add('sar', np.nan)
+        self._add('ep', np.nan)
+        self._add('af', acceleration)
+        self._add('new_high', np.nan)
+        self._add('new_low', np.nan)
+
+    def update(self, high, low, act):
+        acceleration = self.acceleration
+        maximum = self.maximum
+        use = self._use(act, high, low)
+        k = self.n
+        self.first_high = np.where(use & (k == 0), high, self.first_high)
+        self.first_low = np.where(use & (k == 0), low, self.first_low)
+        # 第二个数据确定初始方向
+        init = use & (k == 1)
+        diff_p = high - self.first_high
+        diff_m = self.first_low - low
+        _is_long = ~((diff_m > 0) & (diff_p < diff_m))
+        is_long = np.where(init, _is_long, self.is_long)
+        ep = np.where(init, np.where(_is_long, high, low), self.ep)
+        sar = np.where(init, np.where(_is_long, self.first_low, self.first_high), self.sar)
+        af = np.where(init, acceleration, self.af)
+        new_low = np.where(init, low, self.new_low)
+        new_high = np.where(init, high, self.new_high)
+
+        act = use & (k >= 1)
+        prev_low = new_low
+        prev_high = new_high
+        new_low = np.where(act, low, new_low)
+        new_high = np.where(act, high, new_high)
+
+        # 多头
+        long_rev = is_long & (new_low <= sar)
+        s1 = np.where(ep < prev_high, prev_high, ep)
+        s1 = np.where(s1 < new_high, new_high, s1)
+        s2 = s1 + acceleration * (new_low - s1)
+        s2 = np.where(s2 < prev_high, prev_high, s2)
+        s2 = np.where(s2 < new_high, new_high, s2)
+        l_ep = np.where(new_high > ep, new_high, ep)
+        l_af = np.where(new_high > ep, np.minimum(af + acceleration, maximum), af)
+        l_sar = sar + l_af * (l_ep - sar)
+        l_sar = np.where(l_sar > prev_low, prev_low, l_sar)
+        l_sar = np.where(l_sar > new_low, new_low, l_sar)
+
+        # 空头
+        short_rev = ~is_long & (new_high >= sar)
+        r1 = np.where(ep > prev_low, prev_low, ep)
+        r1 = np.where(r1 > new_low, new_low, r1)
+        r2 = r1 + acceleration * (new_high - r1)
+        r2 = np.where(r2 > prev_low, prev_low, r2)
+        r2 = np.where(r2 > new_low, new_low, r2)
+        s_ep = np.where(new_low < ep, new_low, ep)
+        s_af = np.where(new_low < ep, np.minimum(af + acceleration, maximum), af)
+        s_sar = sar + s_af * (s_ep - sar)
+        s_sar = np.where(s_sar < prev_high, prev_high, s_sar)
+        s_sar = np.where(s_sar < new_high, new_high, s_sar)
+
+        out = np.where(act, np.where(long_rev, s1, np.where(short_rev, r1, sar)), np.nan)
+        _sar = np.where(is_long, np.where(long_rev, s2, l_sar), np.where(short_rev, r2, s_sar))
+        _ep = np.where(is_long, np.where(long_rev, new_low, l_ep), np.where(short_rev, new_high, s_ep))
+        _af = np.where(long_rev | short_rev, acceleration, np.where(is_long, l_af, s_af))
+        self.sar = np.where(act, _sar, sar)
+        self.ep = np.where(act, _ep, ep)
+        self.af = np.where(act, _af, af)
+        self.is_long = np.where(act, is_long ^ (long_rev | short_rev), is_long)
+        self.new_low = new_low
+        self.new_high = new_high
+        self.n = np.where(use, k + 1, k)
+        return out
+
+
+class _supertrend(_stream):
+    def __init__(self):
+        super().__init__()
+        self._add('n', 0, dtype=np.int64)
+        self._add('ub', np.nan)
+        self._add('lb', np.nan)
+        self._add('st', np.nan)
+        self._add('last_close', np.nan)
+
+    def update(self, close, b_ub, b_lb, act):
+        # 从股票第一个数据开始，不跳过NaN
+        k = self.n
+        ub = np.where((b_ub < self.ub) | (self.last_close > self.ub), b_ub, self.ub)
+        lb = np.where((b_lb > self.lb) | (self.last_close < self.lb), b_lb, self.lb)
+        st = np.where(self.st == self.ub, np.where(close <= ub, ub, lb),
+                      np.where(self.st == self.lb, np.where(close > lb, lb, ub), np.nan))
+        first = k == 0
+        ub = np.where(first, b_ub, ub)
+        lb = np.where(first, b_lb, lb)
+        st = np.where(first, np.where(close <= b_ub, b_ub, b_lb), st)
+        self.ub = np.where(act, ub, self.ub)
+        self.lb = np.where(act, lb, self.lb)
+        self.st = np.where(act, st, self.st)
+        self.last_close = np.where(act, close, self.last_close)
+        self.n = np.where(act, k + 1, k)
+        return ub, lb, st
+
+
+def _nan0(x):
+    return np.where(np.isnan(x), 0.0, x)
+
+
+def _inf0(x):
+    return np.where(np.isnan(x) | np.isinf(x), 0.0, x)
+
+
+class indicator_state(_stream):
+    """
+    所有股票的指标计算状态
+    codes: 股票代码，与状态数组的最后一维对应
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.codes = []
+        self.index = {}
+        # 已计算的数据个数、最后一条数据的日期及收盘价、最后一条数据的指标值
+        self._add('size', 0, dtype=np.int64)
+        self._add('last_date', np.datetime64('NaT'), dtype='datetime64[D]')
+        self._add('last_close', np.nan)
+        self._add('values', np.nan, len(COLUMNS))
+
+        c = self._child
+        self.macd = c(_macd(12, 26, 9))
+        self.kdj = c(_stoch(9, 5, 5))
+        self.boll = c(_bbands(20, 2))
+        self.trix = c(_trix(12))
+        self.trix_20_sma = c(_ma(20))
+        self.m_price_sf1 = c(_lag(1))
+        self.h_m_sum = c(_sum(26))
+        self.m_l_sum = c(_sum(26))
+        self.cr_ma = [c(_ma(p)) for p in (5, 10, 20)]
+        self.rsi = {p: c(_rsi(p)) for p in (14, 6, 12, 24)}
+        self.avs = c(_sum(26))
+        self.bvs = c(_sum(26))
+        self.cvs = c(_sum(26))
+        self.vr_6_sma = c(_ma(6))
+        self.prev_close = c(_lag(1))
+        self.atr = c(_atr(14))
+        self.high_delta = c(_diff())
+        self.low_delta = c(_diff())
+        self.pdm = c(_ema(14))
+        self.mdm = c(_ema(14))
+        self.adx = c(_ema(6))
+        self.adxr = c(_ema(6))
+        self.wr = {p: c(_willr(p)) for p in (6, 10, 14)}
+        self.cci = {p: c(_cci(p)) for p in (14, 84)}
+        self.ma10 = c(_ma(10))
+        self.ma50 = c(_ma(50))
+        self.dma_10_sma = c(_ma(10))
+        self.tema = c(_tema(14))
+        self.mfi = c(_mfi(14))
+        self.mfisma = c(_ma(6))
+        self.tpv_14 = c(_sum(14))
+        self.vol_14 = c(_sum(14))
+        self.mvwma = c(_ma(6))
+        self.ppo = c(_ppo(12, 26))
+        self.ppos = c(_ema(9))
+        self.rsi_min = c(_window(14, np.min))
+        self.rsi_max = c(_window(14, np.max))
+        self.stochrsi_d = c(_ma(3))
+        self.esa = c(_ema(10))
+        self.esa_d = c(_ema(10))
+        self.wt1 = c(_ema(21))
+        self.wt2 = c(_ma(4))
+        self.supertrend = c(_supertrend())
+        self.roc = c(_roc(12))
+        self.rocma = c(_ma(6))
+        self.rocema = c(_ema(9))
+        self.obv = c(_obv())
+        self.sar = c(_sar())
+        self.price_up_sum = c(_sum(12))
+        self.psyma = c(_ma(6))
+        self.h_o_sum = c(_sum(26))
+        self.o_l_sum = c(_sum(26))
+        self.h_cy_sum = c(_sum(26))
+        self.cy_l_sum = c(_sum(26))
+        self.prev_high = c(_lag(1))
+        self.prev_low = c(_lag(1))
+        self.emv = c(_sum(14))
+        self.emva = c(_ma(9))
+        self.ma6 = c(_ma(6))
+        self.c_m_11 = c(_ma(11))
+        self.c_m_11_sf1 = c(_lag(1))
+        self.madpo = c(_ma(6))
+        self.hcp = c(_window(28, np.max))
+        self.lcp = c(_window(28, np.min))
+        self.c_p_sum = c(_sum(28))
+        self.rvi_lag = [c(_lag(p)) for p in (1, 2, 3) for _ in range(4)]
+        self.rvi_x_ma = c(_ma(10))
+        self.rvi_y_ma = c(_ma(10))
+        self.rvis_lag = [c(_lag(p)) for p in (1, 2, 3)]
+        self.fi_diff = c(_diff())
+        self.force_2 = c(_ema(2))
+        self.force_13 = c(_ema(13))
+
+    def add_codes(self, codes):
+        for code in codes:
+            if code not in self.index:
+                self.index[code] = len(self.codes)
+                self.codes.append(code)
+        self.resize(len(self.codes))
+
+    def advance(self, bar, act):
+        """
+        所有股票推进一条数据
+        bar: {字段: 数组}，字段为INPUT_FIELDS
+        act: 有数据的股票
+        返回 {指标: 数组}，同get_indicators的最后一条数据
+        """
+        _open = bar['open']
+        close = bar['close']
+        high = bar['high']
+        low = bar['low']
+        volume = bar['volume']
+        amount = bar['amount']
+        p_change = bar['p_change']
+        r = {'close': close}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # macd
+            macd, macds, macdh = self.macd.update(close, act)
+            r['macd'] = _nan0(macd)
+            r['macds'] = _nan0(macds)
+            r['macdh'] = _nan0(macdh)
+
+            # kdj
+            kdjk, kdjd = self.kdj.update(high, low, close, act)
+            r['kdjk'] = kdjk = _nan0(kdjk)
+            r['kdjd'] = kdjd = _nan0(kdjd)
+            r['kdjj'] = 3 * kdjk - 2 * kdjd
+
+            # boll
+            boll_ub, boll, boll_lb = self.boll.update(close, act)
+            r['boll_ub'] = _nan0(boll_ub)
+            r['boll'] = _nan0(boll)
+            r['boll_lb'] = _nan0(boll_lb)
+
+            # trix
+            r['trix'] = trix = _nan0(self.trix.update(close, act))
+            r['trix_20_sma'] = _nan0(self.trix_20_sma.update(trix, act))
+
+            # cr
+            m_price = amount / volume
+            m_price_sf1 = self.m_price_sf1.update(m_price, act)
+            h_m = high - np.minimum(m_price_sf1, high)
+            m_l = m_price_sf1 - np.minimum(m_price_sf1, low)
+            r['cr'] = cr = _inf0(self.h_m_sum.update(h_m, act) / self.m_l_sum.update(m_l, act)) * 100
+            r['cr-ma1'] = _nan0(self.cr_ma[0].update(cr, act))
+            r['cr-ma2'] = _nan0(self.cr_ma[1].update(cr, act))
+            r['cr-ma3'] = _nan0(self.cr_ma[2].update(cr, act))
+
+            # rsi
+            r['rsi'] = rsi = _nan0(self.rsi[14].update(close, act))
+            r['rsi_6'] = _nan0(self.rsi[6].update(close, act))
+            r['rsi_12'] = _nan0(self.rsi[12].update(close, act))
+            r['rsi_24'] = _nan0(self.rsi[24].update(close, act))
+
+            # vr
+            avs = self.avs.update(np.where(p_change > 0, volume, 0.0), act)
+            bvs = self.bvs.update(np.where(p_change < 0, volume, 0.0), act)
+            cvs = self.cvs.update(np.where(p_change == 0, volume, 0.0), act)
+            r['vr'] = vr = _inf0((avs + cvs / 2) / (bvs + cvs / 2)) * 100
+            r['vr_6_sma'] = _nan0(self.vr_6_sma.update(vr, act))
+
+            # atr
+            prev_close = self.prev_close.update(close, act)
+            h_l = high - low
+            h_cy = high - prev_close
+            cy_l = prev_close - low
+            r['tr'] = _nan0(np.fmax(np.fmax(h_l, np.abs(h_cy)), np.abs(cy_l)))
+            r['atr'] = atr = _nan0(self.atr.update(high, low, close, act))
+
+            # dmi，stockstats计算公式
+            high_delta = self.high_delta.update(high, act)
+            high_m = (high_delta + np.abs(high_delta)) / 2
+            low_delta = -self.low_delta.update(low, act)
+            low_m = (low_delta + np.abs(low_delta)) / 2
+            pdm = _nan0(self.pdm.update(np.where(high_m > low_m, high_m, 0.0), act))
+            r['pdi'] = pdi = _inf0(pdm / atr) * 100
+            mdm = _nan0(self.mdm.update(np.where(low_m > high_m, low_m, 0.0), act))
+            r['mdi'] = mdi = _inf0(mdm / atr) * 100
+            r['dx'] = dx = _inf0(np.abs(pdi - mdi) / (pdi + mdi)) * 100
+            r['adx'] = adx = _nan0(self.adx.update(dx, act))
+            r['adxr'] = _nan0(self.adxr.update(adx, act))
+
+            # wr
+            for p in (6, 10, 14):
+                r[f'wr_{p}'] = _nan0(self.wr[p].update(high, low, close, act))
+
+            # cci
+            r['cci'] = _nan0(self.cci[14].update(high, low, close, act))
+            r['cci_84'] = _nan0(self.cci[84].update(high, low, close, act))
+
+            # dma
+            ma10 = _nan0(self.ma10.update(close, act))
+            ma50 = _nan0(self.ma50.update(close, act))
+            r['dma'] = dma = ma10 - ma50
+            r['dma_10_sma'] = _nan0(self.dma_10_sma.update(dma, act))
+
+            # tema
+            r['tema'] = _nan0(self.tema.update(close, act))
+
+            # mfi
+            r['mfi'] = mfi = _nan0(self.mfi.update(high, low, close, volume, act))
+            r['mfisma'] = self.mfisma.update(mfi, act)
+
+            # vwma
+            r['vwma'] = vwma = _inf0(self.tpv_14.update(amount, act) / self.vol_14.update(volume, act))
+            r['mvwma'] = self.mvwma.update(vwma, act)
+
+            # ppo
+            r['ppo'] = ppo = _nan0(self.ppo.update(close, act))
+            r['ppos'] = ppos = _nan0(self.ppos.update(ppo, act))
+            r['ppoh'] = ppo - ppos
+
+            # stochrsi，stockstats计算公式
+            rsi_min = self.rsi_min.update(rsi, act)
+            rsi_max = self.rsi_max.update(rsi, act)
+            r['stochrsi_k'] = stochrsi_k = _inf0((rsi - rsi_min) / (rsi_max - rsi_min)) * 100
+            r['stochrsi_d'] = self.stochrsi_d.update(stochrsi_k, act)
+
+            # wt
+            esa = _nan0(self.esa.update(m_price, act))
+            esa_d = self.esa_d.update(np.abs(m_price - esa), act)
+            esa_ci = _inf0((m_price - esa) / (0.015 * esa_d))
+            r['wt1'] = wt1 = _nan0(self.wt1.update(esa_ci, act))
+            r['wt2'] = _nan0(self.wt2.update(wt1, act))
+
+            # supertrend
+            hl_avg = (high + low) / 2.0
+            m_atr = atr * 3
+            ub, lb, st = self.supertrend.update(close, hl_avg + m_atr, hl_avg - m_atr, act)
+            r['supertrend_ub'] = ub
+            r['supertrend_lb'] = lb
+            r['supertrend'] = st
+
+            # roc
+            r['roc'] = roc = _nan0(self.roc.update(close, act))
+            r['rocma'] = _nan0(self.rocma.update(roc, act))
+            r['rocema'] = _nan0(self.rocema.update(roc, act))
+
+            # obv
+            r['obv'] = _nan0(self.obv.update(close, volume, act))
+
+            # sar
+            r['sar'] = _nan0(self.sar.update(high, low, act))
+
+            # psy
+            price_up = np.where(close > prev_close, 1.0, 0.0)
+            r['psy'] = psy = _nan0(self.price_up_sum.update(price_up, act) / 12.0) * 100
+            r['psyma'] = self.psyma.update(psy, act)
+
+            # brar
+            r['ar'] = _inf0(self.h_o_sum.update(high - _open, act) / self.o_l_sum.update(_open - low, act)) * 100
+            r['br'] = _inf0(self.h_cy_sum.update(h_cy, act) / self.cy_l_sum.update(cy_l, act)) * 100
+
+            # emv
+            prev_high = self.prev_high.update(high, act)
+            prev_low = self.prev_low.update(low, act)
+            phl_avg = (prev_high + prev_low) / 2.0
+            r['emv'] = emv = _nan0(self.emv.update((hl_avg - phl_avg) * h_l / amount, act))
+            r['emva'] = _nan0(self.emva.update(emv, act))
+
+            # bias
+            ma6 = _nan0(self.ma6.update(close, act))
+            r['bias'] = _inf0((close - ma6) / ma6) * 100
+
+            # dpo
+            c_m_11 = self.c_m_11.update(close, act)
+            r['dpo'] = dpo = _nan0(close - self.c_m_11_sf1.update(c_m_11, act))
+            r['madpo'] = _nan0(self.madpo.update(dpo, act))
+
+            # vhf
+            hcp_lcp = _nan0(self.hcp.update(close, act) - self.lcp.update(close, act))
+            r['vhf'] = _nan0(np.divide(hcp_lcp, self.c_p_sum.update(np.abs(close - prev_close), act)))
+
+            # rvi
+            lags = [g.update(x, act) for g, x in zip(self.rvi_lag, (_open, close, high, low) * 3)]
+            open_1, _, _, _, open_2, close_2, high_2, low_2, open_3, close_3, high_3, low_3 = lags
+            rvi_x = ((close - _open) + 2 * (prev_close - open_1) + 2 * (close_2 - open_2) + (close_3 - open_3)) / 6
+            rvi_y = ((high - low) + 2 * (prev_high - prev_low) + 2 * (high_2 - low_2) + (high_3 - low_3)) / 6
+            r['rvi'] = rvi = _inf0(self.rvi_x_ma.update(rvi_x, act) / self.rvi_y_ma.update(rvi_y, act))
+            rvi_1, rvi_2, rvi_3 = [g.update(rvi, act) for g in self.rvis_lag]
+            r['rvis'] = (rvi + 2 * rvi_1 + 2 * rvi_2 + rvi_3) / 6
+
+            # fi
+            r['fi'] = fi = self.fi_diff.update(close, act) * volume
+            r['force_2'] = _nan0(self.force_2.update(fi, act))
+            r['force_13'] = _nan0(self.force_13.update(fi, act))
+
+            # ene
+            r['ene_ue'] = ene_ue = (1 + 11 / 100) * ma10
+            r['ene_le'] = ene_le = (1 - 9 / 100) * ma10
+            r['ene'] = (ene_ue + ene_le) / 2
+
+        values = np.array([r[c] for c in COLUMNS])
+        self.values[:, act] = values[:, act]
+        self.size = np.where(act, self.size + 1, self.size)
+        return r
+
+
+def read(state_file=indicator_state_file):
+    if not os.path.isfile(state_file):
+        return None
+    try:
+        with open(state_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logging.error(f"indicator_state.read处理异常：{e}")
+    return None
+
+
+# 先写临时文件再替换，避免中断时产生损坏的文件。
+def write(state, state_file=indicator_state_file):
+    tmp_file = f"{state_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, state_file)
+    except Exception as e:
+        logging.error(f"indicator_state.write处理异常：{e}")
+        try:
+            os.remove(tmp_file)
+        except Exception:
+            pass
+
+
+def _end_date(key, date):
+    return key[0] if date is None else date.strftime("%Y-%m-%d")
+
+
+def _pending(state, stocks, date):
+    """
+    每个股票需要推进的数据：最后一条已计算数据之后的数据。
+    已计算的最后一条数据不存在或收盘价不同(除权除息后复权价格变化)的，从头重新计算。
+    返回 {序号: DataFrame}
+    """
+    pending = {}
+    reset = np.zeros(len(state.codes), dtype=bool)
+    for key in stocks:
+        i = state.index[key[1]]
+        data = stocks[key]
+        data = stv.as_of(data, _end_date(key, date))
+        if len(data.index) == 0:
+            continue
+        if state.size[i] > 0:
+            dates = data['date'].values.astype('datetime64[D]')
+            pos = np.searchsorted(dates, state.last_date[i])
+            if pos < len(dates) and dates[pos] == state.last_date[i] and \
+                    data['close'].values[pos] == state.last_close[i]:
+                data = data.iloc[pos + 1:]
+            else:
+                reset[i] = True
+        if len(data.index) > 0:
+            pending[i] = data
+    if reset.any():
+        state.reset(reset)
+    return pending
+
+
+def _apply(state, pending, record=None):
+    # 按日期排成 日期 × 股票 的数组，逐日推进
+    # record(日期, 有数据的股票, 指标值)：每推进一天调用一次，指标值为 指标 × 股票 的数组
+    if not pending:
+        return
+    dates = np.unique(np.concatenate([data['date'].values.astype('datetime64[D]') for data in pending.values()]))
+    S = len(state.codes)
+    D = len(dates)
+    bars = {f: np.full((D, S), np.nan) for f in INPUT_FIELDS}
+    act = np.zeros((D, S), dtype=bool)
+    for i, data in pending.items():
+        pos = np.searchsorted(dates, data['date'].values.astype('datetime64[D]'))
+        act[pos, i] = True
+        for f in INPUT_FIELDS:
+            bars[f][pos, i] = data[f].values
+    for d in range(D):
+        state.advance({f: bars[f][d] for f in INPUT_FIELDS}, act[d])
+        if record is not None:
+            record(dates[d], act[d], state.values)
+    idx = np.fromiter(pending.keys(), dtype=np.int64)
+    state.last_date[idx] = [data['date'].values[-1] for data in pending.values()]
+    state.last_close[idx] = [data['close'].values[-1] for data in pending.values()]
+
+
+def update(stocks, date=None):
+    """
+    用新的数据推进已保存的指标计算状态，返回所有股票最新的指标
+    stocks: {(date, code, name): DataFrame}
+    返回与cn_stock_indicators结构一致的DataFrame：date, code, name, 指标...
+    """
+    # 多个日期同时执行时，读取、推进、保存状态依次进行
+    with _lock:
+        state = read()
+        if state is None:
+            state = indicator_state()
+        try:
+            state.add_codes([k[1] for k in stocks])
+            _apply(state, _pending(state, stocks, date))
+            write(state)
+        except Exception as e:
+            logging.error(f"indicator_state.update处理异常：{e}")
+            return None
+    return _result(state, stocks, date)
+
+
+def _result(state, stocks, date):
+    rows = []
+    _keys = []
+    for key in stocks:
+        i = state.index[key[1]]
+        if len(stocks[key].index) <= 1:
+            # 数据不超过一条的全为0
+            rows.append(np.zeros(len(COLUMNS)))
+        elif state.size[i] > 0:
+            rows.append(state.values[:, i])
+        else:
+            continue
+        _keys.append(key)
+    if not _keys:
+        return None
+    values = np.array(rows)
+    # 解决值中存在INF NaN问题。
+    values[~np.isfinite(values)] = 0.0
+    result = pd.DataFrame(values, columns=list(COLUMNS))
+    result.insert(0, 'date', [_end_date(k, date) for k in _keys])
+    result.insert(1, 'code', [k[1] for k in _keys])
+    result.insert(2, 'name', [k[2] for k in _keys])
+    return result
+
+
+def verify(stocks, result, date=None, rtol=1e-9):
+    """
+    与get_indicators计算全部历史数据的结果比较
+    result: update返回的数据
+    返回不一致的数据：code, 指标, 批量计算结果, 增量计算结果
+    """
+    diff = []
+    result = result.set_index('code')
+    for key in stocks:
+        if key[1] not in result.index or len(stocks[key].index) <= 1:
+            continue
+        data = idr.get_indicators(stocks[key], end_date=_end_date(key, date), threshold=1)
+        if data is None or len(data.index) == 0:
+            continue
+        for c in COLUMNS:
+            a = data[c].values[-1]
+            a = 0.0 if not np.isfinite(a) else a
+            b = result.at[key[1], c]
+            if not abs(a - b) <= rtol * max(1.0, abs(a)):
+                diff.append((key[1], c, a, b))
+    return pd.DataFrame(diff, columns=['code', 'indicator', 'batch', 'incremental'])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+__author__ = 'myh '
+__date__ = '2025/3/20 '
+
+# 依赖前一个值的逐条计算(Supertrend、筹码分布累加)，直接在float数组上计算。
+# 安装了numba时编译执行，否则用Python/NumPy实现，计算步骤与原来逐条计算的相同，结果完全一致。
+
+
+def _supertrend(close, b_ub, b_lb):
+    """
+    Supertrend
+    close: 收盘价
+    b_ub: 基础上轨 (high + low) / 2 + 3 * atr
+    b_lb: 基础下轨 (high + low) / 2 - 3 * atr
+    返回 (上轨, 下轨, supertrend)
+    """
+    size = len(close)
+    ub = np.empty(size, dtype=np.float64)
+    lb = np.empty(size, dtype=np.float64)
+    # 上一条既不等于上轨也不等于下轨时(数据为NaN)，结果为NaN
+    st = np.full(size, np.nan, dtype=np.float64)
+    for i in range(size):
+        if i == 0:
+            ub[i] = b_ub[i]
+            lb[i] = b_lb[i]
+            if close[i] <= ub[i]:
+                st[i] = ub[i]
+            else:
+                st[i] = lb[i]
+            continue
+
+        last_close = close[i - 1]
+        last_ub = ub[i - 1]
+        last_lb = lb[i - 1]
+        last_st = st[i - 1]
+
+        # calculate current upper band
+        if b_ub[i] < last_ub or last_close > last_ub:
+            ub[i] = b_ub[i]
+        else:
+            ub[i] = last_ub
+
+        # calculate current lower band
+        if b_lb[i] > last_lb or last_close < last_lb:
+            lb[i] = b_lb[i]
+        else:
+            lb[i] = last_lb
+
+        # calculate supertrend
+        if last_st == last_ub:
+            if close[i] <= ub[i]:
+                st[i] = ub[i]
+            else:
+                st[i] = lb[i]
+        elif last_st == last_lb:
+            if close[i] > lb[i]:
+                st[i] = lb[i]
+            else:
+                st[i] = ub[i]
+    return ub, lb, st
+
+
+def _cyq_chips(open_price, close, high, low, turnover, minprice, accuracy, factor):
+    """
+    筹码分布：每天按换手率衰减已有筹码，再按当天价格区间叠加三角形分布
+    minprice: 最低价格刻度
+    accuracy: 价格刻度间隔
+    factor: 价格刻度数
+    返回每个价格刻度的筹码
+    """
+    xdata = np.zeros(factor, dtype=np.float64)
+    for k in range(len(close)):
+        avg = (open_price[k] + close[k] + high[k] + low[k]) / 4
+        # 同min(1, turnover / 100)
+        turnover_rate = turnover[k] / 100
+        if not turnover_rate < 1:
+            turnover_rate = 1.0
+
+        H = int((high[k] - minprice) / accuracy)
+        L = int((low[k] - minprice) / accuracy + 0.99)
+        #  G点坐标, 一字板时, X为进度因子
+        if high[k] == low[k]:
+            g = float(factor - 1)
+        else:
+            g = 2 / (high[k] - low[k])
+
+        for n in range(factor):
+            xdata[n] *= (1 - turnover_rate)
+
+        if high[k] == low[k]:
+            #  一字板时，画矩形面积是三角形的2倍
+            xdata[int((avg - minprice) / accuracy)] += g * turnover_rate / 2
+        else:
+            for j in range(L, H + 1):
+                curprice = minprice + accuracy * j
+                if curprice <= avg:
+                    #  上半三角叠加分布分布
+                    if abs(avg - low[k]) < 1e-8:
+                        xdata[j] += g * turnover_rate
+                    else:
+                        xdata[j] += (curprice - low[k]) / (avg - low[k]) * g * turnover_rate
+                else:
+                    #  下半三角叠加分布分布
+                    if abs(high[k] - avg) < 1e-8:
+                        xdata[j] += g * turnover_rate
+                    else:
+                        xdata[j] += (high[k] - curprice) / (high[k] - avg) * g * turnover_rate
+    return xdata
+
+
+def _cyq_chips_numpy(open_price, close, high, low, turnover, minprice, accuracy, factor):
+    # 每天的衰减及三角分布叠加按价格刻度向量计算
+    xdata = np.zeros(factor, dtype=np.float64)
+    grid = np.arange(factor)
+    for _open, _close, _high, _low, _turnover in zip(open_price.tolist(), close.tolist(), high.tolist(),
+                                                     low.tolist(), turnover.tolist()):
+        avg = (_open + _close + _high + _low) / 4
+        turnover_rate = min(1, _turnover / 100)
+
+        H = int((_high - minprice) / accuracy)
+        L = int((_low - minprice) / accuracy + 0.99)
+        g = factor - 1 if _high == _low else 2 / (_high - _low)
+
+        xdata *= (1 - turnover_rate)
+
+        if _high == _low:
+            xdata[int((avg - minprice) / accuracy)] += g * turnover_rate / 2
+        elif L <= H:
+            curprice = minprice + accuracy * grid[L:H + 1]
+            if abs(avg - _low) < 1e-8:
+                up = g * turnover_rate
+            else:
+                up = (curprice - _low) / (avg - _low) * g * turnover_rate
+            if abs(_high - avg) < 1e-8:
+                down = g * turnover_rate
+            else:
+                down = (_high - curprice) / (_high - avg) * g * turnover_rate
+            xdata[L:H + 1] += np.where(curprice <= avg, up, down)
+    return xdata
+
+
+if njit is not None:
+    supertrend = njit(cache=True)(_supertrend)
+    cyq_chips = njit(cache=True)(_cyq_chips)
+else:
+    supertrend = _supertrend
+    cyq_chips = _cyq_chips_numpy
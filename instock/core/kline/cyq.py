@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import instock.core.indicator.kernel as krn
+
 __author__ = 'myh '
 __date__ = '2025/1/6 '
 
@@ -55,39 +57,9 @@ class CYQCalculator:
                 boundary = i
 
         # *横轴数据
-        xdata = [0] * factor
-
-        for open_price, close, high, low, turnover in zip(kdata['open'].values, kdata['close'].values, kdata['high'].values, kdata['low'].values, kdata['turnover'].values):
-            avg = (open_price + close + high + low) / 4
-            turnover_rate = min(1, turnover / 100)
-
-            H = int((high - minprice) / accuracy)
-            L = int((low - minprice) / accuracy + 0.99)
-            #  G点坐标, 一字板时, X为进度因子
-            GPoint = [factor - 1 if high == low else 2 / (high - low),
-                      int((avg - minprice) / accuracy)]
-
-            for n in range(len(xdata)):
-                xdata[n] *= (1 - turnover_rate)
-
-            if high == low:
-                #  一字板时，画矩形面积是三角形的2倍
-                xdata[GPoint[1]] += GPoint[0] * turnover_rate / 2
-            else:
-                for j in range(L, H + 1):
-                    curprice = minprice + accuracy * j
-                    if curprice <= avg:
-                        #  上半三角叠加分布分布
-                        if abs(avg - low) < 1e-8:
-                            xdata[j] += GPoint[0] * turnover_rate
-                        else:
-                            xdata[j] += (curprice - low) / (avg - low) * GPoint[0] * turnover_rate
-                    else:
-                        #  下半三角叠加分布分布
-                        if abs(high - avg) < 1e-8:
-                            xdata[j] += GPoint[0] * turnover_rate
-                        else:
-                            xdata[j] += (high - curprice) / (high - avg) * GPoint[0] * turnover_rate
+        xdata = krn.cyq_chips(kdata['open'].values.astype(float), kdata['close'].values.astype(float),
+                              kdata['high'].values.astype(float), kdata['low'].values.astype(float),
+                              kdata['turnover'].values.astype(float), float(minprice), float(accuracy), factor).tolist()
 
         total_chips = sum(float(f"{x:.12g}") for x in xdata)
 
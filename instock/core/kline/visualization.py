@@ -13,7 +13,7 @@ from bokeh.models import ColumnDataSource, HoverTool, CheckboxGroup, LabelSet, B
     CDSView, BooleanFilter, TabPanel, Tabs, Div, Styles, CrosshairTool, Span, BoxSelectTool, WheelZoomTool, PanTool, \
     BoxZoomTool, ZoomInTool, ZoomOutTool, RedoTool, ResetTool, SaveTool, UndoTool
 import instock.core.tablestructure as tbs
-import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.indicator_history as ihs
 import instock.core.pattern.pattern_recognitions as kpr
 import instock.core.kline.indicator_web_dic as iwd
 
@@ -35,6 +35,10 @@ STOCK_COLORS = [
     '#CD5C5C'   # 印度红
 ]
 
+# K线图使用的指标：成交量均线及各指标图的指标
+KLINE_COLUMNS = ['vol_5', 'vol_10'] + list(dict.fromkeys(
+    name for conf in iwd.indicators_dic for name in conf['dic'] if name != 'close'))
+
 # 计算文字高度（假设每个字符宽度约为9pt）
 def calc_text_width(text, font_size=9):
     return len(text) * (font_size)*1.8  # default 9pt per character
@@ -60,7 +64,8 @@ def get_plot_kline(code, stock, date, stock_name):
     threshold = 360
     font_size = 7
     try:
-        data = idr.get_indicators(stock, date, threshold=threshold)
+        # 已保存的指标历史直接读取
+        data = ihs.get_indicators(stock, code, date, threshold=threshold, columns=KLINE_COLUMNS)
         if data is None:
             return None
 
@@ -2,22 +2,21 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import numpy as np
+import pandas as pd
+import talib.abstract as tla
+import instock.core.indicator.calculate_indicator_panel as idp
+import instock.core.stock_view as stv
 
 __author__ = 'myh '
 __date__ = '2023/3/24 '
 
+# 每个形态函数需要的之前数据个数
+_lookback = {}
+
 
 def get_pattern_recognitions(data, stock_column, end_date=None, threshold=120, calc_threshold=None):
-    isCopy = False
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask]
-        isCopy = True
-    if calc_threshold is not None:
-        data = data.tail(n=calc_threshold)
-        isCopy = True
-    if isCopy:
-        data = data.copy()
+    data = stv.as_of(data, end_date, tail=calc_threshold).copy()
 
     for k in stock_column:
         try:
@@ -70,3 +69,108 @@ def get_pattern_recognition(code_name, data, stock_column, date=None, calc_thres
         logging.error(f"pattern_recognitions.get_pattern_recognition处理异常：{code}代码{e}")
 
     return None
+
+
+def _get_lookback(func):
+    lookback = _lookback.get(func.__name__)
+    if lookback is None:
+        lookback = tla.Function(func.__name__).lookback
+        _lookback[func.__name__] = lookback
+    return lookback
+
+
+def get_pattern_recognition_all(stocks, stock_column, date=None, calc_threshold=12):
+    """
+    识别所有股票的K线形态，结果同逐个股票调用get_pattern_recognition
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    返回有形态的股票：date, code, name, 形态...
+    """
+    return _scan(stocks, stock_column, None if date is None else [date], calc_threshold)
+
+
+def get_pattern_recognition_range(stocks, stock_column, dates, calc_threshold=12, chunk=1000):
+    """
+    识别所有股票多个交易日的K线形态，用于补算历史数据，每个交易日的结果同get_pattern_recognition
+    stocks: 截止到最后一个交易日的数据，同get_pattern_recognition_all
+    dates: 按顺序排列的交易日
+    chunk: 每次一起计算的股票数
+    返回有形态的股票：date, code, name, 形态...
+    """
+    if not dates:
+        return None
+    return _scan(stocks, stock_column, dates, calc_threshold, chunk)
+
+
+def _gap(size):
+    # 股票之间的间隔：先是极大的K线(实体、影线、振幅轮流为极大值)，再是全为0的K线。
+    # talib逐条加减的滚动求和经过极大值后之前股票留下的误差被吸收，极大值移出后恰好为0，
+    # 每个股票都从0开始累加，与单独计算时一样不受之前数据的影响。
+    big = 2.0 ** 70
+    gap = np.zeros((4, 2 * size))
+    # 开盘、最高、最低、收盘
+    gap[:, 0:size:2] = np.array([[0.0], [big], [0.0], [big]])
+    gap[:, 1:size:2] = np.array([[big / 2], [big], [0.0], [big / 2]])
+    return gap
+
+
+def _scan(stocks, stock_column, dates, calc_threshold, chunk=None):
+    # 每个股票取最近window个数据右对齐，左边不足的填0，所有股票之间加上间隔首尾相接成一个长数组，
+    # 每个形态函数只调用一次，再取每个股票各交易日的结果。
+    # 数据个数不超过形态函数的lookback时，单独计算没有结果，对应位置的结果不用(为0)。
+    columns = list(stock_column)
+    try:
+        window = calc_threshold - 1 + (1 if dates is None else len(dates))
+        keys, data, start, size = idp.stack(stocks, date=None if dates is None else dates[-1],
+                                            calc_threshold=window, with_date=dates is not None)
+        if not keys:
+            return None
+        lookback = np.array([_get_lookback(stock_column[k]['func']) for k in columns])
+        used = lookback < calc_threshold
+        gap = _gap(int(lookback[used].max()) + 1 if used.any() else 1)
+        stride = gap.shape[1] + window
+        if dates is not None:
+            _dates = np.array([d.strftime("%Y-%m-%d") for d in dates], dtype='datetime64[D]')
+        chunk = len(keys) if chunk is None else chunk
+        frames = []
+        for b in range(0, len(keys), chunk):
+            e = min(b + chunk, len(keys))
+            _start = start[b:e]
+            if dates is None:
+                count = (window - _start)[None, :]
+            else:
+                # 每个交易日取当天及之前最后一条数据，同get_pattern_recognition按交易日截取
+                count = (data['date'][:, b:e][None, :, :] <= _dates[:, None, None]).sum(axis=1)
+            idx = np.maximum(_start[None, :] + count - 1, 0)
+            cols = np.arange(e - b)[None, :]
+
+            ohlc = []
+            for j, f in enumerate(('open', 'high', 'low', 'close')):
+                x = np.empty((e - b, stride))
+                x[:, :gap.shape[1]] = gap[j]
+                x[:, gap.shape[1]:] = data[f][:, b:e].T
+                x[np.isnan(x)] = 0.0
+                ohlc.append(x.ravel())
+            values = np.zeros(count.shape + (len(columns),), dtype=np.int32)
+            # 单独计算用的数据个数
+            n = np.minimum(count, calc_threshold)
+            for j, k in enumerate(columns):
+                if not used[j]:
+                    continue
+                out = stock_column[k]['func'](*ohlc).reshape(e - b, stride)[:, gap.shape[1]:]
+                values[:, :, j] = np.where(n > lookback[j], out[cols, idx], 0)
+
+            # 数据不超过一条、当天之前没有数据、没有形态的不返回
+            valid = (size[b:e][None, :] > 1) & (count > 0) & (values != 0).any(axis=2)
+            di, si = np.nonzero(valid)
+            frame = pd.DataFrame(values[di, si], columns=columns)
+            if dates is None:
+                frame.insert(0, 'date', [keys[b + i][0] for i in si])
+            else:
+                frame.insert(0, 'date', [dates[i].strftime("%Y-%m-%d") for i in di])
+            frame.insert(1, 'code', [keys[b + i][1] for i in si])
+            frame.insert(2, 'name', [keys[b + i][2] for i in si])
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+    except Exception as e:
+        logging.error(f"pattern_recognitions._scan处理异常：{e}")
+    return None
@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import concurrent.futures
 import instock.core.stockfetch as stf
+import instock.core.stock_panel as spl
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
 from instock.lib.singleton_type import singleton_type
@@ -25,8 +25,15 @@ class stock_data(metaclass=singleton_type):
 
 
 # 读取指定股票历史数据
+# 收盘后的数据写成数据面板(mmap)，同一交易日的各作业直接映射使用。
 class stock_hist_data(metaclass=singleton_type):
-    def __init__(self, date=None, stocks=None, workers=16):
+    def __init__(self, date=None, stocks=None, workers=None):
+        self.panel = None
+        if stocks is None and date is not None:
+            # 已有当日的数据面板，不需要再获取股票列表
+            date_str = date.strftime("%Y-%m-%d")
+            if trd.get_trade_hist_interval(date_str)[1] and self._load_panel(date_str):
+                return
         if stocks is None:
             _subset = stock_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
             stocks = [tuple(x) for x in _subset.values]
@@ -34,26 +41,28 @@ class stock_hist_data(metaclass=singleton_type):
             self.data = None
             return
         date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
-        _data = {}
-        try:
-            # max_workers是None还是没有给出，将默认为机器cpu个数*5
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-                future_to_stock = {executor.submit(stf.fetch_stock_hist, stock, date_start, is_cache): stock for stock
-                                   in stocks}
-                for future in concurrent.futures.as_completed(future_to_stock):
-                    stock = future_to_stock[future]
-                    try:
-                        __data = future.result()
-                        if __data is not None:
-                            _data[stock] = __data
-                    except Exception as e:
-                        logging.error(f"singleton.stock_hist_data处理异常：{stock[1]}代码{e}")
-        except Exception as e:
-            logging.error(f"singleton.stock_hist_data处理异常：{e}")
+        if is_cache and self._load_panel(stocks[0][0]):
+            return
+        # 异步并发获取，workers为每个主机同时进行的请求数
+        _data = stf.fetch_stocks_hist(stocks, date_start, is_cache, workers)
         if not _data:
             self.data = None
-        else:
-            self.data = _data
+            return
+        self.data = _data
+        # 交易时间内数据不完整，不生成面板
+        if is_cache and spl.build(_data, stocks[0][0]) is not None:
+            self._load_panel(stocks[0][0])
+
+    def _load_panel(self, date):
+        panel = spl.load(date)
+        if panel is None:
+            return False
+        self.panel = panel
+        self.data = panel.frames()
+        return True
 
     def get_data(self):
         return self.data
+
+    def get_panel(self):
+        return self.panel
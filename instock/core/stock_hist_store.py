@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os.path
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+import instock.lib.trade_time as trd
+import instock.core.crawling.stock_hist_em as she
+import instock.core.crawling.fund_etf_em as fee
+import instock.core.crawling.async_client as acl
+import instock.core.crawling.http_client as hc
+
+__author__ = 'myh '
+__date__ = '2025/3/10 '
+
+# 历史数据持久化存储：每个股票一个文件，保存已经获取的全部不复权日线数据及复权因子。
+# 每天只获取最后一个已存日期之后的数据并合并，替代原来按date_start分日期目录的缓存。
+# 前复权/后复权数据由不复权数据和复权因子在本地计算，除权除息不再需要重新获取全部历史数据。
+# ETF(代码以1、5开头)同样保存，从基金行情接口获取。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+stock_hist_store_path = os.path.join(cpath_current, 'cache', 'hist_store')
+if not os.path.exists(stock_hist_store_path):
+    os.makedirs(stock_hist_store_path)  # 创建多个文件夹结构。
+# 获取失败的股票，下次批量读取时重试
+failed_file = os.path.join(stock_hist_store_path, 'failed.json')
+
+
+# 需要复权的价格字段
+ADJUST_FIELDS = ('open', 'close', 'high', 'low')
+
+
+def _store_file(code):
+    return os.path.join(stock_hist_store_path, "%s.gzip.pickle" % code)
+
+
+def _to_date_str(date):
+    # 20230310 -> 2023-03-10
+    return f"{date[0:4]}-{date[4:6]}-{date[6:8]}"
+
+
+def _to_date_param(date_str):
+    # 2023-03-10 -> 20230310
+    return date_str.replace('-', '')
+
+
+# 读取已存的历史数据，返回 (开始日期, 数据)
+def read(code):
+    store_file = _store_file(code)
+    if not os.path.isfile(store_file):
+        return None, None
+    try:
+        store = pd.read_pickle(store_file, compression="gzip")
+        return store['start'], store['data']
+    except Exception as e:
+        logging.error(f"stock_hist_store.read处理异常：{code}代码{e}")
+    return None, None
+
+
+# 保存历史数据，先写临时文件再替换，避免多线程或中断时产生损坏的文件。
+def write(code, data, date_start):
+    store_file = _store_file(code)
+    tmp_file = f"{store_file}.{os.getpid()}.tmp"
+    try:
+        pd.to_pickle({'start': date_start, 'data': data}, tmp_file, compression="gzip")
+        os.replace(tmp_file, store_file)
+    except Exception as e:
+        logging.error(f"stock_hist_store.write处理异常：{code}代码{e}")
+        try:
+            os.remove(tmp_file)
+        except Exception:
+            pass
+
+
+# 合并新旧数据，日期相同的以新数据为准。
+def merge(data, new_data):
+    if data is None or len(data.index) == 0:
+        return new_data
+    if new_data is None or len(new_data.index) == 0:
+        return data
+    data = pd.concat([data, new_data], ignore_index=True)
+    data.drop_duplicates('date', keep='last', inplace=True)
+    data.sort_values('date', inplace=True, ignore_index=True)
+    return data
+
+
+def _to_hist(stock):
+    # 网络数据转换成已存数据的格式
+    if stock is None or len(stock.index) == 0:
+        return None
+    stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+    stock = stock.sort_index()  # 将数据按照日期排序下。
+    return stock
+
+
+def is_etf(code):
+    return code.startswith(('1', '5'))
+
+
+# 获取不复权数据
+def fetch(code, date_start, date_end=None):
+    hist = fee.fund_etf_hist_em if is_etf(code) else she.stock_zh_a_hist
+    if date_end is not None:
+        stock = hist(symbol=code, period="daily", start_date=date_start, end_date=date_end)
+    else:
+        stock = hist(symbol=code, period="daily", start_date=date_start)
+    return _to_hist(stock)
+
+
+def calc_adj_factor(data, factor_start=1.0):
+    """
+    计算后复权因子，第一天为factor_start
+    不复权数据的涨跌额以除权除息参考价为昨收，参考价与上一日收盘价不同时即为除权除息日，
+    当日因子 = 上一日因子 * 上一日收盘价 / 参考价
+    """
+    close = data['close'].values
+    ref_close = close[1:] - data['ups_downs'].values[1:]
+    ratio = np.ones(len(close), dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 价格精度为0.01，差值小于半分时认为没有除权除息
+        mask = (np.abs(close[:-1] - ref_close) >= 0.005) & (ref_close > 0)
+        ratio[1:][mask] = close[:-1][mask] / ref_close[mask]
+    return factor_start * np.cumprod(ratio)
+
+
+def adjust_view(data, adjust=''):
+    """
+    由不复权数据和复权因子计算复权数据
+    qfq: 前复权，以最后一天为基准
+    hfq: 后复权，以已存第一天为基准
+    """
+    factor = data['adj_factor'].values
+    data = data.drop(columns='adj_factor')
+    if not adjust:
+        return data
+    if adjust == 'qfq':
+        factor = factor / factor[-1]
+    for f in ADJUST_FIELDS:
+        data[f] = data[f].values * factor
+    # 涨跌额按复权后的价格计算
+    close = data['close'].values
+    ups_downs = data['ups_downs'].values.copy()
+    ups_downs[1:] = close[1:] - close[:-1]
+    data['ups_downs'] = ups_downs
+    return data
+
+
+def _is_same_bar(data, new_data, date):
+    """
+    比较新旧数据中同一天的收盘价，不复权数据不应变化，不一致说明数据有修正
+    """
+    old_close = data.loc[data['date'] == date, 'close'].values
+    new_close = new_data.loc[new_data['date'] == date, 'close'].values
+    if len(old_close) == 0 or len(new_close) == 0:
+        return False
+    return abs(old_close[-1] - new_close[-1]) < 1e-6
+
+
+def _slice(data, date_start, date_end=None):
+    mask = (data['date'] >= _to_date_str(date_start))
+    if date_end is not None:
+        mask &= (data['date'] <= _to_date_str(date_end))
+    data = data.loc[mask]
+    if len(data.index) == 0:
+        return None
+    return data.reset_index(drop=True)
+
+
+def _fetch_all(code, date_start):
+    data = fetch(code, date_start)
+    if data is None:
+        return None
+    data['adj_factor'] = calc_adj_factor(data)
+    return data
+
+
+def load(code, date_start, date_end=None, is_cache=True, adjust=''):
+    """
+    读取股票、ETF历史数据，只从网络获取已存最后日期之后的数据
+    code: 股票、ETF代码
+    date_start: 开始日期，格式为"%Y%m%d"
+    date_end: 结束日期，格式为"%Y%m%d"
+    is_cache: 是否保存，交易时间内当日数据不完整，不保存
+    adjust: 复权方式
+    """
+    data = update(code, date_start, date_end, is_cache)
+    return _view(data, date_start, date_end, adjust)
+
+
+def _view(data, date_start, date_end=None, adjust=''):
+    if data is None:
+        return None
+    data = adjust_view(data, adjust)
+    return _slice(data, date_start, date_end)
+
+
+def update(code, date_start, date_end=None, is_cache=True):
+    """
+    增量更新已存的不复权数据及复权因子，返回全部已存数据
+    """
+    plan = _plan(code, date_start, date_end, is_cache)
+    if plan[2] is None:
+        return plan[1]
+    return _apply(code, plan, fetch(code, plan[2]), is_cache)
+
+
+def _plan(code, date_start, date_end=None, is_cache=True):
+    """
+    确定需要从网络获取的开始日期
+    返回 (已存开始日期, 已存数据, 获取开始日期)，不需要获取时获取开始日期为None
+    """
+    store_start, data = read(code)
+    # 已存数据不能覆盖开始日期，需要全量获取
+    if data is None or len(data.index) == 0 or store_start > date_start:
+        return date_start, None, date_start
+
+    last_date = data['date'].iloc[-1]
+    # 已存数据已经包含所需的最后日期，不需要访问网络
+    if date_end is not None and last_date >= _to_date_str(date_end):
+        return store_start, data, None
+    run_date, run_date_nph = trd.get_trade_date_last()
+    if is_cache and last_date >= run_date.strftime("%Y-%m-%d"):
+        return store_start, data, None
+
+    # 从最后一个已存日期开始获取（包含该日，用来校验数据是否一致）
+    return store_start, data, _to_date_param(last_date)
+
+
+def _apply(code, plan, new_data, is_cache=True):
+    """
+    将获取的数据合并到已存数据并保存
+    """
+    store_start, data, fetch_start = plan
+    if data is None:
+        # 全量获取
+        if new_data is None:
+            return None
+        data = new_data
+        data['adj_factor'] = calc_adj_factor(data)
+    else:
+        if new_data is None:
+            return data
+        last_date = data['date'].iloc[-1]
+        if not _is_same_bar(data, new_data, last_date):
+            # 已存数据与网络数据不一致（数据修正），重新获取
+            logging.info(f"stock_hist_store.update数据不一致，重新获取：{code}代码")
+            data = _fetch_all(code, store_start)
+            if data is None:
+                return None
+        else:
+            # 新数据的第一天就是已存的最后一天，接着已存的复权因子计算
+            new_data['adj_factor'] = calc_adj_factor(new_data, data['adj_factor'].values[-1])
+            data = merge(data, new_data)
+
+    if is_cache:
+        write(code, data, store_start)
+    return data
+
+
+def load_many(codes, date_start, is_cache=True, adjust='', limit=None):
+    """
+    批量读取股票、ETF历史数据，需要访问网络的异步并发获取，每个股票的数据返回后即合并保存
+    获取失败的股票在本批最后再重试一次，仍然失败的记入失败队列，下次批量读取时一起重试
+    codes: 股票代码
+    date_start: 开始日期，格式为"%Y%m%d"
+    limit: 每个主机同时进行的请求数
+    返回 {code: 数据}
+    """
+    hc.reset_stats()
+    result = {}
+    plans = {}
+    tasks = []
+    for code in codes:
+        try:
+            plan = _plan(code, date_start, None, is_cache)
+            if plan[2] is None:
+                _data = _view(plan[1], date_start, None, adjust)
+                if _data is not None:
+                    result[code] = _data
+            else:
+                plans[code] = plan
+                tasks.append(_task(code, plan))
+        except Exception as e:
+            logging.error(f"stock_hist_store.load_many处理异常：{code}代码{e}")
+
+    done = set()
+
+    def _callback(code, data_json):
+        parse = fee.fund_etf_hist_em_parse if is_etf(code) else she.stock_zh_a_hist_parse
+        data = _apply(code, plans[code], _to_hist(parse(data_json)), is_cache)
+        done.add(code)
+        return _view(data, date_start, None, adjust)
+
+    result.update(acl.get_many(tasks, _callback, limit))
+
+    # 本批失败的及以前失败的股票，最后再重试一次
+    failed = {code: date_start for code in plans if code not in done}
+    for code, _start in read_failed().items():
+        if code in plans or code in result:
+            continue
+        try:
+            plan = _plan(code, _start, None, is_cache)
+            if plan[2] is not None:
+                plans[code] = plan
+                failed[code] = _start
+        except Exception as e:
+            logging.error(f"stock_hist_store.load_many处理异常：{code}代码{e}")
+    if failed:
+        batch = {task[0] for task in tasks}
+        retry = acl.get_many([_task(code, plans[code]) for code in failed], _callback, limit)
+        for code in list(failed):
+            if code in done:
+                del failed[code]
+        for code in retry:
+            if code in batch:
+                result[code] = retry[code]
+    if is_cache:
+        write_failed(failed)
+
+    stats = hc.get_stats()
+    logging.info(f"stock_hist_store.load_many获取{len(tasks)}个，失败{len(failed)}个，请求{stats['requests']}次，"
+                 f"重试{stats['retried']}次，失败{stats['failed']}次，熔断{stats['shed']}次")
+    return result
+
+
+def _task(code, plan):
+    request = fee.fund_etf_hist_em_request if is_etf(code) else she.stock_zh_a_hist_request
+    url, params = request(symbol=code, period="daily", start_date=plan[2])
+    return code, url, params
+
+
+# 获取失败的股票队列，{code: 开始日期}
+def read_failed():
+    try:
+        if os.path.isfile(failed_file):
+            with open(failed_file, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        logging.error(f"stock_hist_store.read_failed处理异常：{e}")
+    return {}
+
+
+def write_failed(failed):
+    tmp_file = f"{failed_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(failed, f)
+        os.replace(tmp_file, failed_file)
+    except Exception as e:
+        logging.error(f"stock_hist_store.write_failed处理异常：{e}")
+
+
+# 删除指定股票的已存数据，下次读取时全量获取。
+def invalidate(code):
+    store_file = _store_file(code)
+    try:
+        if os.path.isfile(store_file):
+            os.remove(store_file)
+    except Exception as e:
+        logging.error(f"stock_hist_store.invalidate处理异常：{code}代码{e}")
+
+
+def _per_share(data, name):
+    # 每10股的派现金额/送转股数换算成每股，没有时为0
+    if name not in data.columns:
+        return np.zeros(len(data.index))
+    return np.nan_to_num(data[name].values.astype(np.float64) / 10)
+
+
+def check_ex_dividend(data):
+    """
+    根据分红配送数据校验复权因子，已存数据中除权除息日的因子没有变化的股票，删除已存数据重新获取
+    分红送转很少、参考价与上一日收盘价相差不到半分时，复权因子本来就不变(calc_adj_factor)，不校验
+    data: 分红配送数据，包含code、ex_dividend_date、bonusaward_rate(每10股派现)、convertible_total_rate(每10股送转)字段
+    """
+    codes = []
+    try:
+        data = data.loc[data['ex_dividend_date'].notnull()]
+        cash = _per_share(data, 'bonusaward_rate')
+        shares = _per_share(data, 'convertible_total_rate')
+        for code, ex_date, _cash, _shares in zip(data['code'].values, data['ex_dividend_date'].values, cash, shares):
+            ex_date = str(ex_date)[0:10]
+            store_start, _data = read(code)
+            if _data is None:
+                continue
+            idx = np.searchsorted(_data['date'].values, ex_date)
+            # 除权除息日还没有数据或者是第一天，无法校验
+            if idx == 0 or idx >= len(_data.index) or _data['date'].values[idx] != ex_date:
+                continue
+            factor = _data['adj_factor'].values
+            if factor[idx] != factor[idx - 1]:
+                continue
+            pre_close = _data['close'].values[idx - 1]
+            ref_price = (pre_close - _cash) / (1 + _shares)
+            if abs(pre_close - ref_price) >= 0.005:
+                invalidate(code)
+                codes.append(code)
+    except Exception as e:
+        logging.error(f"stock_hist_store.check_ex_dividend处理异常：{e}")
+    if codes:
+        logging.info(f"stock_hist_store.check_ex_dividend复权因子需要重新计算：{codes}")
+    return codes
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os.path
+import shutil
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+import instock.core.stock_view as stv
+
+__author__ = 'myh '
+__date__ = '2025/3/12 '
+
+# 行情数据面板：股票 × 交易日 × 字段，每个字段一个定长float64数组文件(.npy)，
+# 各作业进程通过mmap直接映射使用，不需要再逐个反序列化几千个DataFrame。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+stock_panel_path = os.path.join(cpath_current, 'cache', 'panel')
+if not os.path.exists(stock_panel_path):
+    os.makedirs(stock_panel_path)  # 创建多个文件夹结构。
+
+# 保留最近几个交易日的面板
+PANEL_KEEP = 3
+
+# 面板字段，与fetch_stock_hist返回的数据列一致
+PANEL_FIELDS = tuple(list(tbs.CN_STOCK_HIST_DATA['columns'])[1:]) + ('p_change',)
+
+
+def _panel_dir(date):
+    # 2023-03-10 -> cache/panel/20230310
+    return os.path.join(stock_panel_path, date.replace('-', ''))
+
+
+def build(data, date):
+    """
+    将历史数据写成数据面板
+    data: {(date, code, name): DataFrame}
+    date: 面板日期，格式为"%Y-%m-%d"
+    """
+    keys = sorted(data.keys(), key=lambda k: k[1])
+    if not keys:
+        return None
+    # 所有股票交易日的并集
+    days = np.unique(np.concatenate([data[k]['date'].values.astype('datetime64[D]') for k in keys]))
+
+    panel_dir = _panel_dir(date)
+    tmp_dir = f"{panel_dir}.{os.getpid()}.tmp"
+    try:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        size = (len(keys), len(days))
+        fields = {f: np.lib.format.open_memmap(os.path.join(tmp_dir, f"{f}.npy"), mode='w+', dtype=np.float64,
+                                               shape=size) for f in PANEL_FIELDS}
+        for f in PANEL_FIELDS:
+            fields[f][:] = np.nan
+        begin = np.zeros(len(keys), dtype=np.int32)
+        end = np.zeros(len(keys), dtype=np.int32)
+        for i, k in enumerate(keys):
+            _data = data[k]
+            idx = np.searchsorted(days, _data['date'].values.astype('datetime64[D]'))
+            begin[i] = idx[0]
+            end[i] = idx[-1] + 1
+            for f in PANEL_FIELDS:
+                fields[f][i, idx] = _data[f].values
+        for f in PANEL_FIELDS:
+            fields[f].flush()
+        del fields
+
+        np.save(os.path.join(tmp_dir, 'dates.npy'), days)
+        np.save(os.path.join(tmp_dir, 'begin.npy'), begin)
+        np.save(os.path.join(tmp_dir, 'end.npy'), end)
+        np.save(os.path.join(tmp_dir, 'keys.npy'), np.array([(str(k[0]), k[1], k[2]) for k in keys], dtype=str))
+
+        if os.path.exists(panel_dir):
+            shutil.rmtree(panel_dir)
+        os.replace(tmp_dir, panel_dir)
+    except Exception as e:
+        logging.error(f"stock_panel.build处理异常：{e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+    _prune()
+    return panel_dir
+
+
+# 删除旧的面板
+def _prune():
+    try:
+        dirs = sorted(d for d in os.listdir(stock_panel_path) if d.isdigit())
+        for d in dirs[:-PANEL_KEEP]:
+            shutil.rmtree(os.path.join(stock_panel_path, d), ignore_errors=True)
+    except Exception as e:
+        logging.error(f"stock_panel._prune处理异常：{e}")
+
+
+def load(date):
+    """
+    映射指定日期的数据面板，不存在时返回None
+    date: 格式为"%Y-%m-%d"
+    """
+    panel_dir = _panel_dir(date)
+    if not os.path.isdir(panel_dir):
+        return None
+    try:
+        return stock_panel(panel_dir)
+    except Exception as e:
+        logging.error(f"stock_panel.load处理异常：{e}")
+    return None
+
+
+class stock_panel:
+    def __init__(self, panel_dir):
+        self.path = panel_dir
+        self.dates = np.load(os.path.join(panel_dir, 'dates.npy'))
+        self.begin = np.load(os.path.join(panel_dir, 'begin.npy'))
+        self.end = np.load(os.path.join(panel_dir, 'end.npy'))
+        self.keys = [tuple(k) for k in np.load(os.path.join(panel_dir, 'keys.npy')).tolist()]
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        # 字段数组，只读映射，切片不复制数据
+        self.fields = {f: np.load(os.path.join(panel_dir, f"{f}.npy"), mmap_mode='r') for f in PANEL_FIELDS}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def field(self, name):
+        return self.fields[name]
+
+    def series(self, i, name):
+        """
+        第i个股票某字段在其上市区间内的数据（视图）
+        """
+        return self.fields[name][i, self.begin[i]:self.end[i]]
+
+    def frame(self, i):
+        """
+        还原成与fetch_stock_hist相同结构的DataFrame
+        """
+        b = self.begin[i]
+        e = self.end[i]
+        valid = ~np.isnan(self.fields['close'][i, b:e])
+        is_all = valid.all()
+        dates = self.dates[b:e] if is_all else self.dates[b:e][valid]
+        data = {'date': np.datetime_as_string(dates)}
+        for f in PANEL_FIELDS:
+            data[f] = self.fields[f][i, b:e] if is_all else self.fields[f][i, b:e][valid]
+        # 按日期截取时直接使用面板的日期
+        return stv.set_dates(pd.DataFrame(data), dates)
+
+    def frames(self):
+        return stock_panel_frames(self)
+
+
+# 按 (date, code, name) 访问的只读映射，使用时才生成DataFrame，兼容原来的字典用法
+class stock_panel_frames(Mapping):
+    def __init__(self, panel):
+        self.panel = panel
+        self._cache = {}
+
+    def __getitem__(self, key):
+        data = self._cache.get(key)
+        if data is None:
+            data = self.panel.frame(self.panel.index[key])
+            self._cache[key] = data
+        return data
+
+    def __contains__(self, key):
+        return key in self.panel.index
+
+    def __iter__(self):
+        return iter(self.panel.keys)
+
+    def __len__(self):
+        return len(self.panel.keys)
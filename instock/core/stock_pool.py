@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import instock.core.stock_panel as spl
+
+__author__ = 'myh '
+__date__ = '2025/3/21 '
+
+# 逐个股票计算(形态识别、策略、回测)的并发执行。
+# 数据来自数据面板时，股票分片提交给进程池，子进程启动时映射同一个数据面板，按键读取数据，不传递DataFrame；
+# 否则使用线程池。
+
+# 进程数，使用环境变量 stock_workers 设置，为0时使用线程池
+workers = os.cpu_count() or 1
+# 每个任务的股票数，使用环境变量 stock_shard 设置
+shard = 100
+
+_workers = os.environ.get('stock_workers')
+if _workers is not None:
+    workers = int(_workers)
+_shard = os.environ.get('stock_shard')
+if _shard is not None:
+    shard = max(int(_shard), 1)
+
+# 每个数据面板一个进程池，同时运行的作业共用
+_pools = {}
+_lock = threading.Lock()
+# 子进程映射的数据面板
+_panel = None
+
+
+def _init(panel_dir):
+    global _panel
+    _panel = spl.stock_panel(panel_dir)
+
+
+def _run_shard(func, tasks, args, kwargs):
+    result = []
+    for key, data_key, _kwargs in tasks:
+        try:
+            i = _panel.index.get(data_key)
+            # 不缓存DataFrame，子进程内存不随股票数增长
+            data = None if i is None else _panel.frame(i)
+            result.append((key, func(key, data, *args, **kwargs, **_kwargs), None))
+        except Exception as e:
+            result.append((key, None, e))
+    return result
+
+
+def _pool(panel_dir):
+    with _lock:
+        pool = _pools.get(panel_dir)
+        if pool is None:
+            # 作业中同时有其它线程运行，子进程用spawn启动
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                          mp_context=multiprocessing.get_context('spawn'),
+                                                          initializer=_init, initargs=(panel_dir,))
+            _pools[panel_dir] = pool
+        return pool
+
+
+def _discard(panel_dir, pool):
+    with _lock:
+        if _pools.get(panel_dir) is pool:
+            del _pools[panel_dir]
+
+
+def run(func, stocks, keys=None, args=(), kwargs=None, data_keys=None, key_kwargs=None, threads=40):
+    """
+    对每个股票执行 func(key, data, *args, **kwargs)
+    func: 模块级函数，进程池执行时按名称传递
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    keys: 执行的股票，默认为stocks的全部键
+    data_keys: {key: 取数据的键}，默认为key，stocks中没有时data为None
+    key_kwargs: {key: 该股票额外的参数}
+    threads: 使用线程池时的线程数
+    逐个返回 (key, 结果, 异常)，完成的先返回
+    """
+    keys = list(stocks.keys()) if keys is None else list(keys)
+    kwargs = {} if kwargs is None else kwargs
+    tasks = [(k, k if data_keys is None else data_keys.get(k, k),
+              {} if key_kwargs is None else key_kwargs.get(k, {})) for k in keys]
+    panel = getattr(stocks, 'panel', None)
+    if panel is not None and workers > 0 and tasks:
+        pool = _pool(panel.path)
+        try:
+            future_to_tasks = {pool.submit(_run_shard, func, tasks[i:i + shard], args, kwargs): tasks[i:i + shard]
+                               for i in range(0, len(tasks), shard)}
+        except BrokenProcessPool as e:
+            logging.error(f"stock_pool.run处理异常：{e}")
+            _discard(panel.path, pool)
+        else:
+            for future in concurrent.futures.as_completed(future_to_tasks):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        _discard(panel.path, pool)
+                    result = [(t[0], None, e) for t in future_to_tasks[future]]
+                yield from result
+            return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        future_to_key = {executor.submit(func, k, stocks.get(data_key), *args, **kwargs, **_kwargs): k
+                         for k, data_key, _kwargs in tasks}
+        for future in concurrent.futures.as_completed(future_to_key):
+            key = future_to_key[future]
+            try:
+                yield key, future.result(), None
+            except Exception as e:
+                yield key, None, e
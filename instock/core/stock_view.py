@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import weakref
+import numpy as np
+
+__author__ = 'myh '
+__date__ = '2025/3/25 '
+
+# 按日期截取历史数据：历史数据按日期升序排列，截止/开始日期用二分查找定位，返回连续的几行(iloc切片，不复制数据)，
+# 不再对每个股票、每个策略逐行比较日期字符串再复制。
+# 每个DataFrame的日期转换成datetime64[D]一次后保存，其切片直接使用对应的一段；数据面板生成的DataFrame使用面板的日期。
+# 历史数据的日期不应再被修改。
+
+# id(DataFrame) -> 日期数组，DataFrame释放时删除
+_dates = {}
+
+
+def _remember(data, dates):
+    i = id(data)
+    if i not in _dates:
+        weakref.finalize(data, _dates.pop, i, None)
+    _dates[i] = dates
+
+
+def set_dates(data, dates):
+    """
+    设置DataFrame的日期数组(datetime64[D]，与各行对应)，已有日期数组时不需要再转换
+    """
+    _remember(data, dates)
+    return data
+
+
+def dates(data):
+    """
+    DataFrame的日期数组，datetime64[D]
+    """
+    d = _dates.get(id(data))
+    if d is None or len(d) != len(data.index):
+        d = data['date'].values.astype('datetime64[D]')
+        _remember(data, d)
+    return d
+
+
+def _slice(data, d, b, e):
+    if b == 0 and e == len(d):
+        return data
+    view = data.iloc[b:e]
+    _remember(view, d[b:e])
+    return view
+
+
+def as_of(data, end_date=None, tail=None):
+    """
+    截止到某日(包含)的数据
+    end_date: 格式为"%Y-%m-%d"或date，None时为全部
+    tail: 只保留最后tail条
+    返回切片，不复制数据，不应修改
+    """
+    if data is None:
+        return None
+    d = dates(data)
+    e = len(d) if end_date is None else int(np.searchsorted(d, np.datetime64(end_date, 'D'), side='right'))
+    b = 0 if tail is None else max(e - tail, 0)
+    return _slice(data, d, b, e)
+
+
+def since(data, start_date=None, head=None):
+    """
+    从某日(包含)开始的数据
+    start_date: 格式为"%Y-%m-%d"或date，None时为全部
+    head: 只保留最前head条
+    返回切片，不复制数据，不应修改
+    """
+    if data is None:
+        return None
+    d = dates(data)
+    b = 0 if start_date is None else int(np.searchsorted(d, np.datetime64(start_date, 'D'), side='left'))
+    e = len(d) if head is None else min(b + head, len(d))
+    return _slice(data, d, b, e)
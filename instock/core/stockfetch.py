@@ -2,14 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import os.path
 import datetime
 import numpy as np
-import pandas as pd
 import talib as tl
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
-import instock.core.crawling.trade_date_hist as tdh
 import instock.core.crawling.fund_etf_em as fee
 import instock.core.crawling.stock_selection as sst
 import instock.core.crawling.stock_lhb_em as sle
@@ -18,17 +15,12 @@ import instock.core.crawling.stock_dzjy_em as sde
 import instock.core.crawling.stock_hist_em as she
 import instock.core.crawling.stock_fund_em as sff
 import instock.core.crawling.stock_fhps_em as sfe
+import instock.core.stock_hist_store as shs
+import instock.core.trade_date_store as tds
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
-# 设置基础目录，每次加载使用。
-cpath_current = os.path.dirname(os.path.dirname(__file__))
-stock_hist_cache_path = os.path.join(cpath_current, 'cache', 'hist')
-if not os.path.exists(stock_hist_cache_path):
-    os.makedirs(stock_hist_cache_path)  # 创建多个文件夹结构。
-
-
 # 600 601 603 605开头的股票是上证A股
 # 600开头的股票是上证A股，属于大盘股，其中6006开头的股票是最早上市的股票，
 # 6016开头的股票为大盘蓝筹股；900开头的股票是上证B股；
@@ -60,10 +52,11 @@ def is_open_with_line(price):
 # 读取股票交易日历数据
 def fetch_stocks_trade_date():
     try:
-        data = tdh.tool_trade_date_hist_sina()
-        if data is None or len(data.index) == 0:
+        # 使用本地保存的交易日历，过期时才从网络获取
+        data = tds.load()
+        if data is None or len(data) == 0:
             return None
-        data_date = set(data['trade_date'].values.tolist())
+        data_date = set(data.astype(object).tolist())
         return data_date
     except Exception as e:
         logging.error(f"stockfetch.fetch_stocks_trade_date处理异常：{e}")
@@ -243,34 +236,39 @@ def fetch_stock_blocktrade_data(date):
     return None
 
 
-# 读取股票历史数据
+# 读取ETF历史数据，同股票保存在历史数据存储中
 def fetch_etf_hist(data_base, date_start=None, date_end=None, adjust='qfq'):
     date = data_base[0]
     code = data_base[1]
 
+    is_cache = True
     if date_start is None:
         date_start, is_cache = trd.get_trade_hist_interval(date)  # 提高运行效率，只运行一次
     try:
-        if date_end is not None:
-            data = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                        adjust=adjust)
-        else:
-            data = fee.fund_etf_hist_em(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-        if data is None or len(data.index) == 0:
-            return None
-        data.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-        data = data.sort_index()  # 将数据按照日期排序下。
+        data = stock_hist_cache(code, date_start, date_end, is_cache, adjust)
         if data is not None:
-            data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
-            data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
-            data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+            _hist_change(data)
         return data
     except Exception as e:
         logging.error(f"stockfetch.fetch_etf_hist处理异常：{e}")
     return None
 
 
+# 批量读取ETF历史数据，异步并发获取，每个ETF的数据返回后即保存，返回 {(date, code, name): 数据}
+def fetch_etfs_hist(etfs, date_start, is_cache=True, adjust='qfq', limit=None):
+    data = {}
+    try:
+        _data = shs.load_many([etf[1] for etf in etfs], date_start, is_cache, adjust, limit)
+        for etf in etfs:
+            __data = _data.get(etf[1])
+            if __data is not None:
+                _hist_change(__data)
+                data[etf] = __data
+    except Exception as e:
+        logging.error(f"stockfetch.fetch_etfs_hist处理异常：{e}")
+    return data
+
+
 # 读取3年股票历史数据
 def fetch_stock_hist(data_base, date_start=None, is_cache=True):
     date = data_base[0]
@@ -282,47 +280,39 @@ def fetch_stock_hist(data_base, date_start=None, is_cache=True):
     try:
         data = stock_hist_cache(code, date_start, None, is_cache, 'qfq')
         if data is not None:
-            data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
-            data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
-            data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+            _hist_change(data)
         return data
     except Exception as e:
         logging.error(f"stockfetch.fetch_stock_hist处理异常：{e}")
     return None
 
 
+# 批量读取股票历史数据，异步并发获取，返回 {(date, code, name): 数据}
+def fetch_stocks_hist(stocks, date_start, is_cache=True, limit=None):
+    data = {}
+    try:
+        _data = shs.load_many([stock[1] for stock in stocks], date_start, is_cache, 'qfq', limit)
+        for stock in stocks:
+            __data = _data.get(stock[1])
+            if __data is not None:
+                _hist_change(__data)
+                data[stock] = __data
+    except Exception as e:
+        logging.error(f"stockfetch.fetch_stocks_hist处理异常：{e}")
+    return data
+
+
+def _hist_change(data):
+    data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
+    data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
+    data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+
+
 # 增加读取股票缓存方法。加快处理速度。多线程解决效率
+# 历史数据持久化保存，每次只获取已存最后日期之后的数据
 def stock_hist_cache(code, date_start, date_end=None, is_cache=True, adjust=''):
-    cache_dir = os.path.join(stock_hist_cache_path, date_start[0:6], date_start)
-    # 如果没有文件夹创建一个。月文件夹和日文件夹。方便删除。
     try:
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-    except Exception:
-        pass
-    cache_file = os.path.join(cache_dir, "%s%s.gzip.pickle" % (code, adjust))
-    # 如果缓存存在就直接返回缓存数据。压缩方式。
-    try:
-        if os.path.isfile(cache_file):
-            return pd.read_pickle(cache_file, compression="gzip")
-        else:
-            if date_end is not None:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                            adjust=adjust)
-            else:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-            if stock is None or len(stock.index) == 0:
-                return None
-            stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-            stock = stock.sort_index()  # 将数据按照日期排序下。
-            try:
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-            except Exception:
-                pass
-            # time.sleep(1)
-            return stock
+        return shs.load(code, date_start, date_end, is_cache, adjust)
     except Exception as e:
         logging.error(f"stockfetch.stock_hist_cache处理异常：{code}代码{e}")
     return None
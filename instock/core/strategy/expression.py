@@ -0,0 +1,375 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+import ast
+import datetime
+import json
+import logging
+import operator
+import os.path
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+import instock.lib.database as mdb
+import instock.core.indicator.calculate_indicator_panel as idp
+
+__author__ = 'myh '
+__date__ = '2025/3/27 '
+
+# 选股表达式：用一个表达式写选股条件，不需要为每个条件写新的模块。
+# 语法为Python表达式的子集：字段、数字、+ - * /、比较(可以连写，如 0 < pe9 <= 20)、and/or/not、函数。
+# 字段为行情(open, close, high, low, volume, amount, p_change)、指标(cn_stock_indicators的列)、
+# 每日股票数据(cn_stock_spot的列)。
+# 函数：滚动 ma(x, n) sum(x, n) hhv(x, n) llv(x, n) ref(x, n)，横截面 rank(x)(百分位) zscore(x)，abs(x)。
+# 同一个表达式可以在 交易日 × 股票 的行情数据上用NumPy计算(select_stocks)，
+# 或从数据库表中选出某日的数据(select)：没有滚动、横截面函数时转换成SQL条件，按日期索引查询；
+# 有滚动函数时在历史数据上计算后按代码选出表中的数据。
+# select之前交易日的结果按 (表达式, 日期) 缓存，当天的数据还会更新，不缓存。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+# 自定义的选股表达式 {表名: 表达式}，替换tablestructure中的默认表达式，修改后下次执行作业时生效
+screen_file = os.path.join(cpath_current, 'config', 'screen.json')
+
+# 缓存的结果个数，使用环境变量 screen_cache 设置，为0时不缓存
+cache_size = 64
+
+_cache_size = os.environ.get('screen_cache')
+if _cache_size is not None:
+    cache_size = int(_cache_size)
+
+BAR_FIELDS = idp.INPUT_FIELDS
+INDICATOR_FIELDS = tuple(c for c in tbs.STOCK_STATS_DATA['columns'] if c not in BAR_FIELDS)
+SPOT_FIELDS = tuple(c for c in tbs.TABLE_CN_STOCK_SPOT['columns'] if c not in tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
+
+# 滚动函数：之前需要的数据个数
+_ROLLING = {'ma': lambda n: n - 1, 'sum': lambda n: n - 1, 'hhv': lambda n: n - 1, 'llv': lambda n: n - 1,
+            'ref': lambda n: n}
+_CROSS = ('rank', 'zscore')
+_FUNCTIONS = tuple(_ROLLING) + _CROSS + ('abs',)
+
+_BIN_OPS = {ast.Add: (operator.add, '+'), ast.Sub: (operator.sub, '-'), ast.Mult: (operator.mul, '*'),
+            ast.Div: (operator.truediv, '/')}
+
+
+# 同SQL，有NaN(NULL)的比较都不成立
+def _ne(a, b):
+    return np.logical_and(a != b, np.logical_and(a == a, b == b))
+
+
+# 作为条件的值：非0为真，NaN(NULL)不成立
+def _truth(x):
+    x = np.asarray(x, dtype=np.float64)
+    return np.logical_and(x != 0, x == x)
+
+
+# 同SQL，除以0等得到的INF、NaN为NULL
+def _finite(x):
+    return np.where(np.isfinite(x), x, np.nan)
+
+
+_COMPARE_OPS = {ast.Lt: (operator.lt, '<'), ast.LtE: (operator.le, '<='), ast.Gt: (operator.gt, '>'),
+                ast.GtE: (operator.ge, '>='), ast.Eq: (operator.eq, '='), ast.NotEq: (_ne, '<>')}
+# not 比较 时改为相反的比较，有NaN时仍不成立，同SQL的NOT NULL
+_NEGATE_OPS = {ast.Lt: ast.GtE, ast.LtE: ast.Gt, ast.Gt: ast.LtE, ast.GtE: ast.Lt, ast.Eq: ast.NotEq,
+               ast.NotEq: ast.Eq}
+
+_expressions = {}
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class expression:
+    """
+    解析后的选股表达式
+    fields: 用到的字段
+    lookback: 最后一个交易日之前需要的数据个数
+    is_rolling: 是否有滚动函数
+    is_cross: 是否有横截面函数
+    """
+
+    def __init__(self, text):
+        self.text = text
+        try:
+            self.tree = ast.parse(text.strip(), mode='eval').body
+        except SyntaxError as e:
+            raise ValueError(f"选股表达式语法错误：{text}{e}")
+        self.fields = set()
+        self.is_rolling = False
+        self.is_cross = False
+        self.lookback = self._check(self.tree)
+        self.key = ast.dump(self.tree)
+
+    def _check(self, node):
+        # 检查语法，返回需要的之前数据个数
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            # 1e400等不能转换成SQL
+            if abs(node.value) > np.finfo(np.float64).max or node.value != node.value:
+                raise ValueError(f"选股表达式数值超出范围：{ast.unparse(node)}")
+            return 0
+        if isinstance(node, ast.Name):
+            if node.id not in BAR_FIELDS and node.id not in INDICATOR_FIELDS and node.id not in SPOT_FIELDS:
+                raise ValueError(f"选股表达式字段不存在：{node.id}")
+            self.fields.add(node.id)
+            return 0
+        if isinstance(node, ast.BoolOp):
+            return max(self._check(v) for v in node.values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub, ast.UAdd)):
+            return self._check(node.operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            return max(self._check(node.left), self._check(node.right))
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE_OPS for op in node.ops):
+            return max(self._check(v) for v in [node.left] + node.comparators)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and \
+                not node.keywords:
+            name = node.func.id
+            if name in _ROLLING:
+                if len(node.args) != 2 or not isinstance(node.args[1], ast.Constant) or \
+                        type(node.args[1].value) is not int or node.args[1].value < 1:
+                    raise ValueError(f"选股表达式函数{name}的参数应为(字段或表达式, 正整数)：{ast.unparse(node)}")
+                self.is_rolling = True
+                return self._check(node.args[0]) + _ROLLING[name](node.args[1].value)
+            if len(node.args) != 1:
+                raise ValueError(f"选股表达式函数{name}只有一个参数：{ast.unparse(node)}")
+            if name in _CROSS:
+                self.is_cross = True
+            return self._check(node.args[0])
+        raise ValueError(f"选股表达式不支持：{ast.unparse(node)}")
+
+    def evaluate(self, data):
+        """
+        用NumPy计算
+        data: {字段: 交易日 × 股票 的二维数组}
+        返回 交易日 × 股票 的结果，同SQL条件，结果为NULL的为False
+        """
+        with np.errstate(all='ignore'):
+            return _truth(self._eval(self.tree, data))
+
+    def _eval(self, node, data):
+        if isinstance(node, ast.Constant):
+            return float(node.value)
+        if isinstance(node, ast.Name):
+            return data[node.id]
+        if isinstance(node, ast.BoolOp):
+            func = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            result = _truth(self._eval(node.values[0], data))
+            for v in node.values[1:]:
+                result = func(result, _truth(self._eval(v, data)))
+            return result
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return self._not(node.operand, data)
+            x = self._eval(node.operand, data)
+            return -x if isinstance(node.op, ast.USub) else x
+        if isinstance(node, ast.BinOp):
+            return _finite(_BIN_OPS[type(node.op)][0](self._eval(node.left, data), self._eval(node.right, data)))
+        if isinstance(node, ast.Compare):
+            return self._compare(node, data, node.ops, np.logical_and)
+        # 函数
+        name = node.func.id
+        x = np.asarray(self._eval(node.args[0], data), dtype=np.float64)
+        if name == 'abs':
+            return np.abs(x)
+        if x.ndim < 2:
+            x = np.broadcast_to(x, (1, 1) if x.ndim == 0 else (1, x.shape[0]))
+        if name == 'rank':
+            return pd.DataFrame(x).rank(axis=1, pct=True).values
+        if name == 'zscore':
+            return _finite((x - np.nanmean(x, axis=1, keepdims=True)) / np.nanstd(x, axis=1, keepdims=True))
+        n = node.args[1].value
+        if name == 'ref':
+            y = np.full(x.shape, np.nan)
+            y[n:] = x[:x.shape[0] - n]
+            return y
+        func = {'ma': idp._ma, 'sum': idp._sum, 'hhv': idp._max, 'llv': idp._min}[name]
+        return func(np.array(x), n)
+
+    def _compare(self, node, data, ops, func):
+        result = None
+        left = self._eval(node.left, data)
+        for op, comparator in zip(ops, node.comparators):
+            right = self._eval(comparator, data)
+            x = _COMPARE_OPS[type(op)][0](left, right)
+            result = x if result is None else func(result, x)
+            left = right
+        return result
+
+    def _not(self, node, data):
+        # not 推到比较上：not (a and b) = not a or not b，not a < b = a >= b
+        if isinstance(node, ast.Compare):
+            return self._compare(node, data, [_NEGATE_OPS[type(op)]() for op in node.ops], np.logical_or)
+        if isinstance(node, ast.BoolOp):
+            func = np.logical_or if isinstance(node.op, ast.And) else np.logical_and
+            result = self._not(node.values[0], data)
+            for v in node.values[1:]:
+                result = func(result, self._not(v, data))
+            return result
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return _truth(self._eval(node.operand, data))
+        return np.asarray(self._eval(node, data)) == 0
+
+    def to_sql(self):
+        """
+        转换成SQL条件，有滚动、横截面函数的不能转换
+        """
+        if self.is_rolling or self.is_cross:
+            raise ValueError(f"选股表达式有滚动或横截面函数，不能转换成SQL：{self.text}")
+        return self._sql(self.tree)
+
+    def _sql(self, node):
+        if isinstance(node, ast.Constant):
+            return repr(node.value)
+        if isinstance(node, ast.Name):
+            return f"`{node.id}`"
+        if isinstance(node, ast.BoolOp):
+            op = ' AND ' if isinstance(node.op, ast.And) else ' OR '
+            return f"({op.join(self._sql(v) for v in node.values)})"
+        if isinstance(node, ast.UnaryOp):
+            x = self._sql(node.operand)
+            if isinstance(node.op, ast.Not):
+                return f"(NOT {x})"
+            return f"(-{x})" if isinstance(node.op, ast.USub) else x
+        if isinstance(node, ast.BinOp):
+            return f"({self._sql(node.left)} {_BIN_OPS[type(node.op)][1]} {self._sql(node.right)})"
+        if isinstance(node, ast.Compare):
+            values = [self._sql(v) for v in [node.left] + node.comparators]
+            return f"({' AND '.join(f'{values[i]} {_COMPARE_OPS[type(op)][1]} {values[i + 1]}' for i, op in enumerate(node.ops))})"
+        return f"ABS({self._sql(node.args[0])})"
+
+
+def parse(text):
+    """
+    解析选股表达式，语法错误、字段不存在时抛出ValueError
+    """
+    expr = _expressions.get(text)
+    if expr is None:
+        expr = expression(text)
+        _expressions[text] = expr
+    return expr
+
+
+def get_screen(table):
+    """
+    表的选股表达式：screen.json中有的使用自定义的，否则为tablestructure中的默认表达式
+    """
+    try:
+        if os.path.isfile(screen_file):
+            with open(screen_file, 'r', encoding='utf-8') as f:
+                screens = json.load(f)
+            if table['name'] in screens:
+                return screens[table['name']]
+    except Exception as e:
+        logging.error(f"expression.get_screen处理异常：{e}")
+    return table['screen']
+
+
+def _cacheable(date):
+    return date is not None and str(date) < datetime.date.today().strftime("%Y-%m-%d")
+
+
+def _get(key):
+    if cache_size <= 0 or not _cacheable(key[2]):
+        return None
+    with _lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+        return value
+
+
+def _put(key, value):
+    if cache_size <= 0 or not _cacheable(key[2]):
+        return
+    with _lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > cache_size:
+            _cache.popitem(last=False)
+
+
+def clear():
+    """
+    清空缓存的结果
+    """
+    with _lock:
+        _cache.clear()
+
+
+def select(text, table, date, columns=None, stocks=None):
+    """
+    从数据库表中选出某日满足表达式的数据
+    table: tablestructure中的表，如tbs.TABLE_CN_STOCK_INDICATORS、tbs.TABLE_CN_STOCK_SPOT
+    columns: 返回的列，默认为全部
+    stocks: 函数stocks()，返回截止到date的历史数据，只在表达式有滚动函数时调用
+    没有滚动、横截面函数时表达式转换成SQL条件在数据库中查询；有横截面函数时读取该日的数据计算；
+    有滚动函数时在历史数据上计算(select_stocks)，表中的字段按代码对齐
+    """
+    expr = parse(text)
+    missing = expr.fields - set(table['columns'])
+    if expr.is_rolling:
+        missing = missing - set(BAR_FIELDS) - set(INDICATOR_FIELDS)
+    if missing:
+        raise ValueError(f"选股表达式字段不在{table['name']}中：{','.join(sorted(missing))}")
+    if expr.is_rolling and stocks is None:
+        raise ValueError(f"选股表达式有滚动函数，需要历史数据：{text}")
+    key = (expr.key, table['name'], str(date), None if columns is None else tuple(columns))
+    data = _get(key)
+    if data is not None:
+        return data.copy()
+
+    _selcol = '*' if columns is None else '`' + '`,`'.join(columns) + '`'
+    if expr.is_rolling:
+        sql = f"SELECT * FROM `{table['name']}` WHERE `date` = '{date}'"
+        data = pd.read_sql(sql=sql, con=mdb.engine())
+        codes = set(k[1] for k in select_stocks(text, stocks(), date, spot=data))
+        data = data.loc[data['code'].isin(codes)]
+        if columns is not None:
+            data = data[list(columns)]
+        data = data.reset_index(drop=True)
+    elif expr.is_cross:
+        sql = f"SELECT * FROM `{table['name']}` WHERE `date` = '{date}'"
+        data = pd.read_sql(sql=sql, con=mdb.engine())
+        mask = expr.evaluate({c: pd.to_numeric(data[c], errors='coerce').values[None, :] for c in expr.fields})
+        data = data.loc[np.broadcast_to(mask, (1, len(data.index)))[-1]]
+        if columns is not None:
+            data = data[list(columns)]
+        data = data.reset_index(drop=True)
+    else:
+        sql = f"SELECT {_selcol} FROM `{table['name']}` WHERE `date` = '{date}' and {expr.to_sql()}"
+        data = pd.read_sql(sql=sql, con=mdb.engine())
+    _put(key, data)
+    return data.copy()
+
+
+def select_stocks(text, stocks, date=None, spot=None, calc_threshold=90):
+    """
+    所有股票一起计算表达式，返回截止到date满足的股票
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    spot: 有code列的DataFrame，如每日股票数据(cn_stock_spot)，表达式有行情、指标以外的字段时按代码对齐
+    calc_threshold: 计算指标用的数据个数，同calculate_indicator_panel.get_indicator
+    返回满足的股票 [(date, code, name)]，结果与传入的数据有关，不缓存
+    """
+    expr = parse(text)
+    spot_fields = [c for c in expr.fields if c not in BAR_FIELDS and c not in INDICATOR_FIELDS]
+    if spot_fields and (spot is None or not set(spot_fields) <= set(spot.columns)):
+        raise ValueError(f"选股表达式有行情、指标以外的字段，需要spot：{','.join(spot_fields)}")
+
+    indicator_fields = [c for c in expr.fields if c in INDICATOR_FIELDS]
+    window = expr.lookback + (calc_threshold if indicator_fields else 1)
+    keys, data, start, size = idp.stack(stocks, date=date, calc_threshold=window)
+    if not keys:
+        return []
+    _data = {c: data[c] for c in expr.fields if c in BAR_FIELDS}
+    if indicator_fields:
+        # 同cn_stock_indicators，数据区间内的INF、NaN为0
+        indicators = idp.get_indicators(data, start)
+        pad = np.arange(window)[:, None] < start
+        for c in indicator_fields:
+            _data[c] = np.where(np.isfinite(indicators[c]) | pad, indicators[c], 0.0)
+    if spot_fields:
+        _spot = spot.drop_duplicates(subset='code', keep='last').set_index('code')
+        codes = [k[1] for k in keys]
+        for c in spot_fields:
+            _data[c] = pd.to_numeric(_spot[c], errors='coerce').reindex(codes).values[None, :]
+    selected = np.broadcast_to(expr.evaluate(_data), (window, len(keys)))[-1] & (start < window)
+    return [k for k, v in zip(keys, selected) if v]
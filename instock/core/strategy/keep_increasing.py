@@ -1,9 +1,6 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-import numpy as np
-import talib as tl
-
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
@@ -13,26 +10,5 @@ __date__ = '2023/3/10 '
 # 1.30日前的30日均线<20日前的30日均线<10日前的30日均线<当日的30日均线
 # 3.(当日的30日均线/30日前的30日均线)>1.2
 def check(code_name, data, date=None, threshold=30):
-    if date is None:
-        end_date = code_name[0]
-    else:
-        end_date = date.strftime("%Y-%m-%d")
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask].copy()
-    if len(data.index) < threshold:
-        return False
-
-    data.loc[:, 'ma30'] = tl.MA(data['close'].values, timeperiod=30)
-    data['ma30'].values[np.isnan(data['ma30'].values)] = 0.0
-
-    data = data.tail(n=threshold)
-
-    step1 = round(threshold / 3)
-    step2 = round(threshold * 2 / 3)
-
-    if data.iloc[0]['ma30'] < data.iloc[step1]['ma30'] < \
-            data.iloc[step2]['ma30'] < data.iloc[-1]['ma30'] and data.iloc[-1]['ma30'] > 1.2 * data.iloc[0]['ma30']:
-        return True
-    else:
-        return False
+    from instock.core.strategy import screener
+    return screener.check('cn_stock_strategy_keep_increasing', code_name, data, date, threshold=threshold)
@@ -0,0 +1,315 @@
+#!/usr/local/bin/python
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+import numpy as np
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator_panel as idp
+
+__author__ = 'myh '
+__date__ = '2025/3/24 '
+
+# 多策略一起选股：所有股票最近WINDOW个交易日的数据右对齐排成 交易日 × 股票 的二维数组(同calculate_indicator_panel.stack)，
+# 每个策略写成对所有股票的数组运算，共用5日均量、均线、区间最高价等，结果为 策略 × 股票 的布尔矩阵。
+# 最后一行为每个股票截止到选股日期的最后一条数据。
+# 各策略只在这里实现，策略模块中逐个股票执行的check函数通过check用同样的数组运算计算一个股票
+# (tablestructure引用各策略模块的check函数，策略模块在调用时才导入本模块)。
+
+# 回踩年线需要最近60个交易日的250日均线
+WINDOW = 310
+
+
+class _features:
+    """
+    各策略共用的数据，按需计算后缓存
+    """
+
+    def __init__(self, data, start):
+        self.open = data['open']
+        self.close = data['close']
+        self.high = data['high']
+        self.low = data['low']
+        self.volume = data['volume']
+        self.p_change = data['p_change']
+        self.date = data['date']
+        self.T = self.close.shape[0]
+        # 截止到每个交易日的数据个数，窗口内的数据都有时不少于窗口长度
+        self.count = np.arange(1, self.T + 1)[:, None] - start[None, :]
+        self._cache = {}
+
+    def ma(self, name, p):
+        # 同tl.MA，NaN为0
+        key = ('ma', name, p)
+        x = self._cache.get(key)
+        if x is None:
+            x = idp._ma(getattr(self, name), p)
+            x[np.isnan(x)] = 0.0
+            self._cache[key] = x
+        return x
+
+    def enter(self, threshold=60):
+        # 每个交易日是否满足放量上涨(enter.check_volume)
+        key = ('enter', threshold)
+        x = self._cache.get(key)
+        if x is None:
+            x = self._volume_ratio(threshold + 1, 2) & (self.p_change >= 2) & (self.close >= self.open)
+            self._cache[key] = x
+        return x
+
+    def _volume_ratio(self, n, ratio):
+        # 数据不少于n个、成交额不低于2亿、成交量/前一日的5日平均成交量>=ratio
+        vol_ma5 = self.ma('volume', 5)
+        mean_vol = np.zeros_like(vol_ma5)
+        mean_vol[1:] = vol_ma5[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vol_ratio = self.volume / mean_vol
+        return (self.count >= n) & (self.close * self.volume >= 200000000) & (vol_ratio >= ratio)
+
+    def is_highest(self, t, n):
+        # 第t个交易日是否满足海龟交易法则(turtle_trade.check_enter)：收盘价>=最近n日最高收盘价
+        t = self.T + t if t < 0 else t
+        return (self.count[t] >= n) & (self.close[t] >= np.max(self.close[t - n + 1:t + 1], axis=0))
+
+
+def _enter(f, tops, threshold=60):
+    # 放量上涨
+    return f.enter(threshold)[-1]
+
+
+def _keep_increasing(f, tops, threshold=30):
+    # 均线多头
+    ma30 = f.ma('close', 30)[-threshold:]
+    step1 = round(threshold / 3)
+    step2 = round(threshold * 2 / 3)
+    return (f.count[-1] >= threshold) & (ma30[0] < ma30[step1]) & (ma30[step1] < ma30[step2]) & \
+        (ma30[step2] < ma30[-1]) & (ma30[-1] > 1.2 * ma30[0])
+
+
+def _parking_apron(f, tops, threshold=15):
+    # 停机坪：最近15日中的涨停日，之后3个交易日高开、收盘上涨且与开盘价相差在3%内
+    o, c, p = f.open, f.close, f.p_change
+    result = np.zeros(c.shape[1], dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for t in range(f.T - threshold, f.T - 3):
+            price = c[t]
+            ok = (p[t] > 9.5) & f.is_highest(t, threshold)
+            ok &= (c[t + 1] > price) & (o[t + 1] > price) & (0.97 < c[t + 1] / o[t + 1]) & (c[t + 1] / o[t + 1] < 1.03)
+            for k in (t + 2, t + 3):
+                ok &= (0.97 < c[k] / o[k]) & (c[k] / o[k] < 1.03) & (-5 < p[k]) & (p[k] < 5) & \
+                      (c[k] > price) & (o[k] > price)
+            result |= ok
+    return (f.count[-1] >= threshold) & result
+
+
+def _backtrace_ma250(f, tops, threshold=60):
+    # 回踩年线
+    c = f.close[-threshold:]
+    v = f.volume[-threshold:]
+    ma250 = f.ma('close', 250)[-threshold:]
+    date = f.date[-threshold:]
+    cols = np.arange(c.shape[1])
+    rows = np.arange(threshold)[:, None]
+    # 区间最高点，及不是新高的交易日中的区间最低点
+    highest = np.argmax(c, axis=0)
+    prev_max = np.zeros_like(c)
+    prev_max[1:] = np.maximum.accumulate(c, axis=0)[:-1]
+    not_high = ~(c > prev_max)
+    lowest = np.argmin(np.where(not_high, c, np.inf), axis=0)
+    lowest_vol = np.where(not_high.any(axis=0), v[lowest, cols], 0)
+    ok = (f.count[-1] >= 250) & (lowest_vol != 0) & (v[highest, cols] != 0)
+    # 前段由年线以下向上突破
+    front_end = np.maximum(highest - 1, 0)
+    ok &= (highest > 0) & (c[0] < ma250[0]) & (c[front_end, cols] > ma250[front_end, cols])
+    # 后段在年线以上运行
+    after = rows >= highest[None, :]
+    ok &= ~(after & (c < ma250)).any(axis=0)
+    # 后段最低价日与最高价日相差10-50日，回踩伴随缩量
+    recent_lowest = np.argmin(np.where(after, c, np.inf), axis=0)
+    date_diff = (date[recent_lowest, cols] - date[highest, cols]).astype(np.int64)
+    ok &= (10 <= date_diff) & (date_diff <= 50)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_ratio = v[highest, cols] / v[recent_lowest, cols]
+        back_ratio = c[recent_lowest, cols] / c[highest, cols]
+    return ok & (vol_ratio > 2) & (back_ratio < 0.8)
+
+
+def _breakthrough_platform(f, tops, threshold=60):
+    # 平台突破：60日内第一个收盘价>=60日均线>开盘价且放量上涨的交易日，之前收盘价与60日均线偏离在-5%~20%之间
+    c = f.close[-threshold:]
+    o = f.open[-threshold:]
+    ma60 = f.ma('close', 60)[-threshold:]
+    rows = np.arange(threshold)[:, None]
+    cross = (o < ma60) & (ma60 <= c) & f.enter(threshold)[-threshold:]
+    first = np.argmax(cross, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = (ma60 - c) / ma60
+    front = (rows < first[None, :]) & (ma60 > 0)
+    return (f.count[-1] >= threshold) & cross.any(axis=0) & \
+        ~(front & ~((-0.05 < deviation) & (deviation < 0.2))).any(axis=0)
+
+
+def _low_backtrace_increase(f, tops, threshold=60):
+    # 无大幅回撤
+    c = f.close[-threshold:]
+    o = f.open[-threshold:]
+    p = f.p_change[-threshold:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ok = (f.count[-1] >= threshold) & ((c[-1] - c[0]) / c[0] >= 0.6)
+        previous_p_change = np.full(c.shape[1], 100.0)
+        previous_open = np.full(c.shape[1], -1000000.0)
+        for t in range(threshold):
+            ok &= ~((p[t] < -7) | ((c[t] - o[t]) / o[t] * 100 < -7) | (previous_p_change + p[t] < -10) |
+                    ((c[t] - previous_open) / previous_open * 100 < -10))
+            previous_p_change = p[t]
+            previous_open = o[t]
+    return ok
+
+
+def _turtle_trade(f, tops, threshold=60):
+    # 海龟交易法则
+    return f.is_highest(-1, threshold)
+
+
+def _high_tight_flag(f, tops, threshold=60):
+    # 高而窄的旗形：之前24~10日
+    h = f.high[-24:-10]
+    low = np.min(f.low[-24:-10], axis=0)
+    p = f.p_change[-24:-10]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio_increase = h[-1] / low
+    return tops & (f.count[-1] >= threshold) & (ratio_increase >= 1.9) & \
+        ((p[1:] >= 9.5) & (p[:-1] >= 9.5)).any(axis=0)
+
+
+def _climax_limitdown(f, tops, threshold=60):
+    # 放量跌停
+    return f._volume_ratio(threshold + 1, 4)[-1] & (f.p_change[-1] <= -9.5)
+
+
+def _low_atr(f, tops, ma_short=30, ma_long=250, threshold=10):
+    # 低ATR成长
+    c = f.close[-threshold:]
+    p = f.p_change[-threshold:]
+    total_change = np.zeros(c.shape[1])
+    for t in range(threshold):
+        total_change += np.abs(p[t])
+    atr = total_change / threshold
+    prev_max = np.zeros_like(c)
+    prev_max[1:] = np.maximum.accumulate(c, axis=0)[:-1]
+    highest = np.max(c, axis=0)
+    lowest = np.min(np.where(c > prev_max, 1000000, c), axis=0)
+    lowest = np.minimum(lowest, 1000000)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (highest - lowest) / lowest
+    return (f.count[-1] >= ma_long) & ~(atr > 10) & (ratio > 1.1)
+
+
+# 策略表名对应的数组运算
+SCREENS = {
+    'cn_stock_strategy_enter': _enter,
+    'cn_stock_strategy_keep_increasing': _keep_increasing,
+    'cn_stock_strategy_parking_apron': _parking_apron,
+    'cn_stock_strategy_backtrace_ma250': _backtrace_ma250,
+    'cn_stock_strategy_breakthrough_platform': _breakthrough_platform,
+    'cn_stock_strategy_low_backtrace_increase': _low_backtrace_increase,
+    'cn_stock_strategy_turtle_trade': _turtle_trade,
+    'cn_stock_strategy_high_tight_flag': _high_tight_flag,
+    'cn_stock_strategy_climax_limitdown': _climax_limitdown,
+    'cn_stock_strategy_low_atr': _low_atr,
+}
+
+
+def _evaluate(f, keys, tops, strategies):
+    # 执行各策略，返回 策略 × 股票 的布尔矩阵
+    # tops为函数时，只在有股票满足高而窄的旗形的其它条件时调用，取得龙虎榜股票代码
+    result = np.zeros((len(strategies), len(keys)), dtype=bool)
+    for i, strategy in enumerate(strategies):
+        try:
+            func = SCREENS[strategy['name']]
+            if func is _high_tight_flag:
+                result[i] = func(f, np.ones(len(keys), dtype=bool))
+                if result[i].any():
+                    _tops = tops() if callable(tops) else tops
+                    result[i] &= np.array([k[1] in _tops for k in keys], dtype=bool) if _tops else False
+            else:
+                result[i] = func(f, None)
+        except Exception as e:
+            logging.error(f"screener._evaluate处理异常：{strategy['name']}策略{e}")
+    return result
+
+
+def check(name, code_name, data, date=None, tops=True, **kwargs):
+    """
+    一个股票执行一个策略，与screen使用同样的数组运算，供策略模块的check函数调用
+    name: 策略表名，如'cn_stock_strategy_enter'
+    code_name: (date, code, name)
+    tops: 是否近三月上龙虎榜且有机构参与，只用于高而窄的旗形
+    kwargs: 策略的参数，如threshold
+    """
+    keys, data, start, size = idp.stack({code_name: data}, date=date, calc_threshold=WINDOW, with_date=True)
+    return bool(SCREENS[name](_features(data, start), np.array([tops], dtype=bool), **kwargs)[0])
+
+
+def screen(stocks, date=None, tops=None, strategies=None):
+    """
+    所有股票一起执行多个策略
+    stocks: {(date, code, name): DataFrame}，或数据面板的stock_panel_frames
+    tops: 近三月上龙虎榜且有机构参与的股票代码，高而窄的旗形只在其中选
+    strategies: 执行的策略，默认为tbs.TABLE_CN_STOCK_STRATEGIES
+    返回 (keys, 策略 × 股票 的布尔矩阵)
+    """
+    strategies = tbs.TABLE_CN_STOCK_STRATEGIES if strategies is None else strategies
+    try:
+        keys, data, start, size = idp.stack(stocks, date=date, calc_threshold=WINDOW, with_date=True)
+        if not keys:
+            return keys, np.zeros((len(strategies), 0), dtype=bool)
+        return keys, _evaluate(_features(data, start), keys, tops, strategies)
+    except Exception as e:
+        logging.error(f"screener.screen处理异常：{e}")
+    return None, None
+
+
+def screen_range(stocks, dates, tops=None, strategies=None, chunk=1000):
+    """
+    所有股票一起执行多个策略，逐个交易日返回结果，用于补算历史数据，每个交易日的结果同screen
+    stocks: 截止到最后一个交易日的数据，同screen
+    dates: 按顺序排列的交易日
+    tops: 函数tops(date)，返回该日近三月上龙虎榜且有机构参与的股票代码，只在有股票满足高而窄的旗形的其它条件时调用
+    chunk: 每次一起计算的股票数
+    逐个交易日返回 (date, keys, 策略 × 股票 的布尔矩阵)
+    """
+    strategies = tbs.TABLE_CN_STOCK_STRATEGIES if strategies is None else strategies
+    if not dates:
+        return
+    # 区间内的交易日数据都在最近WINDOW + len(dates)个数据中，只排列一次
+    window = WINDOW + len(dates)
+    keys, data, start, size = idp.stack(stocks, date=dates[-1], calc_threshold=window, with_date=True)
+    if not keys:
+        return
+    _dates = np.array([d.strftime("%Y-%m-%d") for d in dates], dtype='datetime64[D]')
+    rows = np.arange(WINDOW)[:, None]
+    for d, date in enumerate(dates):
+        # 同一交易日的龙虎榜只取一次
+        _tops = None if tops is None else functools.lru_cache(maxsize=1)(functools.partial(tops, date))
+        result = np.zeros((len(strategies), len(keys)), dtype=bool)
+        try:
+            for b in range(0, len(keys), chunk):
+                c = min(b + chunk, len(keys))
+                _start = start[b:c]
+                # 每个股票截止到该交易日的最后一条数据之后的位置，取之前WINDOW个数据，同screen按交易日截取
+                end = _start + (data['date'][:, b:c] <= _dates[d]).sum(axis=0)
+                idx = end[None, :] - WINDOW + rows
+                valid = idx >= _start[None, :]
+                idx = np.maximum(idx, 0)
+                cols = np.arange(c - b)[None, :]
+                _data = {}
+                for name in data:
+                    x = data[name][:, b:c][idx, cols]
+                    x[~valid] = np.datetime64('NaT') if name == 'date' else np.nan
+                    _data[name] = x
+                f = _features(_data, np.maximum(WINDOW - (end - _start), 0))
+                result[:, b:c] = _evaluate(f, keys[b:c], _tops, strategies)
+        except Exception as e:
+            logging.error(f"screener.screen_range处理异常：{date}{e}")
+        yield date, keys, result
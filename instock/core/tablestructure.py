@@ -86,7 +86,9 @@ TABLE_CN_STOCK_SPOT = {'name': 'cn_stock_spot', 'cn': '每日股票数据',
                                    'listing_date': {'type': DATE, 'cn': '上市时间', 'size': 110}}}
 
 TABLE_CN_STOCK_SPOT_BUY = {'name': 'cn_stock_spot_buy', 'cn': '基本面选股',
-                           'columns': TABLE_CN_STOCK_SPOT['columns'].copy()}
+                           'columns': TABLE_CN_STOCK_SPOT['columns'].copy(),
+                           # 选股表达式(strategy.expression)，在cn_stock_spot中选
+                           'screen': '0 < pe9 <= 20 and pbnewmrq <= 10 and roe_weight >= 15'}
 
 CN_STOCK_FUND_FLOW = ({'name': 'stock_individual_fund_flow_rank', 'cn': '今日',
                        'columns': {'code': {'type': VARCHAR(6, _COLLATE), 'cn': '代码', 'size': 60},
@@ -360,10 +362,16 @@ _tmp_columns = TABLE_CN_STOCK_FOREIGN_KEY['columns'].copy()
 _tmp_columns.update(TABLE_CN_STOCK_BACKTEST_DATA['columns'])
 
 TABLE_CN_STOCK_INDICATORS_BUY = {'name': 'cn_stock_indicators_buy', 'cn': '股票指标买入',
-                                 'columns': _tmp_columns}
+                                 'columns': _tmp_columns,
+                                 # 选股表达式(strategy.expression)，在cn_stock_indicators中选
+                                 'screen': 'kdjk >= 80 and kdjd >= 70 and kdjj >= 100 and rsi_6 >= 80 and '
+                                           'cci >= 100 and cr >= 300 and wr_6 >= -20 and vr >= 160'}
 
 TABLE_CN_STOCK_INDICATORS_SELL = {'name': 'cn_stock_indicators_sell', 'cn': '股票指标卖出',
-                                  'columns': _tmp_columns}
+                                  'columns': _tmp_columns,
+                                  # 选股表达式(strategy.expression)，在cn_stock_indicators中选
+                                  'screen': 'kdjk < 20 and kdjd < 30 and kdjj < 10 and rsi_6 < 20 and '
+                                            'cci < -100 and cr < 40 and wr_6 < -80 and vr < 40'}
 
 TABLE_CN_STOCK_STRATEGIES = [
     {'name': 'cn_stock_strategy_enter', 'cn': '放量上涨', 'size': 70, 'func': enter.check_volume,
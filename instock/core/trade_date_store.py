@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os.path
+import time
+import numpy as np
+import instock.core.crawling.trade_date_hist as tdh
+
+__author__ = 'myh '
+__date__ = '2025/3/17 '
+
+# 交易日历持久化：解码后的交易日历保存为datetime64[D]数组，各进程直接读取，
+# 不需要每次都获取数据并启动V8执行js解码。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+trade_date_path = os.path.join(cpath_current, 'cache', 'trade_date')
+if not os.path.exists(trade_date_path):
+    os.makedirs(trade_date_path)  # 创建多个文件夹结构。
+trade_date_file = os.path.join(trade_date_path, 'trade_date.npy')
+
+# 已存交易日历超过几天重新获取，使用环境变量 trade_date_refresh_days 设置
+REFRESH_DAYS = 7
+_refresh_days = os.environ.get('trade_date_refresh_days')
+if _refresh_days is not None:
+    REFRESH_DAYS = float(_refresh_days)
+
+
+def read():
+    if not os.path.isfile(trade_date_file):
+        return None
+    try:
+        return np.load(trade_date_file)
+    except Exception as e:
+        logging.error(f"trade_date_store.read处理异常：{e}")
+    return None
+
+
+# 先写临时文件再替换，避免多进程同时写入时读到不完整的文件。
+def write(dates):
+    tmp_file = f"{trade_date_file}.{os.getpid()}.tmp.npy"
+    try:
+        np.save(tmp_file, dates)
+        os.replace(tmp_file, trade_date_file)
+    except Exception as e:
+        logging.error(f"trade_date_store.write处理异常：{e}")
+        try:
+            os.remove(tmp_file)
+        except Exception:
+            pass
+
+
+def fetch():
+    data = tdh.tool_trade_date_hist_sina()
+    if data is None or len(data.index) == 0:
+        return None
+    return np.unique(np.array(data['trade_date'].values, dtype='datetime64[D]'))
+
+
+def is_stale(dates):
+    """
+    已存交易日历是否需要重新获取：超过刷新天数，或者已经不包含今天
+    """
+    try:
+        if time.time() - os.path.getmtime(trade_date_file) > REFRESH_DAYS * 86400:
+            return True
+    except OSError:
+        return True
+    return dates[-1] < np.datetime64('today', 'D')
+
+
+def load():
+    """
+    读取交易日历，返回排序后的datetime64[D]数组
+    已存的交易日历需要刷新时重新获取，获取失败时继续使用已存的交易日历
+    """
+    dates = read()
+    if dates is not None and len(dates) > 0 and not is_stale(dates):
+        return dates
+    try:
+        _dates = fetch()
+        if _dates is not None and len(_dates) > 0:
+            write(_dates)
+            return _dates
+    except Exception as e:
+        logging.error(f"trade_date_store.load处理异常：{e}")
+    if dates is not None and len(dates) > 0:
+        return dates
+    return None
@@ -15,6 +15,7 @@ sys.path.append(cpath)
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 import instock.core.backtest.rate_stats as rate
+import instock.core.stock_pool as spo
 from instock.core.singleton_stock import stock_hist_data
 
 __author__ = 'myh '
@@ -77,18 +78,14 @@ def process(table, data_all, date, backtest_column):
 def run_check(stocks, data_all, date, backtest_column, workers=40):
     data = {}
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(rate.get_rates, stock,
-                                              data_all.get((date, stock[1], stock[2])), backtest_column,
-                                              len(backtest_column) - 1): stock for stock in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"backtest_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        # 数据来自数据面板时多进程计算
+        data_keys = {stock: (date, stock[1], stock[2]) for stock in stocks}
+        for stock, _data_, e in spo.run(rate.get_rates, data_all, keys=stocks, data_keys=data_keys,
+                                        args=(backtest_column, len(backtest_column) - 1), threads=workers):
+            if e is not None:
+                logging.error(f"backtest_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+            elif _data_ is not None:
+                data[stock] = _data_
     except Exception as e:
         logging.error(f"backtest_data_daily_job.run_check处理异常：{e}")
     if not data:
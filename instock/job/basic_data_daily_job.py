@@ -10,6 +10,7 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.run_template as runt
+import instock.lib.trade_time as trd
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 import instock.core.stockfetch as stf
@@ -64,6 +65,11 @@ def save_nph_etf_spot_data(date, before=True):
             cols_type = tbs.get_field_types(tbs.TABLE_CN_ETF_SPOT['columns'])
 
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+
+        # 更新ETF历史数据，异步并发获取已存最后日期之后的数据，K线图直接读取
+        date_start, is_cache = trd.get_trade_hist_interval(date.strftime("%Y-%m-%d"))
+        etfs = [tuple(x) for x in data[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])].values]
+        stf.fetch_etfs_hist(etfs, date_start, is_cache)
     except Exception as e:
         logging.error(f"basic_data_daily_job.save_nph_etf_spot_data处理异常：{e}")
 
@@ -14,6 +14,9 @@ import instock.lib.run_template as runt
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 import instock.core.stockfetch as stf
+import instock.core.stock_hist_store as shs
+import instock.core.strategy.expression as sex
+from instock.core.singleton_stock import stock_hist_data
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -199,6 +202,8 @@ def save_nph_stock_bonus(date, before=True):
         else:
             cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_BONUS['columns'])
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+        # 校验除权除息股票的复权因子，只重新获取有问题的股票
+        shs.check_ex_dividend(data)
     except Exception as e:
         logging.error(f"basic_data_other_daily_job.save_nph_stock_bonus处理异常：{e}")
 
@@ -210,9 +215,9 @@ def stock_spot_buy(date):
         if not mdb.checkTableIsExist(_table_name):
             return
 
-        sql = f'''SELECT * FROM `{_table_name}` WHERE `date` = '{date}' and 
-                `pe9` > 0 and `pe9` <= 20 and `pbnewmrq` <= 10 and `roe_weight` >= 15'''
-        data = pd.read_sql(sql=sql, con=mdb.engine())
+        # 选股表达式转换成SQL条件查询，有滚动函数时在历史数据上计算
+        data = sex.select(sex.get_screen(tbs.TABLE_CN_STOCK_SPOT_BUY), tbs.TABLE_CN_STOCK_SPOT, date,
+                          stocks=lambda: stock_hist_data(date=date).get_data())
         data = data.drop_duplicates(subset="code", keep="last")
         if len(data.index) == 0:
             return
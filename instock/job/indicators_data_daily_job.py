@@ -3,7 +3,6 @@
 # 指标计算
 
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -12,14 +11,22 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.run_template as runt
+import instock.lib.trade_time as trd
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
-import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.calculate_indicator_panel as idp
+import instock.core.indicator.indicator_state as ist
+import instock.core.indicator.indicator_history as ihs
+import instock.core.strategy.expression as sex
 from instock.core.singleton_stock import stock_hist_data
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
+# 指标计算方式，使用环境变量 indicator_mode 设置
+# 默认按最近90个交易日计算；incremental 用保存的计算状态增量计算；verify 增量计算并与批量计算的结果比较
+indicator_mode = os.environ.get('indicator_mode', '')
+
 
 def prepare(date):
     try:
@@ -27,8 +34,8 @@ def prepare(date):
         stocks_data = stock_hist_data(date=date).get_data()
         if stocks_data is None:
             return
-        results = run_check(stocks_data, date=date)
-        if results is None:
+        data = run_check(stocks_data, date=date)
+        if data is None:
             return
 
         table_name = tbs.TABLE_CN_STOCK_INDICATORS['name']
@@ -40,15 +47,6 @@ def prepare(date):
         else:
             cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_INDICATORS['columns'])
 
-        dataKey = pd.DataFrame(results.keys())
-        _columns = tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
-        dataKey.columns = _columns
-
-        dataVal = pd.DataFrame(results.values())
-        dataVal.drop('date', axis=1, inplace=True)  # 删除日期字段，然后和原始数据合并。
-
-        data = pd.merge(dataKey, dataVal, on=['code'], how='left')
-        # data.set_index('code', inplace=True)
         # 单例，时间段循环必须改时间
         date_str = date.strftime("%Y-%m-%d")
         if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
@@ -56,30 +54,56 @@ def prepare(date):
         # 指标结果数据入库
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
 
+        # 延长各股票的指标历史，供K线图等直接读取
+        ihs.update(stocks_data, date=date)
     except Exception as e:
         logging.error(f"indicators_data_daily_job.prepare处理异常：{e}")
 
+# 区间作业：补算start_date到end_date每个交易日的指标，每个股票只计算一次，一次写入
+def backfill(start_date, end_date):
+    try:
+        dates = trd.get_trade_dates(start_date, end_date)
+        if not dates:
+            return
+        # 获取所有股票截止到最后一个交易日的3年历史数据
+        stocks_data = stock_hist_data(date=dates[-1]).get_data()
+        if stocks_data is None:
+            return
+        data = idp.get_indicator_range(stocks_data, dates)
+        if data is None or len(data.index) == 0:
+            return
+
+        table_name = tbs.TABLE_CN_STOCK_INDICATORS['name']
+        # 删除老数据。
+        if mdb.checkTableIsExist(table_name):
+            del_sql = f"DELETE FROM `{table_name}` where `date` >= '{dates[0]}' and `date` <= '{dates[-1]}'"
+            mdb.executeSql(del_sql)
+            cols_type = None
+        else:
+            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_INDICATORS['columns'])
+
+        # 指标结果数据入库
+        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+    except Exception as e:
+        logging.error(f"indicators_data_daily_job.backfill处理异常：{e}")
+
+
 # 计算指标
-def run_check(stocks, date=None, workers=40):
-    data = {}
-    columns = list(tbs.STOCK_STATS_DATA['columns'])
-    columns.insert(0, 'code')
-    columns.insert(0, 'date')
-    data_column = columns
+# 所有股票排成 交易日 × 股票 的二维数组一起计算，返回date, code, name及各指标
+def run_check(stocks, date=None):
+    data = None
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(idr.get_indicator, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"indicators_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        if indicator_mode in ('incremental', 'verify'):
+            data = ist.update(stocks, date=date)
+            if indicator_mode == 'verify' and data is not None:
+                diff = ist.verify(stocks, data, date=date)
+                if len(diff.index) > 0:
+                    logging.warning(f"indicators_data_daily_job.run_check增量计算与批量计算不一致：{len(diff.index)}个\n{diff}")
+        else:
+            data = idp.get_indicator(stocks, date=date)
     except Exception as e:
         logging.error(f"indicators_data_daily_job.run_check处理异常：{e}")
-    if not data:
+    if data is None or len(data.index) == 0:
         return None
     else:
         return data
@@ -94,11 +118,9 @@ def guess_buy(date):
             return
 
         _columns = tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
-        _selcol = '`,`'.join(_columns)
-        sql = f'''SELECT `{_selcol}` FROM `{_table_name}` WHERE `date` = '{date}' and 
-                `kdjk` >= 80 and `kdjd` >= 70 and `kdjj` >= 100 and `rsi_6` >= 80 and 
-                `cci` >= 100 and `cr` >= 300 and `wr_6` >= -20 and `vr` >= 160'''
-        data = pd.read_sql(sql=sql, con=mdb.engine())
+        # 选股表达式转换成SQL条件查询，有滚动函数时在历史数据上计算
+        data = sex.select(sex.get_screen(tbs.TABLE_CN_STOCK_INDICATORS_BUY), tbs.TABLE_CN_STOCK_INDICATORS, date,
+                          columns=_columns, stocks=lambda: stock_hist_data(date=date).get_data())
         data = data.drop_duplicates(subset="code", keep="last")
         # data.set_index('code', inplace=True)
 
@@ -129,11 +151,9 @@ def guess_sell(date):
             return
 
         _columns = tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
-        _selcol = '`,`'.join(_columns)
-        sql = f'''SELECT `{_selcol}` FROM `{_table_name}` WHERE `date` = '{date}' and 
-                `kdjk` < 20 and `kdjd` < 30 and `kdjj` < 10 and `rsi_6` < 20 and 
-                `cci` < -100 and `cr` < 40 and `wr_6` < -80 and `vr` < 40'''
-        data = pd.read_sql(sql=sql, con=mdb.engine())
+        # 选股表达式转换成SQL条件查询，有滚动函数时在历史数据上计算
+        data = sex.select(sex.get_screen(tbs.TABLE_CN_STOCK_INDICATORS_SELL), tbs.TABLE_CN_STOCK_INDICATORS, date,
+                          columns=_columns, stocks=lambda: stock_hist_data(date=date).get_data())
         data = data.drop_duplicates(subset="code", keep="last")
         # data.set_index('code', inplace=True)
         if len(data.index) == 0:
@@ -156,8 +176,8 @@ def guess_sell(date):
 
 
 def main():
-    # 使用方法传递。
-    runt.run_with_args(prepare)
+    # 使用方法传递。区间作业一次补算整个区间
+    runt.run_range_with_args(backfill, prepare)
     # 二次筛选数据。直接计算买卖股票数据。
     runt.run_with_args(guess_buy)
     runt.run_with_args(guess_sell)
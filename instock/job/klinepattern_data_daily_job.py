@@ -3,8 +3,6 @@
 # 计算蜡烛图形态
 
 import logging
-import concurrent.futures
-import pandas as pd
 import os.path
 import sys
 
@@ -12,6 +10,7 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.run_template as runt
+import instock.lib.trade_time as trd
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 from instock.core.singleton_stock import stock_hist_data
@@ -26,8 +25,8 @@ def prepare(date):
         stocks_data = stock_hist_data(date=date).get_data()
         if stocks_data is None:
             return
-        results = run_check(stocks_data, date=date)
-        if results is None:
+        data = run_check(stocks_data, date=date)
+        if data is None:
             return
 
         table_name = tbs.TABLE_CN_STOCK_KLINE_PATTERN['name']
@@ -39,13 +38,6 @@ def prepare(date):
         else:
             cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_KLINE_PATTERN['columns'])
 
-        dataKey = pd.DataFrame(results.keys())
-        _columns = tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
-        dataKey.columns = _columns
-
-        dataVal = pd.DataFrame(results.values())
-
-        data = pd.merge(dataKey, dataVal, on=['code'], how='left')
         # 单例，时间段循环必须改时间
         date_str = date.strftime("%Y-%m-%d")
         if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
@@ -56,32 +48,51 @@ def prepare(date):
         logging.error(f"klinepattern_data_daily_job.prepare处理异常：{e}")
 
 
-def run_check(stocks, date=None, workers=40):
-    data = {}
-    columns = tbs.STOCK_KLINE_PATTERN_DATA['columns']
-    data_column = columns
+# 区间作业：补算start_date到end_date每个交易日的K线形态，所有股票一起识别，一次写入
+def backfill(start_date, end_date):
+    try:
+        dates = trd.get_trade_dates(start_date, end_date)
+        if not dates:
+            return
+        # 获取所有股票截止到最后一个交易日的历史数据
+        stocks_data = stock_hist_data(date=dates[-1]).get_data()
+        if stocks_data is None:
+            return
+        data = kpr.get_pattern_recognition_range(stocks_data, tbs.STOCK_KLINE_PATTERN_DATA['columns'], dates)
+        if data is None or len(data.index) == 0:
+            return
+
+        table_name = tbs.TABLE_CN_STOCK_KLINE_PATTERN['name']
+        # 删除老数据。
+        if mdb.checkTableIsExist(table_name):
+            del_sql = f"DELETE FROM `{table_name}` where `date` >= '{dates[0]}' and `date` <= '{dates[-1]}'"
+            mdb.executeSql(del_sql)
+            cols_type = None
+        else:
+            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_KLINE_PATTERN['columns'])
+
+        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+    except Exception as e:
+        logging.error(f"klinepattern_data_daily_job.backfill处理异常：{e}")
+
+
+# 识别K线形态
+# 所有股票的数据首尾相接，每个形态函数只调用一次，返回有形态的股票：date, code, name及各形态
+def run_check(stocks, date=None):
+    data = None
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(kpr.get_pattern_recognition, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"klinepattern_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
+        data = kpr.get_pattern_recognition_all(stocks, tbs.STOCK_KLINE_PATTERN_DATA['columns'], date=date)
     except Exception as e:
         logging.error(f"klinepattern_data_daily_job.run_check处理异常：{e}")
-    if not data:
+    if data is None or len(data.index) == 0:
         return None
     else:
         return data
 
 
 def main():
-    # 使用方法传递。
-    runt.run_with_args(prepare)
+    # 使用方法传递。区间作业一次补算整个区间
+    runt.run_range_with_args(backfill, prepare)
 
 
 # main函数入口
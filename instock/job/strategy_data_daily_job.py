@@ -2,8 +2,8 @@
 # -*- coding: utf-8 -*-
 # 股票策略执行
 
+import functools
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -12,35 +12,80 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.run_template as runt
+import instock.lib.trade_time as trd
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
-from instock.core.singleton_stock import stock_hist_data
-from instock.core.stockfetch import fetch_stock_top_entity_data
+from instock.core.singleton_stock import stock_hist_data, stock_data
+import instock.core.stockfetch as stf
+import instock.core.strategy.screener as screener
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
 
-def prepare(date, strategy):
+def prepare(date):
     try:
         # 获取所有股票实时行情数据
         stocks_data = stock_hist_data(date=date).get_data()
         if stocks_data is None:
             return
-        table_name = strategy['name']
-        strategy_func = strategy['func']
-        results = run_check(strategy_func, table_name, stocks_data, date)
+        results = run_check(stocks_data, date)
         if results is None:
             return
+        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+            if results[strategy['name']]:
+                save(strategy, results[strategy['name']], date, date)
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.prepare处理异常：{e}")
+
+
+# 区间作业：补算start_date到end_date每个交易日的选股结果，所有股票一起计算，每个策略一次写入
+def backfill(start_date, end_date):
+    try:
+        dates = trd.get_trade_dates(start_date, end_date)
+        if not dates:
+            return
+        stocks_data = _hist_data(dates)
+        if stocks_data is None:
+            return
+        results = {strategy['name']: [] for strategy in tbs.TABLE_CN_STOCK_STRATEGIES}
+        for date, keys, result in screener.screen_range(stocks_data, dates, tops=stf.fetch_stock_top_entity_data):
+            date_str = date.strftime("%Y-%m-%d")
+            for i, strategy in enumerate(tbs.TABLE_CN_STOCK_STRATEGIES):
+                results[strategy['name']].extend((date_str, k[1], k[2]) for k, selected in zip(keys, result[i])
+                                                 if selected)
+        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+            save(strategy, results[strategy['name']], dates[0], dates[-1])
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.backfill处理异常：{e}")
+
 
+# 所有股票截止到最后一个交易日的历史数据，第一个交易日之前至少有screener.WINDOW个交易日的数据，
+# 区间较长、默认的3年数据不够时按需要的开始日期获取，保证区间内每天的结果与当天执行的相同
+def _hist_data(dates):
+    date_start, is_cache = trd.get_trade_hist_interval(dates[-1].strftime("%Y-%m-%d"))
+    need_start = trd.get_trade_date_offset(dates[0], -screener.WINDOW).strftime("%Y%m%d")
+    if need_start >= date_start:
+        return stock_hist_data(date=dates[-1]).get_data()
+    _subset = stock_data(dates[-1]).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
+    stocks = [tuple(x) for x in _subset.values]
+    return stf.fetch_stocks_hist(stocks, need_start, is_cache)
+
+
+# 保存start_date到end_date的选股结果，results为 (date, code, name)
+def save(strategy, results, start_date, end_date):
+    try:
+        table_name = strategy['name']
         # 删除老数据。
         if mdb.checkTableIsExist(table_name):
-            del_sql = f"DELETE FROM `{table_name}` where `date` = '{date}'"
+            del_sql = f"DELETE FROM `{table_name}` where `date` >= '{start_date}' and `date` <= '{end_date}'"
             mdb.executeSql(del_sql)
             cols_type = None
         else:
             # 获取策略字段类型
             cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_STRATEGIES[0]['columns'])
+        if not results:
+            return
 
         data = pd.DataFrame(results)
         # 股票外键字段：date,code,name
@@ -49,53 +94,32 @@ def prepare(date, strategy):
         # 1-100日收益率
         _columns_backtest = tuple(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
         data = pd.concat([data, pd.DataFrame(columns=_columns_backtest)])
-        # 单例，时间段循环必须改时间
-        date_str = date.strftime("%Y-%m-%d")
-        if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
-            data['date'] = date_str
         # 数据入库
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
-
     except Exception as e:
-        logging.error(f"strategy_data_daily_job.prepare处理异常：{strategy}策略{e}")
+        logging.error(f"strategy_data_daily_job.save处理异常：{strategy['name']}策略{e}")
 
 
-def run_check(strategy_fun, table_name, stocks, date, workers=40):
-    is_check_high_tight = False
-    if strategy_fun.__name__ == 'check_high_tight':
-        # 获取近三月上龙虎榜且必须有2次以上机构参与的股票
-        stock_tops = fetch_stock_top_entity_data(date)
-        if stock_tops is not None:
-            is_check_high_tight = True
-    data = []
+# 所有策略一起执行：所有股票的数据排成二维数组，各策略用数组运算一次选出所有股票
+# 返回 {策略表名: 选中的股票(date, code, name)}
+def run_check(stocks, date):
     try:
-        # 并发地对一组股票数据执行某种策略函数 strategy_fun，根据函数的返回值筛选出符合条件的股票，并将这些股票标识存储在 data 列表中
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            if is_check_high_tight:
-                future_to_data = {executor.submit(strategy_fun, k, stocks[k], date=date, istop=(k[1] in stock_tops)): k for k in stocks}
-            else:
-                future_to_data = {executor.submit(strategy_fun, k, stocks[k], date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    if future.result():
-                        data.append(stock)
-                except Exception as e:
-                    logging.error(f"strategy_data_daily_job.run_check处理异常：{stock[1]}代码{e}策略{table_name}")
+        # 近三月上龙虎榜且必须有2次以上机构参与的股票，有股票满足高而窄的旗形的其它条件时才获取
+        keys, result = screener.screen(stocks, date=date, tops=functools.partial(stf.fetch_stock_top_entity_data, date))
+        if keys is None:
+            return None
+        # 单例，时间段循环必须改时间
+        date_str = date.strftime("%Y-%m-%d")
+        return {strategy['name']: [(date_str, k[1], k[2]) for k, selected in zip(keys, result[i]) if selected]
+                for i, strategy in enumerate(tbs.TABLE_CN_STOCK_STRATEGIES)}
     except Exception as e:
-        logging.error(f"strategy_data_daily_job.run_check处理异常：{e}策略{table_name}")
-    if not data:
-        return None
-    else:
-        return data
+        logging.error(f"strategy_data_daily_job.run_check处理异常：{e}")
+    return None
 
 
 def main():
-    # 使用方法传递。
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
-            # prepare, strategy 是传给run_with_args的参数，prepare是函数名，strategy是参数
-            executor.submit(runt.run_with_args, prepare, strategy)
+    # 使用方法传递。区间作业一次补算整个区间
+    runt.run_range_with_args(backfill, prepare)
 
 
 # main函数入口
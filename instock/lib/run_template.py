@@ -21,14 +21,11 @@ def run_with_args(run_fun, *args):
         start_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
         tmp_year, tmp_month, tmp_day = sys.argv[2].split("-")
         end_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
-        run_date = start_date
         try:
             with concurrent.futures.ThreadPoolExecutor() as executor:
-                while run_date <= end_date:
-                    if trd.is_trade_date(run_date):
-                        executor.submit(run_fun, run_date, *args)
-                        time.sleep(2)
-                    run_date += datetime.timedelta(days=1)
+                for run_date in trd.get_trade_dates(start_date, end_date):
+                    executor.submit(run_fun, run_date, *args)
+                    time.sleep(2)
         except Exception as e:
             logging.error(f"run_template.run_with_args处理异常：{run_fun}{sys.argv}{e}")
     elif len(sys.argv) == 2:
@@ -60,3 +57,19 @@ def run_with_args(run_fun, *args):
                 run_fun(run_date_nph, *args)
         except Exception as e:
             logging.error(f"run_template.run_with_args处理异常：{run_fun}{sys.argv}{e}")
+
+
+# 区间作业时调用range_fun(start_date, end_date)一次计算整个区间，其它同run_with_args。
+def run_range_with_args(range_fun, run_fun, *args):
+    if len(sys.argv) == 3:
+        # 区间作业 python xxx.py 2023-03-01 2023-03-21
+        tmp_year, tmp_month, tmp_day = sys.argv[1].split("-")
+        start_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
+        tmp_year, tmp_month, tmp_day = sys.argv[2].split("-")
+        end_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
+        try:
+            range_fun(start_date, end_date, *args)
+        except Exception as e:
+            logging.error(f"run_template.run_range_with_args处理异常：{range_fun}{sys.argv}{e}")
+    else:
+        run_with_args(run_fun, *args)
@@ -2,46 +2,176 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import numpy as np
 from instock.core.singleton_trade_date import stock_trade_date
 
 __author__ = 'myh '
 __date__ = '2023/4/10 '
 
 
+class trade_date_index:
+    """
+    交易日历索引，按日期序数(date.toordinal)建立覆盖整个日历区间的累计计数表，
+    是否交易日、前后交易日、偏移N个交易日、区间交易日数都是常数时间。
+    """
+
+    def __init__(self, trade_date):
+        self.ordinals = np.array(sorted(d.toordinal() for d in trade_date), dtype=np.int64)
+        self.first = int(self.ordinals[0])
+        self.last = int(self.ordinals[-1])
+        flags = np.zeros(self.last - self.first + 1, dtype=bool)
+        flags[self.ordinals - self.first] = True
+        self.flags = flags
+        # counts[i] 为 first + i 当天及之前的交易日数
+        self.counts = np.cumsum(flags)
+
+    def _pos(self, date):
+        return date.toordinal() - self.first
+
+    def contains(self, date):
+        return self.first <= date.toordinal() <= self.last
+
+    def is_trade_date(self, date):
+        if not self.contains(date):
+            return False
+        return bool(self.flags[self._pos(date)])
+
+    def _index(self, date):
+        # 当天及之前最后一个交易日的位置，之前没有交易日时为-1
+        return int(self.counts[self._pos(date)]) - 1
+
+    def _date(self, idx):
+        if idx < 0 or idx >= len(self.ordinals):
+            return None
+        return datetime.date.fromordinal(int(self.ordinals[idx]))
+
+    def previous(self, date):
+        if not self.contains(date):
+            return None
+        idx = self._index(date)
+        if self.flags[self._pos(date)]:
+            idx -= 1
+        return self._date(idx)
+
+    def next(self, date):
+        if not self.contains(date):
+            return None
+        return self._date(self._index(date) + 1)
+
+    def offset(self, date, n):
+        """
+        date之后第n个交易日，n为负数时为之前第-n个交易日，n为0时为date当天或之前最近的交易日
+        """
+        if not self.contains(date):
+            return None
+        idx = self._index(date)
+        if n > 0:
+            return self._date(idx + n)
+        if n < 0 and self.flags[self._pos(date)]:
+            return self._date(idx + n)
+        # 非交易日，idx已经是之前的交易日
+        return self._date(idx + n + (1 if n < 0 else 0))
+
+    def count(self, start, end):
+        """
+        start到end之间(包含两端)的交易日数
+        """
+        if end < start:
+            return 0
+        s = min(max(start.toordinal(), self.first), self.last + 1) - self.first
+        e = min(max(end.toordinal(), self.first - 1), self.last) - self.first
+        if e < s:
+            return 0
+        return int(self.counts[e]) - (int(self.counts[s - 1]) if s > 0 else 0)
+
+    def dates(self, start, end):
+        """
+        start到end之间(包含两端)的交易日列表
+        """
+        s = np.searchsorted(self.ordinals, start.toordinal(), side='left')
+        e = np.searchsorted(self.ordinals, end.toordinal(), side='right')
+        return [datetime.date.fromordinal(int(o)) for o in self.ordinals[s:e]]
+
+
+_trade_date_index = None
+
+
+def get_trade_date_index():
+    global _trade_date_index
+    if _trade_date_index is None:
+        trade_date = stock_trade_date().get_data()
+        if not trade_date:
+            return None
+        _trade_date_index = trade_date_index(trade_date)
+    return _trade_date_index
+
+
+def _to_date(date):
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    return date
+
+
 def is_trade_date(date=None):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
-        return False
-    if date in trade_date:
-        return True
-    else:
+    index = get_trade_date_index()
+    if index is None or date is None:
         return False
+    return index.is_trade_date(_to_date(date))
 
 
 def get_previous_trade_date(date):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
+    index = get_trade_date_index()
+    if index is None:
+        return date
+    tmp_date = index.previous(_to_date(date))
+    if tmp_date is None:
         return date
-    tmp_date = date
-    while True:
-        tmp_date += datetime.timedelta(days=-1)
-        if tmp_date in trade_date:
-            break
     return tmp_date
 
 
 def get_next_trade_date(date):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
+    index = get_trade_date_index()
+    if index is None:
+        return date
+    tmp_date = index.next(_to_date(date))
+    if tmp_date is None:
         return date
-    tmp_date = date
-    while True:
-        tmp_date += datetime.timedelta(days=1)
-        if tmp_date in trade_date:
-            break
     return tmp_date
 
 
+def get_trade_date_offset(date, n):
+    """
+    date之后第n个交易日，n为负数时为之前第-n个交易日
+    """
+    index = get_trade_date_index()
+    if index is None:
+        return date
+    tmp_date = index.offset(_to_date(date), n)
+    if tmp_date is None:
+        return date
+    return tmp_date
+
+
+def get_trade_date_count(start, end):
+    """
+    start到end之间(包含两端)的交易日数
+    """
+    index = get_trade_date_index()
+    if index is None:
+        return 0
+    return index.count(_to_date(start), _to_date(end))
+
+
+def get_trade_dates(start, end):
+    """
+    start到end之间(包含两端)的交易日列表
+    """
+    index = get_trade_date_index()
+    if index is None:
+        return []
+    return index.dates(_to_date(start), _to_date(end))
+
+
 OPEN_TIME = (
     (datetime.time(9, 15, 0), datetime.time(11, 30, 0)),
     (datetime.time(13, 0, 0), datetime.time(15, 0, 0)),